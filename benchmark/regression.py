@@ -0,0 +1,381 @@
+"""
+<benchmark>
+
+regression harness, runs a fixed set of World and Model scenarios and
+compares time and peak memory against a stored baseline. A scenario
+regresses when it is slower (or larger) beyond both a relative tolerance
+and the measured noise, the stages (see Instrumentation) that regressed
+are reported.
+
+python benchmark/regression.py baseline [--baseline output/baseline.json]
+python benchmark/regression.py compare [--baseline output/baseline.json]
+
+compare exits with status 1 if any scenario regressed
+"""
+
+from __future__ import print_function
+import argparse
+import datetime
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+
+# run from a checkout
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import suite  # benchmark suite, sets the path of teetool
+
+import teetool as tt  # core
+
+# kind of the file
+KIND = "baseline"
+
+# default location of the baseline
+BASELINE = os.path.join("output", "baseline.json")
+
+# slower than the baseline by this fraction (and the noise), is a regression
+TIME_TOL = 0.25
+
+# differences below this are ignored [s]
+TIME_MIN = 1e-3
+
+# number of median absolute deviations, taken as noise
+NOISE_MADS = 3.
+
+# larger than the baseline by this fraction (and MEMORY_MIN), is a regression
+MEMORY_TOL = 0.25
+
+# differences below this are ignored [bytes]
+MEMORY_MIN = 2**20
+
+
+def _getWorld(ndim, settings, resolution, ntraj=50, npoints=100):
+    """
+    returns a World with two toy clusters, with models
+    """
+
+    world_1 = tt.World(name="regression", ndim=ndim,
+                       resolution=[resolution]*ndim)
+
+    for ntype in [0, 1]:
+        cluster_data = tt.helpers.get_trajectories(ntype, ndim=ndim,
+                                                   ntraj=ntraj,
+                                                   npoints=npoints)
+        world_1.addCluster(cluster_data, "toy {0}".format(ntype))
+
+    world_1.buildModel(settings, lazy=True)
+
+    return world_1
+
+
+def _scenario_build(settings):
+    """
+    returns a scenario that fits a model
+    """
+
+    cluster_data = tt.helpers.get_trajectories(0, ndim=3, ntraj=100,
+                                               npoints=100)
+
+    def run(instr):
+        tt.model.Model(cluster_data, settings, instr)
+
+    return run
+
+
+def _scenario_world(ndim, func, resolution, backend="auto"):
+    """
+    returns a scenario that evaluates func(world) on fitted models, the
+    values are not cached between runs
+    """
+
+    world_1 = _getWorld(ndim, {"model_type": "resampling", "ngaus": 100},
+                        resolution)
+
+    world_1.backend = backend
+
+    # interpolated slices would hide the evaluation
+    world_1.slice_tol = None
+
+    # fit now, not timed
+    for icluster in range(2):
+        world_1._getModel(icluster)
+
+    def run(instr):
+        for icluster in range(2):
+            world_1._getModel(icluster).clearCached()
+
+        world_1.instrumentation = instr
+
+        func(world_1)
+
+        world_1.instrumentation = None
+
+    return run
+
+
+def _isInside(world_1):
+    P = np.random.RandomState(0).uniform(-60., 60., size=(2000,
+                                                  world_1._ndim))
+    world_1.isInside(P)
+
+
+def _plane(world_1):
+    world_1.getLogLikelihoodPlane([0., 0., 0.], [1., 0., 0.], [0., 1., 0.],
+                                  resolution=[100, 100])
+
+
+def getScenarios(backend="auto"):
+    """
+    returns dict {name: run}, run(instrumentation) runs a scenario once
+    """
+
+    return {
+        "model build resampling": _scenario_build(
+            {"model_type": "resampling", "ngaus": 100}),
+        "model build ML bspline": _scenario_build(
+            {"model_type": "ML", "ngaus": 100, "basis_type": "bspline",
+             "nbasis": 10}),
+        "model build EM bernstein": _scenario_build(
+            {"model_type": "EM", "ngaus": 100, "basis_type": "bernstein",
+             "nbasis": 10}),
+        "world logp 2d": _scenario_world(2,
+            lambda w: w.getLogLikelihood(), 200, backend),
+        "world tube 2d": _scenario_world(2,
+            lambda w: w.getTube(), 200, backend),
+        "world logp 3d": _scenario_world(3,
+            lambda w: w.getLogLikelihood(), 40, backend),
+        "world tube 3d": _scenario_world(3,
+            lambda w: w.getTube(), 30, backend),
+        "world isInside 3d": _scenario_world(3, _isInside, 20, backend),
+        "world plane 3d": _scenario_world(3, _plane, 20, backend),
+    }
+
+
+def _mad(values):
+    """
+    returns the median absolute deviation
+    """
+
+    values = np.asarray(values, dtype=float)
+
+    return float(np.median(np.abs(values - np.median(values))))
+
+
+def measure(run, repeat=5):
+    """
+    runs a scenario repeat times, returns dict with "times", "median",
+    "mad" (median absolute deviation), "peak_bytes", and "stages" {stage:
+    {"median", "mad"}} of the stage times
+    """
+
+    list_records = []
+    times = []
+
+    for _ in range(repeat):
+        instr = tt.Instrumentation()
+        with instr.stage("total"):
+            run(instr)
+        records = instr.asDict()
+        times.append(records.pop("total")["time"])
+        list_records.append(records)
+
+    # peak memory, tracing slows down
+    tracemalloc.start()
+    run(tt.Instrumentation())
+    (_, peak_bytes) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    names = set()
+    for records in list_records:
+        names.update(records)
+
+    stages = {}
+
+    for name in names:
+        stage_times = [records.get(name, {"time": 0.})["time"]
+                       for records in list_records]
+        stages[name] = {"median": float(np.median(stage_times)),
+                        "mad": _mad(stage_times)}
+
+    return {"times": times,
+            "median": float(np.median(times)),
+            "mad": _mad(times),
+            "peak_bytes": peak_bytes,
+            "stages": stages}
+
+
+def run_scenarios(repeat=5, backend="auto", select=None, verbose=True):
+    """
+    returns the measurements of all scenarios (names containing select, if
+    given), as dict
+    """
+
+    scenarios = {}
+
+    for (name, run) in sorted(getScenarios(backend).items()):
+        if (select is not None) and (select not in name):
+            continue
+
+        scenarios[name] = measure(run, repeat)
+
+        if verbose:
+            print("{0:28s} {1:10.4f} s (+/- {2:.4f}) {3:10.1f} MB".format(
+                    name, scenarios[name]["median"], scenarios[name]["mad"],
+                    scenarios[name]["peak_bytes"] / 2.**20))
+
+    return {"kind": KIND,
+            "format_version": suite.FORMAT_VERSION,
+            "date": datetime.datetime.now().isoformat(),
+            "machine": suite.getMachine(),
+            "backend": backend,
+            "repeat": repeat,
+            "scenarios": scenarios}
+
+
+def _isSlower(new, old, new_mad, old_mad, tol=TIME_TOL):
+    """
+    returns True if time new is slower than old, beyond the relative
+    tolerance, the noise (median absolute deviations), and TIME_MIN
+    """
+
+    noise = NOISE_MADS * max(new_mad, old_mad)
+
+    return ((new > old * (1. + tol)) and
+            ((new - old) > max(noise, TIME_MIN)))
+
+
+def compare(baseline, current, tol=TIME_TOL, memory_tol=MEMORY_TOL):
+    """
+    returns a list of regressions, dicts with "scenario", "kind" ("time" or
+    "memory"), "baseline", "current", "ratio", and "stages" (list of
+    (stage, baseline, current) that are slower, largest increase first)
+
+    scenarios not in both are ignored
+    """
+
+    regressions = []
+
+    for (name, new) in sorted(current["scenarios"].items()):
+        if name not in baseline["scenarios"]:
+            continue
+
+        old = baseline["scenarios"][name]
+
+        if _isSlower(new["median"], old["median"], new["mad"], old["mad"],
+                     tol):
+            stages = []
+
+            for (stage, new_stage) in new["stages"].items():
+                old_stage = old["stages"].get(stage, {"median": 0.,
+                                                      "mad": 0.})
+                if _isSlower(new_stage["median"], old_stage["median"],
+                             new_stage["mad"], old_stage["mad"], tol):
+                    stages.append((stage, old_stage["median"],
+                                   new_stage["median"]))
+
+            # largest increase first
+            stages.sort(key=lambda item: item[1] - item[2])
+
+            regressions.append({"scenario": name, "kind": "time",
+                                "baseline": old["median"],
+                                "current": new["median"],
+                                "ratio": new["median"] / max(old["median"],
+                                                             1e-12),
+                                "stages": stages})
+
+        if ((new["peak_bytes"] > old["peak_bytes"] * (1. + memory_tol)) and
+            ((new["peak_bytes"] - old["peak_bytes"]) > MEMORY_MIN)):
+            regressions.append({"scenario": name, "kind": "memory",
+                                "baseline": old["peak_bytes"],
+                                "current": new["peak_bytes"],
+                                "ratio": float(new["peak_bytes"]) /
+                                         max(old["peak_bytes"], 1),
+                                "stages": []})
+
+    return regressions
+
+
+def report(regressions):
+    """
+    prints the regressions in console
+    """
+
+    if len(regressions) == 0:
+        print("no regressions")
+        return
+
+    for regression in regressions:
+        if regression["kind"] == "time":
+            print("REGRESSION {0}: {1:.4f} s -> {2:.4f} s ({3:.2f}x)".format(
+                    regression["scenario"], regression["baseline"],
+                    regression["current"], regression["ratio"]))
+        else:
+            print("REGRESSION {0}: peak {1:.1f} MB -> {2:.1f} MB "
+                  "({3:.2f}x)".format(regression["scenario"],
+                    regression["baseline"] / 2.**20,
+                    regression["current"] / 2.**20, regression["ratio"]))
+
+        for (stage, old, new) in regression["stages"]:
+            print("    stage {0:12s} {1:.4f} s -> {2:.4f} s".format(stage, old,
+                                                                    new))
+
+
+def load(filename):
+    """
+    returns a baseline read from filename (JSON)
+    """
+
+    results = suite.load(filename)
+
+    if results.get("kind") != KIND:
+        raise ValueError("expected {0}, not {1}".format(KIND,
+                                                        results.get("kind")))
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="teetool regression harness")
+    parser.add_argument("command", choices=["baseline", "compare"],
+                        help="store a baseline, or compare against it")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--backend", default="auto",
+                        choices=tt.parallel.BACKENDS)
+    parser.add_argument("--select", default=None,
+                        help="only scenarios with this in their name")
+    parser.add_argument("--tol", type=float, default=TIME_TOL,
+                        help="relative tolerance of the time")
+    parser.add_argument("--output", default=None,
+                        help="(compare) also write the current results")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        # fails early if not available
+        baseline = load(args.baseline)
+
+    current = run_scenarios(args.repeat, args.backend, args.select)
+
+    if args.command == "baseline":
+        suite.save(current, args.baseline)
+        print("baseline written to {0}".format(args.baseline))
+        return 0
+
+    if args.output is not None:
+        suite.save(current, args.output)
+
+    if baseline["machine"] != current["machine"]:
+        print("warning: baseline recorded on another machine or versions")
+
+    regressions = compare(baseline, current, args.tol)
+
+    report(regressions)
+
+    return int(len(regressions) > 0)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+"""
+<benchmark>
+
+times model building (each model type and basis) and grid evaluation
+(evalLogLikelihood, isInside_grid, getOutline) on toy trajectories, while
+varying the number of trajectories, points per trajectory, ngaus, nbasis,
+and grid resolution. Records time and peak memory per case in a JSON file.
+
+python benchmark/suite.py [--quick] [--output output/benchmark.json]
+"""
+
+from __future__ import print_function
+import argparse
+import datetime
+import json
+import multiprocessing as mp
+import os
+import platform
+import sys
+import tracemalloc
+
+import numpy as np
+import scipy
+
+# run from a checkout
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+
+import teetool as tt  # core
+
+# version of the results file
+FORMAT_VERSION = 1
+
+# models, [model_type, basis_type]
+MODELS = [["resampling", ""],
+          ["ML", "rbf"], ["ML", "bernstein"], ["ML", "bspline"],
+          ["EM", "rbf"], ["EM", "bernstein"], ["EM", "bspline"]]
+
+# values of the parameters, the first is the default. One parameter is
+# varied at a time, the others hold their default
+PARAMETERS = {"ntraj": [50, 20, 200],
+              "npoints": [100, 50, 400],
+              "ngaus": [50, 20, 200],
+              "nbasis": [10, 5, 20],
+              "resolution": [100, 50, 200]}
+
+# small values, quick check of the suite
+PARAMETERS_QUICK = {"ntraj": [10, 20],
+                    "npoints": [30, 60],
+                    "ngaus": [10, 20],
+                    "nbasis": [5, 8],
+                    "resolution": [10, 20]}
+
+# parameters of the operations
+PARAMETERS_BUILD = ["ntraj", "npoints", "ngaus", "nbasis"]
+PARAMETERS_EVAL = ["ngaus", "resolution"]
+
+# width of the tube, in standard deviations
+SDWIDTH = 1
+
+
+def _getSettings(model_type, basis_type, params):
+    """
+    returns settings of a model
+    """
+
+    settings = {"model_type": model_type, "ngaus": params["ngaus"]}
+
+    if model_type != "resampling":
+        settings["basis_type"] = basis_type
+        settings["nbasis"] = params["nbasis"]
+
+    return settings
+
+
+def _getCases(parameters, ndim):
+    """
+    returns a list of cases (name, operation, settings, params)
+    """
+
+    default = dict((key, values[0]) for (key, values) in parameters.items())
+
+    # one parameter at a time
+    def sweep(keys):
+        list_params = [dict(default)]
+        for key in keys:
+            for value in parameters[key][1:]:
+                params = dict(default)
+                params[key] = value
+                list_params.append(params)
+        return list_params
+
+    cases = []
+
+    for (model_type, basis_type) in MODELS:
+        keys = list(PARAMETERS_BUILD)
+        if model_type == "resampling":
+            # no basis
+            keys.remove("nbasis")
+
+        for params in sweep(keys):
+            settings = _getSettings(model_type, basis_type, params)
+            name = "build {0} {1}".format(model_type, basis_type).strip()
+            cases.append((name, "build", settings, params))
+
+    # evaluation depends on the cells only, not on how they were fitted
+    for operation in ["evalLogLikelihood", "isInside_grid", "getOutline"]:
+        keys = list(PARAMETERS_EVAL)
+        if operation == "getOutline":
+            # no grid
+            keys.remove("resolution")
+
+        for params in sweep(keys):
+            settings = _getSettings("resampling", "", params)
+            cases.append((operation, operation, settings, params))
+
+    for (name, operation, settings, params) in cases:
+        params["ndim"] = ndim
+
+    return cases
+
+
+def _getGrid(this_model, resolution):
+    """
+    returns an open grid around the model
+    """
+
+    outline = this_model.getOutline(SDWIDTH)
+
+    ndim = len(outline) // 2
+
+    slices = [slice(outline[2*d], outline[2*d+1], resolution*1j)
+              for d in range(ndim)]
+
+    grid = list(np.ogrid[tuple(slices)])
+
+    if ndim == 2:
+        grid.append(None)
+
+    return grid
+
+
+def run_case(operation, settings, params, repeat=3, backend="auto"):
+    """
+    runs a case repeat times, returns dict with "times" (seconds), "time"
+    (best), "peak_bytes" (traced on a separate run), and "stages" (see
+    Instrumentation, of the best run)
+    """
+
+    cluster_data = tt.helpers.get_trajectories(0, ndim=params["ndim"],
+                                               ntraj=params["ntraj"],
+                                               npoints=params["npoints"])
+
+    if operation == "build":
+        this_model = None
+    else:
+        this_model = tt.model.Model(cluster_data, settings)
+        this_model.backend = backend
+        grid = _getGrid(this_model, params["resolution"])
+
+    def run():
+        """
+        returns the instrumentation of a single run
+        """
+
+        instr = tt.Instrumentation()
+
+        if operation == "build":
+            with instr.stage("total"):
+                tt.model.Model(cluster_data, settings, instr)
+            return instr
+
+        this_model.clearCached()
+        this_model.instrumentation = instr
+
+        with instr.stage("total"):
+            if operation == "evalLogLikelihood":
+                this_model.evalLogLikelihood(*grid)
+            elif operation == "isInside_grid":
+                this_model.isInside_grid(SDWIDTH, *grid)
+            else:
+                this_model.getOutline(SDWIDTH)
+
+        this_model.instrumentation = None
+
+        return instr
+
+    list_instr = [run() for _ in range(repeat)]
+
+    times = [instr.asDict()["total"]["time"] for instr in list_instr]
+    best = int(np.argmin(times))
+
+    # peak memory, tracing slows down
+    tracemalloc.start()
+    run()
+    (_, peak_bytes) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stages = list_instr[best].asDict()
+    stages.pop("total")
+
+    return {"times": times,
+            "time": times[best],
+            "peak_bytes": peak_bytes,
+            "stages": stages}
+
+
+def run_suite(parameters=None, ndim=2, repeat=3, backend="auto",
+              select=None, verbose=True):
+    """
+    runs all cases (names containing select, if given), returns the
+    results (dict). A case that raises an error is recorded with "error"
+    """
+
+    if parameters is None:
+        parameters = PARAMETERS
+
+    results = []
+
+    for (name, operation, settings, params) in _getCases(parameters, ndim):
+        if (select is not None) and (select not in name):
+            continue
+
+        try:
+            result = run_case(operation, settings, params, repeat, backend)
+        except Exception as e:
+            # recorded, e.g. EM does not converge on all cases
+            result = {"error": "{0}: {1}".format(type(e).__name__, e)}
+
+        result.update({"name": name, "operation": operation,
+                       "settings": settings, "params": params})
+
+        results.append(result)
+
+        if not verbose:
+            continue
+
+        if "error" in result:
+            print("{0:28s} {1:60s} failed ({2})".format(name,
+                    json.dumps(params, sort_keys=True), result["error"]))
+        else:
+            print("{0:28s} {1:60s} {2:10.4f} s {3:10.1f} MB".format(name,
+                    json.dumps(params, sort_keys=True), result["time"],
+                    result["peak_bytes"] / 2.**20))
+
+    return {"format_version": FORMAT_VERSION,
+            "date": datetime.datetime.now().isoformat(),
+            "machine": getMachine(),
+            "backend": backend,
+            "repeat": repeat,
+            "results": results}
+
+
+def getMachine():
+    """
+    returns a description of the machine and versions
+    """
+
+    return {"platform": platform.platform(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "cpu_count": mp.cpu_count()}
+
+
+def save(results, filename):
+    """
+    writes results to filename (JSON)
+    """
+
+    path = os.path.dirname(filename)
+
+    if path and not os.path.isdir(path):
+        os.makedirs(path)
+
+    with open(filename, "w") as fid:
+        json.dump(results, fid, indent=1, sort_keys=True)
+
+
+def load(filename):
+    """
+    returns results read from filename (JSON)
+    """
+
+    with open(filename, "r") as fid:
+        results = json.load(fid)
+
+    if results.get("format_version") != FORMAT_VERSION:
+        raise ValueError("format version {0} not supported, expected {1}".format(
+                            results.get("format_version"), FORMAT_VERSION))
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="teetool benchmark suite")
+    parser.add_argument("--quick", action="store_true",
+                        help="small cases, to check the suite")
+    parser.add_argument("--ndim", type=int, default=2, choices=[2, 3])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", default="auto",
+                        choices=tt.parallel.BACKENDS)
+    parser.add_argument("--select", default=None,
+                        help="only cases with this in their name")
+    parser.add_argument("--output", default=os.path.join("output",
+                                                         "benchmark.json"))
+
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        parameters = PARAMETERS_QUICK
+    else:
+        parameters = PARAMETERS
+
+    results = run_suite(parameters, args.ndim, args.repeat, args.backend,
+                        args.select)
+
+    save(results, args.output)
+
+    print("results written to {0}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,37 @@
-__all__ = ['world', 'model', 'basis', 'helpers', 'visual_2d', 'visual_3d']
+__all__ = ['world', 'model', 'basis', 'helpers', 'cluster_data',
+           'storage', 'parallel', 'instrumentation', 'synthetic',
+           'visual_2d', 'visual_3d']
+
+import importlib
 
 from teetool.world import World
+from teetool.cluster_data import ClusterData
+from teetool.instrumentation import Instrumentation
 
 from teetool import model
 from teetool import basis
 from teetool import helpers
+from teetool import cluster_data
+from teetool import storage
+from teetool import parallel
+from teetool import instrumentation
+from teetool import synthetic
+
+# plotting modules pull in matplotlib (visual_2d) and mayavi (visual_3d),
+# these are imported on first access, e.g. tt.visual_2d.Visual_2d
+_LAZY_MODULES = ['visual_2d', 'visual_3d']
+
+
+def __getattr__(name):
+    """
+    imports the plotting modules on first access
+    """
+
+    if name in _LAZY_MODULES:
+        return importlib.import_module("teetool." + name)
+
+    raise AttributeError("module 'teetool' has no attribute '{0}'".format(name))
+
 
-from teetool import visual_2d
-from teetool import visual_3d
+def __dir__():
+    return sorted(list(globals()) + _LAZY_MODULES)
@@ -1,6 +1,11 @@
 # does things with basis functions
 
+import hashlib
+import threading
+from collections import OrderedDict
+
 import numpy as np
+import scipy.sparse as sps
 from scipy.linalg import block_diag
 
 
@@ -8,17 +13,40 @@ class Basis(object):
     """This class provides the interface between models
 
     <description>
+
+    Design matrices are memoized in a class-wide cache, keyed by a hash of
+    the sampling vector x and the basis parameters. As all Basis instances
+    share this cache, repeated model builds reuse earlier results. The
+    cache is bounded by the number of entries and their total size, large
+    matrices (e.g. of long, irregularly sampled trajectories, rarely
+    reused) are not memoized.
     """
 
+    # maximum number of design matrices held in the memo cache
+    CACHE_SIZE = 256
+
+    # maximum total size of the memo cache [bytes]
+    CACHE_BYTES = 2**26
+
+    # larger design matrices are not memoized [bytes]
+    CACHE_MAX_ENTRY_BYTES = 2**22
+
+    # shared memo cache (least recently used entries are dropped first)
+    _cache = OrderedDict()
+    _cache_nbytes = 0
+    _cache_lock = threading.Lock()
+
     def __init__(self, basisType, nbasis, ndim):
         """
         initialises a basis type
 
         - 'rbf' uniformly distributed radial basis functions
         - 'bernstein' Bernstein polynomials
+        - 'bspline' cubic B-splines on uniform knots (compact support,
+          results in banded / sparse design matrices)
         """
 
-        SUPPORTED_FUNCTIONS = ["rbf", "bernstein"]
+        SUPPORTED_FUNCTIONS = ["rbf", "bernstein", "bspline"]
 
         if basisType not in SUPPORTED_FUNCTIONS:
             raise NotImplementedError("{0} type not supported, only {1}".format(basisType, SUPPORTED_FUNCTIONS))
@@ -29,13 +57,210 @@ class Basis(object):
         margin = 1/(2*nbasis)
         self._range = [0+margin, 1-margin]
 
+        # B-splines: degree is limited by the number of basis functions
+        self._degree = min(3, nbasis-1)
+
+    def isCompact(self):
+        """
+        returns True if the basis functions have compact support, in which
+        case the design matrices are banded
+        """
+
+        return (self._basisType == "bspline")
+
+    def getBandwidth(self):
+        """
+        returns the number of super-diagonals in H^T H for a single
+        dimension (None if the basis is not compact)
+        """
+
+        if not self.isCompact():
+            return None
+
+        return self._degree
+
     def get(self, x):
         """
         return values of basis
+
+        results are memoized, the returned matrix is read-only
         """
 
         # check input x
-        x_vec = np.array(x)
+        x_vec = np.array(x, dtype=float)
+
+        key = self._getCacheKey(x_vec)
+
+        BASIS = self._cache_get(key)
+
+        if BASIS is None:
+            BASIS = self._get(x_vec)
+            # protect the shared copy against modification
+            BASIS.flags.writeable = False
+            self._cache_put(key, BASIS, BASIS.nbytes)
+
+        return BASIS
+
+    @classmethod
+    def clearCache(cls):
+        """
+        empties the memo cache of design matrices
+        """
+
+        with cls._cache_lock:
+            cls._cache.clear()
+            Basis._cache_nbytes = 0
+
+    def get_sparse(self, x):
+        """
+        return values of basis as a sparse (csr) matrix
+
+        results are memoized, the arrays of the returned matrix are read-only
+        """
+
+        x_vec = np.array(x, dtype=float)
+
+        key = self._getCacheKey(x_vec, kind="sparse")
+
+        BASIS = self._cache_get(key)
+
+        if BASIS is None:
+            BASIS_1d = self.get_1d_sparse(x_vec)
+            BASIS = sps.block_diag([BASIS_1d]*self._ndim, format="csr")
+            self._setReadOnly(BASIS)
+            self._cache_put(key, BASIS, self._getSparseBytes(BASIS))
+
+        return BASIS
+
+    def get_1d_sparse(self, x):
+        """
+        return values of basis for a single dimension as a sparse (csr)
+        matrix
+
+        results are memoized, the arrays of the returned matrix are read-only
+        """
+
+        x_vec = np.array(x, dtype=float)
+
+        key = self._getCacheKey(x_vec, kind="sparse_1d")
+
+        BASIS = self._cache_get(key)
+
+        if BASIS is None:
+            if self.isCompact():
+                BASIS = self._getBasisBsplineSparse(x_vec, self._nbasis)
+            else:
+                BASIS = sps.csr_matrix(self._get_1d(x_vec))
+            self._setReadOnly(BASIS)
+            self._cache_put(key, BASIS, self._getSparseBytes(BASIS))
+
+        return BASIS
+
+    def _setReadOnly(self, BASIS):
+        """
+        protects the shared copy of a sparse (csr) matrix against
+        modification, in canonical form (no later in-place sorting)
+        """
+
+        BASIS.sum_duplicates()
+
+        for arr in [BASIS.data, BASIS.indices, BASIS.indptr]:
+            arr.flags.writeable = False
+
+    def _getSparseBytes(self, BASIS):
+        """
+        returns the size of a sparse (csr) matrix [bytes]
+        """
+
+        return BASIS.data.nbytes + BASIS.indices.nbytes + BASIS.indptr.nbytes
+
+    def _getEstimatedBytes(self, npoints, kind):
+        """
+        returns an upper estimate of the size of a design matrix [bytes] for
+        npoints, of kind "dense", "sparse", or "sparse_1d"
+        """
+
+        if kind == "dense":
+            return 8 * npoints * self._ndim * self._nbasis * self._ndim
+
+        if self.isCompact():
+            nnz = npoints * (self._degree + 1)
+        else:
+            nnz = npoints * self._nbasis
+
+        # values and indices, per dimension
+        nbytes = 16 * nnz + 8 * (npoints + 1)
+
+        if kind == "sparse":
+            return nbytes * self._ndim
+
+        return nbytes
+
+    def _getCacheKey(self, x_vec, kind="dense"):
+        """
+        returns a hashable key, based on x and the basis parameters, or
+        None if the design matrix is too large to memoize
+        """
+
+        if (self._getEstimatedBytes(x_vec.size, kind) >
+            Basis.CACHE_MAX_ENTRY_BYTES):
+            # no need to hash x
+            return None
+
+        x_vec = np.ascontiguousarray(x_vec)
+
+        x_hash = hashlib.sha1(x_vec.tobytes()).hexdigest()
+
+        return (kind, self._basisType, self._nbasis, self._ndim,
+                x_vec.shape, x_hash)
+
+    def _cache_get(self, key):
+        """
+        returns memoized value, or None when not available
+        """
+
+        if key is None:
+            return None
+
+        cache = Basis._cache
+
+        with Basis._cache_lock:
+            if key not in cache:
+                return None
+
+            # mark as most recently used
+            item = cache.pop(key)
+            cache[key] = item
+
+        return item[0]
+
+    def _cache_put(self, key, value, nbytes):
+        """
+        stores value (of nbytes) in the memo cache, drops oldest entries if
+        full. Values that are too large (or key None) are not stored
+        """
+
+        if (key is None) or (nbytes > Basis.CACHE_MAX_ENTRY_BYTES):
+            return
+
+        cache = Basis._cache
+
+        with Basis._cache_lock:
+            if key in cache:
+                Basis._cache_nbytes -= cache.pop(key)[1]
+
+            cache[key] = (value, nbytes)
+            Basis._cache_nbytes += nbytes
+
+            while ((len(cache) > Basis.CACHE_SIZE) or
+                   (Basis._cache_nbytes > Basis.CACHE_BYTES)):
+                (_, (_, nbytes_old)) = cache.popitem(last=False)
+                Basis._cache_nbytes -= nbytes_old
+
+    def _get(self, x_vec):
+        """
+        return values of basis (not memoized)
+        """
 
         mpoints = len(x_vec)
         mbasis = self._nbasis
@@ -63,6 +288,11 @@ class Basis(object):
         # check input x
         x_vec = np.array(x)
 
+        if (self._basisType == "bspline"):
+            # partition of unity, no separate bias
+            BASIS = self._getBasisBsplineSparse(x_vec, self._nbasis)
+            return np.mat(BASIS.toarray())
+
         # shrink to range (edges have low capacity)
         range_min = self._range[0]
         range_max = self._range[1]
@@ -184,3 +414,61 @@ class Basis(object):
                 bern[0] = (1 - x_sca)*bern[0]
 
         return np.mat(bern)
+
+    def _getBsplineKnots(self, nbasis):
+        """
+        returns clamped, uniformly spaced knots on [0, 1]
+        """
+
+        k = self._degree
+
+        inner = np.linspace(0, 1, nbasis - k + 1)
+
+        knots = np.concatenate((np.zeros(k), inner, np.ones(k)))
+
+        return knots
+
+    def _getBasisBsplineSparse(self, x_vec, nbasis):
+        """
+        evaluates B-splines (Cox-de Boor) in [0, 1]
+        ---
+        returns a sparse matrix, with nbasis columns, and size(x) rows. Each
+        row holds (degree + 1) non-zero values.
+        x_vec: input vector
+        nbasis: number of basis functions
+        """
+
+        x_vec = np.clip(np.array(x_vec, dtype=float).ravel(), 0., 1.)
+
+        k = self._degree
+        t = self._getBsplineKnots(nbasis)
+
+        mpoints = len(x_vec)
+
+        # knot span holding each x, such that t[span] <= x < t[span+1]
+        span = np.searchsorted(t, x_vec, side="right") - 1
+        span = np.clip(span, k, nbasis - 1)
+
+        # non-zero basis functions (NURBS book, A2.2), all points at once
+        N = np.zeros((mpoints, k+1))
+        N[:, 0] = 1.
+        left = np.zeros((mpoints, k+1))
+        right = np.zeros((mpoints, k+1))
+
+        for j in range(1, k+1):
+            left[:, j] = x_vec - t[span+1-j]
+            right[:, j] = t[span+j] - x_vec
+            saved = np.zeros(mpoints)
+            for r in range(j):
+                temp = N[:, r] / (right[:, r+1] + left[:, j-r])
+                N[:, r] = saved + right[:, r+1] * temp
+                saved = left[:, j-r] * temp
+            N[:, j] = saved
+
+        rows = np.repeat(np.arange(mpoints), k+1)
+        cols = (span[:, np.newaxis] - k + np.arange(k+1)).ravel()
+
+        BSPL = sps.csr_matrix((N.ravel(), (rows, cols)),
+                              shape=(mpoints, nbasis))
+
+        return BSPL
@@ -0,0 +1,517 @@
+# columnar storage of the trajectory data of a cluster
+
+import itertools
+import numpy as np
+import teetool as tt
+
+
+def readCSV(filename, usecols, delimiter=",", skiprows=0, chunksize=2**16,
+            dtype=float):
+    """
+    returns the columns usecols of a CSV file as an array [M x ncols]
+
+    the file is parsed in chunks of chunksize lines, which are joined once
+    """
+
+    list_chunks = []
+
+    with open(filename, "r") as fid:
+        # skip header
+        for _ in itertools.islice(fid, skiprows):
+            pass
+
+        while True:
+            lines = list(itertools.islice(fid, chunksize))
+
+            if len(lines) == 0:
+                break
+
+            chunk = np.loadtxt(lines, delimiter=delimiter, usecols=usecols,
+                               dtype=dtype, ndmin=2)
+
+            list_chunks.append(chunk)
+
+    if len(list_chunks) == 0:
+        raise ValueError("no data in {0}".format(filename))
+
+    return np.concatenate(list_chunks, axis=0)
+
+
+
+class ClusterData(object):
+    """
+    This class stores a cluster of trajectories in columnar form
+
+    All trajectories share one contiguous x array [M*], one contiguous Y
+    array [M* x D], and an offsets array [ntraj + 1]. Trajectory i holds
+    the data-points offsets[i] up to offsets[i+1].
+
+    Behaves as the list of (x, Y) tuples it replaces (len, indexing,
+    iteration), where each (x, Y) is a view on the shared arrays.
+
+    Initialisation arguments:
+     - x: [M*] array
+     - Y: [M* x D] array
+     - offsets: [ntraj + 1] array of integers, starting at 0, ending at M*
+     - dtype: (optional) e.g. np.float32, to reduce memory
+    """
+
+    # methods of decimate
+    DECIMATE_METHODS = ["douglas_peucker", "uniform"]
+
+    def __init__(self, x, Y, offsets, dtype=None):
+        """
+        initialises ClusterData, validates the arrays in bulk
+        """
+
+        if dtype is None:
+            dtype = float
+
+        x = np.ascontiguousarray(x, dtype=dtype)
+        Y = np.ascontiguousarray(Y, dtype=dtype)
+        offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+
+        if x.ndim != 1:
+            raise ValueError("expected x [M], not {0}".format(x.shape))
+
+        if Y.ndim != 2:
+            raise ValueError("expected Y [M x D], not {0}".format(Y.shape))
+
+        if (x.shape[0] != Y.shape[0]):
+            raise ValueError("number of data-points do not match")
+
+        if (offsets.ndim != 1) or (offsets.size < 1):
+            raise ValueError("expected offsets [ntraj + 1]")
+
+        if (offsets[0] != 0) or (offsets[-1] != x.shape[0]):
+            raise ValueError("offsets should start at 0 and end at {0}".format(x.shape[0]))
+
+        if np.any(np.diff(offsets) < 1):
+            raise ValueError("trajectories should hold at least one data-point")
+
+        # check if all finite
+        if not np.isfinite(x).all():
+            raise ValueError("x holds non-finite values")
+
+        self._x = x
+        self._Y = Y
+        self._offsets = offsets
+
+    @classmethod
+    def fromList(cls, cluster_data, ndim=None, dtype=None):
+        """
+        returns ClusterData based on a list with tuples (x, Y)
+
+        ndim (optional) is the expected dimension D of Y
+        """
+
+        if type(cluster_data) is not list:
+            raise TypeError(
+                "expected list, not {0}".format(type(cluster_data)))
+
+        if len(cluster_data) == 0:
+            raise ValueError("expected at least one trajectory")
+
+        list_x = []
+        list_Y = []
+
+        for (i, trajectory_data) in enumerate(cluster_data):
+            # check type
+            if type(trajectory_data) is not tuple:
+                raise TypeError(
+                    "expected tuple, item {0} is a {1}".format(
+                        i, type(trajectory_data)))
+            (x, Y) = trajectory_data
+            list_x.append(np.reshape(x, -1))
+            list_Y.append(Y)
+
+        # check values x [M x 1], Y [M x D], in bulk
+        lengths_x = np.array([np.size(x) for x in list_x])
+        shapes_Y = np.array([np.shape(Y) for Y in list_Y])
+
+        if shapes_Y.ndim != 2 or shapes_Y.shape[1] != 2:
+            raise ValueError("dimension not correct")
+
+        if ndim is None:
+            ndim = shapes_Y[0, 1]
+
+        if np.any(shapes_Y[:, 1] != ndim):
+            raise ValueError("dimension not correct")
+
+        if np.any(shapes_Y[:, 0] != lengths_x):
+            raise ValueError("number of data-points do not match")
+
+        offsets = np.zeros(len(list_x) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths_x)
+
+        x = np.concatenate(list_x)
+        Y = np.concatenate(list_Y, axis=0)
+
+        return cls(x, Y, offsets, dtype)
+
+    @classmethod
+    def fromTable(cls, track_id, x, Y, dtype=None):
+        """
+        returns ClusterData based on rows of data-points, with a track id
+        [M*], x [M*], and Y [M* x D]
+
+        rows of a trajectory are expected to be consecutive, otherwise rows
+        are (stably) sorted by track id
+        """
+
+        track_id = np.asarray(track_id).reshape(-1)
+
+        if (track_id.shape[0] != np.shape(x)[0]):
+            raise ValueError("number of data-points do not match")
+
+        if track_id.size == 0:
+            raise ValueError("expected at least one trajectory")
+
+        # start of each run of equal ids
+        starts = np.flatnonzero(track_id[1:] != track_id[:-1]) + 1
+
+        if (starts.size + 1) != np.unique(track_id).size:
+            # trajectories are interleaved
+            order = np.argsort(track_id, kind="stable")
+            track_id = track_id[order]
+            x = np.asarray(x)[order]
+            Y = np.asarray(Y)[order]
+            starts = np.flatnonzero(track_id[1:] != track_id[:-1]) + 1
+
+        offsets = np.concatenate(([0], starts, [track_id.size]))
+
+        if dtype is None:
+            dtype = np.asarray(Y).dtype
+
+        return cls(x, Y, offsets, dtype)
+
+    @classmethod
+    def fromCSV(cls, filename, ndim, usecols=None, delimiter=",", skiprows=0,
+                chunksize=2**16, dtype=None):
+        """
+        returns ClusterData based on a CSV file, one row per data-point
+
+        usecols are the columns (track id, x, y, (z)), by default the first
+        ndim+2 columns. See fromTable
+        """
+
+        if usecols is None:
+            usecols = tuple(range(ndim+2))
+
+        if len(usecols) != (ndim+2):
+            raise ValueError("expected {0} columns (track id, x, Y)".format(ndim+2))
+
+        if dtype is None:
+            dtype = float
+
+        table = readCSV(filename, usecols, delimiter, skiprows, chunksize,
+                        dtype)
+
+        return cls.fromTable(table[:, 0], table[:, 1], table[:, 2:], dtype)
+
+    @classmethod
+    def fromNpy(cls, x_file, Y_file, offsets_file, mmap_mode="r"):
+        """
+        returns ClusterData based on .npy files holding the arrays x [M*],
+        Y [M* x D], and offsets [ntraj + 1] (see ClusterData), memory-mapped
+        unless mmap_mode is None. The data is not copied.
+        """
+
+        x = np.load(x_file, mmap_mode=mmap_mode)
+        Y = np.load(Y_file, mmap_mode=mmap_mode)
+        offsets = np.load(offsets_file, mmap_mode=mmap_mode)
+
+        if x.dtype != Y.dtype:
+            raise ValueError("x is {0}, Y is {1}".format(x.dtype, Y.dtype))
+
+        return cls(x, Y, offsets, Y.dtype)
+
+    def save(self, path):
+        """
+        saves the arrays in directory path (see storage)
+        """
+
+        tt.storage.save_array(path, "x", self._x)
+        tt.storage.save_array(path, "Y", self._Y)
+        tt.storage.save_array(path, "offsets", self._offsets)
+
+        tt.storage.write_manifest(path, "cluster_data",
+                                  {"ntraj": len(self),
+                                   "ndim": self.getDimension()})
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        returns ClusterData saved in directory path, the arrays are
+        memory-mapped unless mmap_mode is None
+        """
+
+        tt.storage.read_manifest(path, "cluster_data")
+
+        x = tt.storage.load_array(path, "x", mmap_mode)
+        Y = tt.storage.load_array(path, "Y", mmap_mode)
+        offsets = tt.storage.load_array(path, "offsets", mmap_mode)
+
+        return cls(x, Y, offsets, Y.dtype)
+
+    def __len__(self):
+        """
+        returns number of trajectories
+        """
+
+        return self._offsets.size - 1
+
+    def __getitem__(self, i):
+        """
+        returns trajectory (x, Y) as views, or a list of trajectories for a
+        slice
+        """
+
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        ntraj = len(self)
+
+        if (i < -ntraj) or (i >= ntraj):
+            raise IndexError("{0} not in range [0,{1}]".format(i, ntraj))
+
+        if i < 0:
+            i += ntraj
+
+        i0 = self._offsets[i]
+        i1 = self._offsets[i+1]
+
+        return (self._x[i0:i1], self._Y[i0:i1, :])
+
+    def __iter__(self):
+        """
+        iterates over trajectories (x, Y)
+        """
+
+        for i in range(len(self)):
+            yield self[i]
+
+    def toList(self):
+        """
+        returns a list with tuples (x, Y) (views)
+        """
+
+        return list(self)
+
+    def getArrays(self):
+        """
+        returns (x, Y, offsets), the underlying arrays
+        """
+
+        return (self._x, self._Y, self._offsets)
+
+    def getDimension(self):
+        """
+        returns dimension D of data
+        """
+
+        return self._Y.shape[1]
+
+    def getNumberOfPoints(self):
+        """
+        returns the total number of data-points M*
+        """
+
+        return self._x.shape[0]
+
+    def getLengths(self):
+        """
+        returns number of data-points per trajectory
+        """
+
+        return np.diff(self._offsets)
+
+    def getOutline(self):
+        """
+        returns the outline [xmin, xmax, ymin, ymax, (zmin, zmax)] of Y
+        """
+
+        Ymin = self._Y.min(axis=0)
+        Ymax = self._Y.max(axis=0)
+
+        outline = []
+
+        for d in range(self.getDimension()):
+            outline.append(float(Ymin[d]))
+            outline.append(float(Ymax[d]))
+
+        return outline
+
+    def getMinMax(self):
+        """
+        returns tuple (xmin, xmax)
+        """
+
+        return (self._x.min(), self._x.max())
+
+    def getNormalised(self, tuple_min_max=None):
+        """
+        returns ClusterData with x normalised to [0, 1], Y is shared
+        """
+
+        if tuple_min_max is None:
+            tuple_min_max = self.getMinMax()
+
+        (xmin, xmax) = tuple_min_max
+
+        x = (self._x - xmin) / (xmax - xmin)
+
+        return ClusterData(x, self._Y, self._offsets, self._Y.dtype)
+
+    def resample(self, xp):
+        """
+        returns Y interpolated at xp for all trajectories,
+        array [ntraj x len(xp) x D]
+
+        x should be increasing within each trajectory, values outside a
+        trajectory are clamped (as np.interp)
+        """
+
+        xp = np.asarray(xp, dtype=float)
+
+        ntraj = len(self)
+        ndim = self.getDimension()
+
+        x = self._x.astype(float)
+        first = x[self._offsets[:-1]]
+        last = x[self._offsets[1:] - 1]
+
+        # separate trajectories on the x axis, interpolate all at once
+        shift = (x.max() - x.min()) + 1.
+        shift_traj = shift * np.arange(ntraj)
+
+        x_shifted = x + np.repeat(shift_traj, self.getLengths())
+
+        xq = np.clip(xp[np.newaxis, :], first[:, np.newaxis],
+                     last[:, np.newaxis]) + shift_traj[:, np.newaxis]
+
+        Yp = np.empty(shape=(ntraj, xp.size, ndim))
+
+        for d in range(ndim):
+            Yp[:, :, d] = np.interp(xq.ravel(), x_shifted,
+                                    self._Y[:, d]).reshape(ntraj, xp.size)
+
+        return Yp
+
+    def downsample(self, npoints):
+        """
+        returns ClusterData with at most npoints data-points per trajectory,
+        the data-points nearest to npoints values of x, equally spaced
+        between the first and last x of each trajectory (see
+        helpers.find_nearest). Data-points are selected, not interpolated.
+
+        All trajectories are processed at once.
+        """
+
+        if npoints < 2:
+            raise ValueError("expected at least 2 data-points, not {0}".format(npoints))
+
+        # in order, once (short trajectories hold fewer data-points)
+        idx = np.unique(self._findEquallySpaced(npoints))
+
+        return self._take(idx)
+
+    def decimate(self, tol, method="douglas_peucker"):
+        """
+        returns ClusterData with fewer data-points per trajectory, such that
+        each trajectory deviates at most tol from the linear interpolation
+        (in x) between the data-points kept, the first and last data-point
+        are always kept (see helpers.getDecimationError)
+
+        method is
+        "douglas_peucker": the data-points that deviate most are added,
+        until within tol (see helpers.douglas_peucker)
+        "uniform": the fewest data-points nearest to equally spaced x (1, 2,
+        4, ... intervals) that are within tol (see downsample)
+
+        All trajectories are processed at once.
+        """
+
+        if tol < 0:
+            raise ValueError("expected a tolerance of at least 0, not {0}".format(tol))
+
+        if method not in self.DECIMATE_METHODS:
+            raise ValueError("method should be one of {0}, not {1}".format(
+                                            self.DECIMATE_METHODS, method))
+
+        if method == "douglas_peucker":
+            keep = tt.helpers.douglas_peucker(self._x, self._Y,
+                                              self._offsets, tol)
+            return self._take(np.flatnonzero(keep))
+
+        lengths = self.getLengths()
+        itraj = np.repeat(np.arange(len(self)), lengths)
+
+        # trajectories not within tol keep all data-points
+        keep = np.ones(self._x.size, dtype=bool)
+        todo = (lengths > 2)
+
+        nintervals = 1
+
+        while np.any(todo) and (nintervals < lengths.max() - 1):
+            this_keep = np.zeros(self._x.size, dtype=bool)
+            this_keep[self._findEquallySpaced(nintervals + 1)] = True
+            this_keep[self._offsets[:-1]] = True
+            this_keep[self._offsets[1:] - 1] = True
+
+            error = tt.helpers.getDecimationError(self._x, self._Y,
+                                                  self._offsets, this_keep)
+
+            # fewest data-points within tol
+            done = todo & (error <= tol)
+            mask = done[itraj]
+            keep[mask] = this_keep[mask]
+            todo &= ~done
+
+            nintervals *= 2
+
+        return self._take(np.flatnonzero(keep))
+
+    def _findEquallySpaced(self, npoints):
+        """
+        returns the indices of the data-points nearest to npoints values of
+        x, equally spaced between the first and last x of each trajectory,
+        array [ntraj * npoints] (see helpers.find_nearest)
+        """
+
+        ntraj = len(self)
+        lengths = self.getLengths()
+        starts = self._offsets[:-1]
+
+        x = self._x.astype(float)
+
+        # separate trajectories on the x axis, search all at once
+        shift = (x.max() - x.min()) + 1.
+        shift_traj = shift * np.arange(ntraj)
+
+        x_shifted = x + np.repeat(shift_traj, lengths)
+
+        xmin = np.minimum.reduceat(x, starts)
+        xmax = np.maximum.reduceat(x, starts)
+
+        u = np.linspace(0., 1., npoints)
+
+        xq = (xmin[:, np.newaxis] + (xmax - xmin)[:, np.newaxis] *
+              u[np.newaxis, :]) + shift_traj[:, np.newaxis]
+
+        return tt.helpers.find_nearest(x_shifted, xq.ravel())
+
+    def _take(self, idx):
+        """
+        returns ClusterData with the data-points idx (increasing)
+        """
+
+        ntraj = len(self)
+
+        itraj = np.searchsorted(self._offsets, idx, side="right") - 1
+
+        offsets = np.zeros(ntraj + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(itraj, minlength=ntraj))
+
+        return ClusterData(self._x[idx], self._Y[idx, :], offsets,
+                           self._Y.dtype)
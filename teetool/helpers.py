@@ -1,6 +1,8 @@
 # support functions
 
 import colorsys
+import itertools
+import tempfile
 import numpy as np
 from numpy.linalg import det, inv, svd, cond, eig
 from scipy.spatial import Delaunay
@@ -38,19 +40,143 @@ def find_nearest(target_array, target_values):
     """
     function to find nearest values in an array, perfect for
     reducing the number of datapoints
+
+    returns an array of indices in target_array, the first index of the
+    nearest value for each target value. If target_array is sorted, values
+    are found by a binary search, otherwise it is sorted first
     """
 
     # all array
-    target_array = np.array(target_array)
-    target_values = np.array(target_values)
+    target_array = np.asarray(target_array).reshape(-1)
+    target_values = np.asarray(target_values).reshape(-1)
+
+    if target_array.size == 0:
+        raise ValueError("expected a non-empty array")
+
+    if np.all(target_array[1:] >= target_array[:-1]):
+        order = None
+        a = target_array
+    else:
+        # stable, equal values keep their order
+        order = np.argsort(target_array, kind="stable")
+        a = target_array[order]
+
+    n = a.size
+
+    # candidates, first values not smaller (right), and values before (left)
+    right = np.searchsorted(a, target_values, side="left")
+    left = np.maximum(right - 1, 0)
+    # first of equal values
+    left = np.searchsorted(a, a[left], side="left")
+    right = np.minimum(right, n - 1)
+
+    d_left = np.abs(a[left] - target_values)
+    d_right = np.abs(a[right] - target_values)
+
+    if order is not None:
+        (left, right) = (order[left], order[right])
+
+    # nearest, on a tie the first index (as argmin)
+    use_right = (d_right < d_left) | ((d_right == d_left) & (right < left))
+
+    return np.where(use_right, right, left)
+
+def douglas_peucker(x, Y, offsets, tol):
+    """
+    returns a boolean mask of the data-points to keep, such that each
+    trajectory (data-points offsets[i]:offsets[i+1]) deviates at most tol
+    from the linear interpolation (in x) between the kept data-points
+
+    the deviation is measured at equal x (synchronous Euclidean distance),
+    as the models interpolate Y in x. Segments of all trajectories are
+    split at once, per level (Douglas-Peucker)
+    """
+
+    x = np.asarray(x, dtype=float).reshape(-1)
+    Y = np.asarray(Y, dtype=float)
+    offsets = np.asarray(offsets, dtype=np.int64)
+
+    keep = np.zeros(x.size, dtype=bool)
+
+    # first and last data-point of each trajectory
+    nonempty = (offsets[1:] > offsets[:-1])
+    seg_a = offsets[:-1][nonempty]
+    seg_b = offsets[1:][nonempty] - 1
+    keep[seg_a] = True
+    keep[seg_b] = True
+
+    while True:
+        # segments with data-points in between
+        ninner = seg_b - seg_a - 1
+        active = (ninner > 0)
+        (seg_a, seg_b, ninner) = (seg_a[active], seg_b[active], ninner[active])
+
+        if seg_a.size == 0:
+            break
+
+        # data-points in between, of all segments
+        seg_start = np.cumsum(ninner) - ninner
+        iseg = np.repeat(np.arange(seg_a.size), ninner)
+        idx = np.arange(iseg.size) - seg_start[iseg] + seg_a[iseg] + 1
+
+        (ia, ib) = (seg_a[iseg], seg_b[iseg])
+
+        dx = x[ib] - x[ia]
+        t = np.where(dx != 0, (x[idx] - x[ia]) / np.where(dx != 0, dx, 1.), 0.)
+
+        Yp = Y[ia, :] + t[:, np.newaxis] * (Y[ib, :] - Y[ia, :])
+        dist = np.sqrt(np.sum((Y[idx, :] - Yp)**2, axis=1))
+
+        # largest deviation per segment, the first data-point on a tie
+        dmax = np.maximum.reduceat(dist, seg_start)
+        ifirst = np.flatnonzero(dist == dmax[iseg])
+        (_, iunique) = np.unique(iseg[ifirst], return_index=True)
+        imax = idx[ifirst[iunique]]
 
-    idx = []
+        # split segments that deviate too much
+        split = (dmax > tol)
+        keep[imax[split]] = True
 
-    for (i, target_value) in enumerate(target_values):
-        # find index
-        idx.append((np.abs(target_array-target_value)).argmin())
+        seg_a = np.concatenate((seg_a[split], imax[split]))
+        seg_b = np.concatenate((imax[split], seg_b[split]))
 
-    return idx
+    return keep
+
+def getDecimationError(x, Y, offsets, keep):
+    """
+    returns the deviation of each trajectory (data-points
+    offsets[i]:offsets[i+1]) from the linear interpolation (in x) between
+    the data-points in mask keep, the largest per trajectory [ntraj]
+
+    the first and last data-point of each trajectory should be kept
+    """
+
+    x = np.asarray(x, dtype=float).reshape(-1)
+    Y = np.asarray(Y, dtype=float)
+    offsets = np.asarray(offsets, dtype=np.int64)
+
+    ntraj = offsets.size - 1
+
+    error = np.zeros(ntraj)
+
+    if x.size == 0:
+        return error
+
+    # previous and next kept data-point, within each trajectory
+    i = np.arange(x.size)
+    ia = np.maximum.accumulate(np.where(keep, i, 0))
+    ib = np.minimum.accumulate(np.where(keep, i, x.size - 1)[::-1])[::-1]
+
+    dx = x[ib] - x[ia]
+    t = np.where(dx != 0, (x - x[ia]) / np.where(dx != 0, dx, 1.), 0.)
+
+    Yp = Y[ia, :] + t[:, np.newaxis] * (Y[ib, :] - Y[ia, :])
+    dist = np.sqrt(np.sum((Y - Yp)**2, axis=1))
+
+    nonempty = (offsets[1:] > offsets[:-1])
+    error[nonempty] = np.maximum.reduceat(dist, offsets[:-1][nonempty])
+
+    return error
 
 def nearest_spd(A):
     """
@@ -239,7 +365,7 @@ def gauss_logLc(y, ndim, cc, cA):
     pyL = - np.inf
 
     for m in range(M):
-        c = cc[m]
+        c = np.reshape(cc[m], (ndim, 1))
         A = cA[m]
         pyLm = gauss_logp(y, ndim, c, A)
         if pyLm > pyL:
@@ -258,6 +384,32 @@ def gauss_logLc(y, ndim, cc, cA):
 
     return pyL
 
+def gauss_logLc_cells(Y, ndim, cc, cLinv, clogdet):
+    """
+    returns the log likelihood of positions Y [N x D] based on model (in
+    cells), as gauss_logLc, with precomputed factors
+
+    cc [ngaus x D] holds the means, cLinv [ngaus x D x D] the inverse factors
+    of the covariances (inv(L), with L L^T = A), and clogdet [ngaus] their
+    log-determinants
+    """
+
+    Y = np.asarray(Y, dtype=float).reshape(-1, ndim)
+
+    pyL = np.empty(Y.shape[0])
+    pyL.fill(-np.inf)
+
+    pL1 = 1. * ndim * np.log(2.*np.pi)
+
+    for m in range(len(cc)):
+        # whitened positions
+        Z = np.dot(Y - cc[m], cLinv[m].T)
+        pL3 = np.sum(Z*Z, axis=1)
+
+        pyL = np.maximum(pyL, - 1. / 2. * ( pL1 + clogdet[m] + pL3 ))
+
+    return pyL
+
 def getMaxOutline(ndim):
     """
     returns default outline based on dimensionality
@@ -270,11 +422,22 @@ def getMaxOutline(ndim):
 
     return defaultOutline
 
-def getGridFromResolution(outline, resolution):
+def getGridFromResolution(outline, resolution, sparse=False):
     """
     return xx, yy, (zz), based on outline and resolution
+
+    if sparse is True, open grids are returned (as np.ogrid), which hold only
+    the axis vectors, e.g. xx [nx x 1 x 1], yy [1 x ny x 1], zz [1 x 1 x nz].
+    These broadcast against each other, use materialiseGrid to obtain the
+    full coordinate arrays.
     """
 
+    # np.ogrid produces open grids, np.mgrid dense grids
+    if sparse:
+        grid = np.ogrid
+    else:
+        grid = np.mgrid
+
     if type(resolution) is not list:
         # create an equal sized grid
 
@@ -289,9 +452,9 @@ def getGridFromResolution(outline, resolution):
         if ynsteps < 2:
             ynsteps = 2
 
-        if len(outline) is 4:
+        if len(outline) == 4:
             # 2d
-            [xx, yy] = np.mgrid[xmin:xmax:np.complex(0, xnsteps+1),
+            [xx, yy] = grid[xmin:xmax:np.complex(0, xnsteps+1),
                            ymin:ymax:np.complex(0, ynsteps+1)]
             zz = None
         else:
@@ -300,7 +463,7 @@ def getGridFromResolution(outline, resolution):
             znsteps = int( np.around( (zmax-zmin) / (1.*resolution) ) )
             if znsteps < 2:
                 znsteps = 2
-            [xx, yy, zz] = np.mgrid[xmin:xmax:np.complex(0, xnsteps+1),
+            [xx, yy, zz] = grid[xmin:xmax:np.complex(0, xnsteps+1),
                            ymin:ymax:np.complex(0, ynsteps+1),
                            zmin:zmax:np.complex(0, znsteps+1)]
 
@@ -309,16 +472,480 @@ def getGridFromResolution(outline, resolution):
 
         [xmin, xmax, ymin, ymax] = outline[:4]
 
-        if len(outline) is 4:
+        if len(outline) == 4:
             # 2d
-            [xx, yy] = np.mgrid[xmin:xmax:np.complex(0, resolution[0]),
+            [xx, yy] = grid[xmin:xmax:np.complex(0, resolution[0]),
                            ymin:ymax:np.complex(0, resolution[1])]
             zz = None
         else:
             # 3d
             [zmin, zmax] = outline[4:6]
-            [xx, yy, zz] = np.mgrid[xmin:xmax:np.complex(0, resolution[0]),
+            [xx, yy, zz] = grid[xmin:xmax:np.complex(0, resolution[0]),
                            ymin:ymax:np.complex(0, resolution[1]),
                            zmin:zmax:np.complex(0, resolution[2])]
 
     return [xx, yy, zz]
+
+def getGridAxes(xx, yy, zz=None):
+    """
+    returns a list of axis vectors [x, y, (z)] of a grid
+
+    accepts dense (np.mgrid) as well as open (np.ogrid) grids
+    """
+
+    list_grid = [xx, yy]
+
+    if zz is not None:
+        list_grid.append(zz)
+
+    ndim = len(list_grid)
+
+    list_axes = []
+
+    for d, grid_d in enumerate(list_grid):
+        grid_d = np.asarray(grid_d)
+
+        if grid_d.ndim != ndim:
+            raise ValueError("expected {0}d grid, not {1}d".format(
+                                                        ndim, grid_d.ndim))
+
+        # index along axis d, first element along other axes
+        index = [0]*ndim
+        index[d] = slice(None)
+
+        list_axes.append(np.array(grid_d[tuple(index)], dtype=float))
+
+    return list_axes
+
+def getGridFromAxes(axes, sparse=False):
+    """
+    returns [xx, yy, (zz)] from a list of axis vectors, as np.mgrid would,
+    or as np.ogrid if sparse is True
+    """
+
+    ndim = len(axes)
+
+    list_grid = []
+
+    for d, axis in enumerate(axes):
+        shape = [1]*ndim
+        shape[d] = len(axis)
+        list_grid.append(np.reshape(np.array(axis, dtype=float), shape))
+
+    if not sparse:
+        list_grid = [np.array(grid_d)
+                     for grid_d in np.broadcast_arrays(*list_grid)]
+
+    if ndim == 2:
+        list_grid.append(None)
+
+    return list_grid
+
+def getGridShape(xx, yy, zz=None):
+    """
+    returns the shape of a (dense or open) grid
+    """
+
+    list_axes = getGridAxes(xx, yy, zz)
+
+    return tuple(len(axis) for axis in list_axes)
+
+def materialiseGrid(xx, yy, zz=None, copy=True):
+    """
+    returns the full coordinate arrays [xx, yy, (zz)] of a (dense or open)
+    grid, as np.mgrid would
+
+    if copy is False, read-only broadcast views are returned, which take no
+    additional memory
+    """
+
+    list_grid = [xx, yy]
+
+    if zz is not None:
+        list_grid.append(zz)
+
+    list_full = list(np.broadcast_arrays(*list_grid))
+
+    if copy:
+        list_full = [np.array(grid_d) for grid_d in list_full]
+
+    if zz is None:
+        list_full.append(None)
+
+    return list_full
+
+def getGridPoints(axes, i0=0, i1=None):
+    """
+    returns points [N x D] of a grid, defined by its axis vectors, for the
+    flat (C order) indices i0 up to i1
+    """
+
+    shape = tuple(len(axis) for axis in axes)
+
+    if i1 is None:
+        i1 = int(np.prod(shape))
+
+    list_idx = np.unravel_index(np.arange(i0, i1), shape)
+
+    Y_pos = np.empty(shape=(i1-i0, len(axes)))
+
+    for d, axis in enumerate(axes):
+        Y_pos[:, d] = axis[list_idx[d]]
+
+    return Y_pos
+
+def allocate_grid(shape, dtype=float, memory_budget=None, memmap_dir=None):
+    """
+    returns an uninitialised array to hold grid values
+
+    if memmap_dir is given and the array is larger than memory_budget
+    (bytes), the array is memory-mapped to a temporary file in memmap_dir.
+    The file is removed when the array is no longer referenced.
+    """
+
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+    if ((memmap_dir is not None) and
+        (memory_budget is not None) and
+        (nbytes > memory_budget)):
+        # anonymous file, removed on close
+        fid = tempfile.TemporaryFile(dir=memmap_dir)
+        return np.memmap(fid, dtype=dtype, mode="w+", shape=shape)
+
+    return np.empty(shape=shape, dtype=dtype)
+
+def fill_nan(ss, memory_budget=None):
+    """
+    replaces NaN's with the minimum (in place), in blocks of at most
+    memory_budget bytes
+    """
+
+    s = ss.reshape(-1)
+
+    if memory_budget is None:
+        nblock = s.size
+    else:
+        nblock = int(max(1, memory_budget // s.itemsize))
+
+    # minimum over all blocks
+    smin = np.inf
+    for i0 in range(0, s.size, nblock):
+        block = s[i0:i0+nblock]
+        if not np.isnan(block).all():
+            smin = min(smin, np.nanmin(block))
+
+    if smin == np.inf:
+        # nothing to fill with
+        return ss
+
+    for i0 in range(0, s.size, nblock):
+        block = s[i0:i0+nblock]
+        block[np.isnan(block)] = smin
+
+    return ss
+
+def getInterpolationError(ss):
+    """
+    returns an estimate of the error of (multi)linear interpolation between
+    the values ss on a grid, |f''| h^2 / 8 summed over the axes, with the
+    second differences of ss as |f''| h^2
+    """
+
+    error = np.zeros(shape=ss.shape)
+
+    for d in range(ss.ndim):
+        if ss.shape[d] < 3:
+            continue
+
+        d2 = np.abs(np.diff(ss, n=2, axis=d)) / 8.
+
+        # nodes on the edges take the values of their neighbours
+        pad_width = [(0, 0)]*ss.ndim
+        pad_width[d] = (1, 1)
+
+        error += np.pad(d2, pad_width, mode="edge")
+
+    return error
+
+def getAdaptiveAxes(axes, maxdepth):
+    """
+    returns axis vectors, covering the same range, with a number of points
+    that allows maxdepth refinements of a coarse grid, (k * 2^maxdepth + 1)
+    """
+
+    stride = 2**maxdepth
+
+    list_axes = []
+
+    for axis in axes:
+        ncells = max(1, int(np.ceil((len(axis) - 1) / (1. * stride))))
+        npoints = ncells * stride + 1
+        list_axes.append(np.linspace(axis[0], axis[-1], npoints))
+
+    return list_axes
+
+def eval_adaptive(func, axes, maxdepth, tol=None, max_block=2**20,
+                  boxes=None):
+    """
+    evaluates func adaptively on the grid defined by axes, and returns the
+    (dense) values and the number of points evaluated
+
+    starts on a coarse grid (every 2^maxdepth points), cells are refined
+    (halved) up to maxdepth times if their corner values differ (tol None,
+    suited for inside / outside) or vary by more than tol. The values of
+    cells that are not refined are interpolated (multilinear) from their
+    corners.
+
+    Features smaller than a coarse cell can fall between its corners, and
+    are missed. boxes (lower [K x D], upper [K x D]) bound the regions where
+    func may be nonzero, cells that overlap a box are refined as well,
+    unless all their corner values are nonzero (e.g. inside).
+
+    func: function of points [N x D], returns N values
+    axes: list of axis vectors, lengths (k * 2^maxdepth + 1), or 1 (e.g. a
+    single layer, not refined along that axis)
+    max_block: maximum number of values interpolated at once
+    boxes: (optional) tuple (lower, upper), see above
+    """
+
+    stride = 2**maxdepth
+
+    shape = tuple(len(axis) for axis in axes)
+    ndim = len(shape)
+
+    for n in shape:
+        if (n > 1) and (((n - 1) % stride) != 0):
+            raise ValueError("{0} points, expected k*{1}+1 (see getAdaptiveAxes)".format(n, stride))
+
+    ss = np.empty(shape=shape, dtype=float)
+    evaluated = np.zeros(shape=shape, dtype=bool)
+
+    ss_flat = ss.reshape(-1)
+    evaluated_flat = evaluated.reshape(-1)
+
+    def evaluate(idx):
+        # evaluate points [N x D] (indices), skip those already known
+        idx_flat = np.unique(np.ravel_multi_index(idx.T, shape))
+        idx_flat = idx_flat[~evaluated_flat[idx_flat]]
+
+        if idx_flat.size > 0:
+            list_idx = np.unravel_index(idx_flat, shape)
+            P = np.empty(shape=(idx_flat.size, ndim))
+            for d in range(ndim):
+                P[:, d] = axes[d][list_idx[d]]
+            ss_flat[idx_flat] = func(P)
+            evaluated_flat[idx_flat] = True
+
+        return idx_flat.size
+
+    def lattice(list_ranges):
+        # all combinations [N x D]
+        return np.array(list(itertools.product(*list_ranges)),
+                        dtype=int).reshape(-1, ndim)
+
+    # axes of a single point are not divided into cells
+    def per_axis(values):
+        return [values if n > 1 else [0] for n in shape]
+
+    # corners of a unit cell [2^D x D]
+    offsets_corner = lattice(per_axis([0, 1]))
+
+    # coarse grid
+    nevaluated = evaluate(lattice([range(0, n, stride) for n in shape]))
+
+    # cells, by lower corner
+    cells = lattice([range(0, max(n-1, 1), stride) for n in shape])
+
+    s = stride
+
+    while (s > 1) and (len(cells) > 0):
+
+        # corner values [ncells x 2^D]
+        corners = cells[:, np.newaxis, :] + s*offsets_corner[np.newaxis, :, :]
+        vals = ss[tuple(corners[:, :, d] for d in range(ndim))]
+
+        vmin = vals.min(axis=1)
+        vmax = vals.max(axis=1)
+
+        if tol is None:
+            refine = (vmin != vmax)
+        else:
+            refine = ((vmax - vmin) > tol)
+
+        # always refine non-finite values
+        refine |= ~np.isfinite(vals).all(axis=1)
+
+        if boxes is not None:
+            # cells that may hold features between their corners
+            refine |= (_overlaps_boxes(axes, cells, s*offsets_corner[-1],
+                                       boxes, max_block) &
+                       ~(vals != 0).all(axis=1))
+
+        # interpolate cells that are not refined
+        offsets_cell = lattice(per_axis(range(s+1)))
+        t = offsets_cell / (1. * s)
+        # multilinear weights [2^D x (s+1)^D]
+        W = np.ones(shape=(len(offsets_corner), len(offsets_cell)))
+        for d in range(ndim):
+            W *= np.where(offsets_corner[:, d:d+1] == 1,
+                          t[np.newaxis, :, d], 1. - t[np.newaxis, :, d])
+
+        cells_fill = cells[~refine]
+        vals_fill = vals[~refine]
+        nblock = max(1, max_block // len(offsets_cell))
+
+        for i0 in range(0, len(cells_fill), nblock):
+            these_cells = cells_fill[i0:i0+nblock]
+            these_vals = np.dot(vals_fill[i0:i0+nblock], W)
+            idx = these_cells[:, np.newaxis, :] + offsets_cell[np.newaxis, :, :]
+            idx_flat = np.ravel_multi_index(
+                            tuple(idx[:, :, d].ravel() for d in range(ndim)),
+                            shape)
+            mask = ~evaluated_flat[idx_flat]
+            ss_flat[idx_flat[mask]] = these_vals.ravel()[mask]
+
+        # refine cells
+        h = s // 2
+        parents = cells[refine]
+
+        offsets_new = h*lattice(per_axis([0, 1, 2]))
+        nblock = max(1, max_block // len(offsets_new))
+
+        for i0 in range(0, len(parents), nblock):
+            these_parents = parents[i0:i0+nblock]
+            idx = these_parents[:, np.newaxis, :] + offsets_new[np.newaxis, :, :]
+            nevaluated += evaluate(idx.reshape(-1, ndim))
+
+        cells = (parents[:, np.newaxis, :] +
+                 h*offsets_corner[np.newaxis, :, :]).reshape(-1, ndim)
+
+        s = h
+
+    return (ss, nevaluated)
+
+def _overlaps_boxes(axes, cells, size, boxes, max_block=2**20):
+    """
+    returns a boolean array, True for cells (lower corner indices [N x D],
+    size in indices [D]) that overlap any of boxes (lower [K x D], upper
+    [K x D])
+    """
+
+    (lower, upper) = boxes
+    lower = np.asarray(lower, dtype=float)
+    upper = np.asarray(upper, dtype=float)
+
+    ndim = len(axes)
+
+    cell_lower = np.empty(shape=cells.shape)
+    cell_upper = np.empty(shape=cells.shape)
+    for d in range(ndim):
+        cell_lower[:, d] = axes[d][cells[:, d]]
+        cell_upper[:, d] = axes[d][cells[:, d] + size[d]]
+
+    overlaps = np.zeros(len(cells), dtype=bool)
+
+    nblock = max(1, max_block // max(1, lower.shape[0] * ndim))
+
+    for i0 in range(0, len(cells), nblock):
+        i1 = i0 + nblock
+        overlaps[i0:i1] = np.any(np.all(
+            (cell_lower[i0:i1, np.newaxis, :] <= upper[np.newaxis, :, :]) &
+            (cell_upper[i0:i1, np.newaxis, :] >= lower[np.newaxis, :, :]),
+            axis=2), axis=1)
+
+    return overlaps
+
+def getPlanePoints(origin, u, v, resolution=[20, 20]):
+    """
+    returns points [nu x nv x D] on a plane (any orientation), spanned from
+    origin by the vectors u and v, origin + a*u + b*v with a, b in [0, 1]
+    """
+
+    origin = np.array(origin, dtype=float).reshape(-1)
+    u = np.array(u, dtype=float).reshape(-1)
+    v = np.array(v, dtype=float).reshape(-1)
+
+    if not (origin.shape == u.shape == v.shape):
+        raise ValueError("dimensions of origin, u, and v do not match")
+
+    if np.linalg.matrix_rank(np.array([u, v])) < 2:
+        raise ValueError("u and v do not span a plane")
+
+    [nu, nv] = resolution
+
+    a = np.linspace(0., 1., nu)
+    b = np.linspace(0., 1., nv)
+
+    P = (origin[np.newaxis, np.newaxis, :] +
+         a[:, np.newaxis, np.newaxis]*u[np.newaxis, np.newaxis, :] +
+         b[np.newaxis, :, np.newaxis]*v[np.newaxis, np.newaxis, :])
+
+    return P
+
+def getPolylinePoints(Y_path, npoints=100):
+    """
+    returns (P, s), npoints [npoints x D] spaced equally along a polyline
+    Y_path [M x D], and their distance s along the polyline
+    """
+
+    Y_path = np.array(Y_path, dtype=float)
+
+    if (Y_path.ndim != 2) or (Y_path.shape[0] < 2):
+        raise ValueError("expected polyline [M x D], M > 1, not {0}".format(Y_path.shape))
+
+    # distance along the polyline
+    s_path = np.zeros(Y_path.shape[0])
+    s_path[1:] = np.cumsum(np.sqrt(np.sum(np.diff(Y_path, axis=0)**2, axis=1)))
+
+    if s_path[-1] <= 0.:
+        raise ValueError("polyline has no length")
+
+    s = np.linspace(0., s_path[-1], npoints)
+
+    P = np.empty(shape=(npoints, Y_path.shape[1]))
+
+    for d in range(Y_path.shape[1]):
+        P[:, d] = np.interp(s, s_path, Y_path[:, d])
+
+    return (P, s)
+
+def getCorridorPoints(Y_path, width, npoints=100, nwidth=11):
+    """
+    returns (P, s), points in a corridor around a polyline Y_path [M x D],
+    and the distance s along the polyline
+
+    at npoints along the polyline, points are placed perpendicular to the
+    path, up to width away: P is [npoints x nwidth x 2] in 2d, and
+    [npoints x nwidth x nwidth x 3] (a square cross-section) in 3d
+    """
+
+    (Pc, s) = getPolylinePoints(Y_path, npoints)
+
+    ndim = Pc.shape[1]
+
+    # unit tangents
+    T = np.gradient(Pc, axis=0)
+    T /= np.sqrt(np.sum(T**2, axis=1))[:, np.newaxis]
+
+    w = np.linspace(-width, width, nwidth)
+
+    if ndim == 2:
+        N = np.array([-T[:, 1], T[:, 0]]).T
+        P = Pc[:, np.newaxis, :] + w[np.newaxis, :, np.newaxis]*N[:, np.newaxis, :]
+    elif ndim == 3:
+        # reference, the axis least aligned with the path
+        ref = np.zeros(3)
+        ref[np.argmin(np.abs(T).sum(axis=0))] = 1.
+        N1 = np.cross(T, ref)
+        # fall back where the path is parallel to the reference
+        parallel = (np.sqrt(np.sum(N1**2, axis=1)) < 1e-8)
+        N1[parallel] = np.cross(T[parallel], np.roll(ref, 1))
+        N1 /= np.sqrt(np.sum(N1**2, axis=1))[:, np.newaxis]
+        N2 = np.cross(T, N1)
+        P = (Pc[:, np.newaxis, np.newaxis, :] +
+             w[np.newaxis, :, np.newaxis, np.newaxis]*N1[:, np.newaxis, np.newaxis, :] +
+             w[np.newaxis, np.newaxis, :, np.newaxis]*N2[:, np.newaxis, np.newaxis, :])
+    else:
+        raise NotImplementedError("{0}d corridor not available".format(ndim))
+
+    return (P, s)
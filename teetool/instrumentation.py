@@ -0,0 +1,198 @@
+# opt-in timing and counters of the stages of models and worlds
+
+from __future__ import print_function
+import json
+import timeit
+
+# wall clock
+clock = timeit.default_timer
+
+# stages recorded by models and worlds
+STAGES = ["decimate", "fit", "cells", "hulls", "cache", "interpolate", "grid",
+          "dispatch", "evaluate", "scatter"]
+
+# recorded per stage
+FIELDS = ["calls", "time", "points", "hits", "misses"]
+
+
+class _Stage(object):
+    """
+    context, records the wall time of a stage on exit
+    """
+
+    def __init__(self, instrumentation, name, npoints):
+        self._instrumentation = instrumentation
+        self._name = name
+        self._npoints = npoints
+        self._start = None
+
+    def __enter__(self):
+        self._start = clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._instrumentation.add(self._name, clock() - self._start,
+                                  npoints=self._npoints)
+
+
+class _NullStage(object):
+    """
+    context that records nothing, instrumentation is off
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(instrumentation, name, npoints=0):
+    """
+    returns a context that records stage name (if instrumentation is not
+    None), e.g. with stage(self.instrumentation, "grid", N): ...
+    """
+
+    if instrumentation is None:
+        return _NULL_STAGE
+
+    return instrumentation.stage(name, npoints)
+
+
+def count(instrumentation, name, hit):
+    """
+    records a hit (True) or miss (False) of stage name (if instrumentation
+    is not None)
+    """
+
+    if instrumentation is not None:
+        instrumentation.count(name, hit)
+
+
+class Instrumentation(object):
+    """
+    This class records the wall time, number of calls, number of points, and
+    cache hits and misses per stage
+
+    Instrumentation is opt-in, assign an instance to World.instrumentation
+    (shared with the models of all clusters) or Model.instrumentation.
+
+    stages are
+    "fit": fitting a model (points are data-points)
+    "cells": construction of the Gaussian cells
+    "hulls": point clouds representing the tube
+    "cache": previously calculated grids (hits and misses)
+    "interpolate": slices and queries interpolated from grids (hits and
+    misses)
+    "grid": generation of grid points
+    "dispatch": sharing and evaluating jobs by an executor (wall time)
+    "evaluate": evaluation by the workers (sum over workers)
+    "scatter": writing values into the output
+    """
+
+    def __init__(self):
+        """
+        initialises Instrumentation, nothing recorded
+        """
+
+        self._stages = {}
+
+    def _getStage(self, name):
+        if name not in self._stages:
+            self._stages[name] = dict((field, 0) for field in FIELDS)
+            self._stages[name]["time"] = 0.
+
+        return self._stages[name]
+
+    def stage(self, name, npoints=0):
+        """
+        returns a context that records the wall time of stage name
+        """
+
+        return _Stage(self, name, npoints)
+
+    def add(self, name, elapsed=0., calls=1, npoints=0):
+        """
+        records calls of stage name, taking elapsed seconds
+        """
+
+        this_stage = self._getStage(name)
+
+        this_stage["calls"] += calls
+        this_stage["time"] += elapsed
+        this_stage["points"] += int(npoints)
+
+    def count(self, name, hit):
+        """
+        records a hit (True) or miss (False) of stage name
+        """
+
+        this_stage = self._getStage(name)
+
+        if hit:
+            this_stage["hits"] += 1
+        else:
+            this_stage["misses"] += 1
+
+    def merge(self, other):
+        """
+        adds the records of other (Instrumentation), e.g. of a worker
+        """
+
+        for (name, other_stage) in other._stages.items():
+            this_stage = self._getStage(name)
+            for field in FIELDS:
+                this_stage[field] += other_stage[field]
+
+    def reset(self):
+        """
+        removes all records
+        """
+
+        self._stages = {}
+
+    def asDict(self):
+        """
+        returns dict {stage: {"calls", "time", "points", "hits", "misses"}}
+        """
+
+        return dict((name, dict(this_stage))
+                    for (name, this_stage) in self._stages.items())
+
+    def export(self, filename):
+        """
+        writes the records to filename, as CSV (.csv) or JSON (otherwise)
+        """
+
+        records = self.asDict()
+
+        with open(filename, "w") as fid:
+            if filename.endswith(".csv"):
+                fid.write(",".join(["stage"] + FIELDS) + "\n")
+                for name in sorted(records):
+                    values = [str(records[name][field]) for field in FIELDS]
+                    fid.write(",".join([name] + values) + "\n")
+            else:
+                json.dump(records, fid, indent=1, sort_keys=True)
+
+    def overview(self):
+        """
+        prints overview in console
+        """
+
+        print("*** instrumentation ***")
+
+        # known stages first, in order of the pipeline
+        names = [name for name in STAGES if name in self._stages]
+        names += sorted(name for name in self._stages if name not in STAGES)
+
+        for name in names:
+            this_stage = self._stages[name]
+            print("{0:12s} {1:8d} calls {2:10.4f} s {3:12d} points "
+                  "{4:6d} hits {5:6d} misses".format(name,
+                    this_stage["calls"], this_stage["time"],
+                    this_stage["points"], this_stage["hits"],
+                    this_stage["misses"]))
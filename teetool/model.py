@@ -3,33 +3,241 @@
 from __future__ import print_function
 import numpy as np
 from numpy.linalg import det, inv, svd, pinv
-from scipy.interpolate import griddata
+from scipy.linalg import solveh_banded
 
-import time, sys
+import itertools
+import hashlib
+import json
 import teetool as tt
 
-import multiprocessing as mp
 from functools import partial
 
 
+def _logp_range(arrays, i0, i1, name_P, name_cells):
+    """
+    returns the log-likelihood of the points [i0, i1) of the shared array
+    name_P, based on the shared cells name_cells (see Model._getCellArrays)
+    """
+
+    P = np.asarray(arrays[name_P][i0:i1])
+
+    return tt.helpers.gauss_logLc_cells(P, P.shape[1],
+                                        arrays[name_cells + "_cc"],
+                                        arrays[name_cells + "_cLinv"],
+                                        arrays[name_cells + "_clogdet"])
+
+
+def _inside_range(arrays, i0, i1, name_P, name_clouds):
+    """
+    returns True for the points of the shared array name_P that are inside
+    any of the point clouds [i0, i1) of name_clouds (see
+    Model._getCloudArrays)
+    """
+
+    P = np.asarray(arrays[name_P])
+
+    Y_all = arrays[name_clouds + "_Y"]
+    offsets = arrays[name_clouds + "_offsets"]
+
+    s = np.zeros(P.shape[0], dtype=bool)
+
+    for i in range(i0, i1):
+        Y = np.asarray(Y_all[offsets[i]:offsets[i+1]])
+        s |= tt.helpers.in_hull(P, Y).reshape(-1)
+
+    return s
+
+
 class Model(object):
     """
     This class provides the interface to the probabilistic
     modelling of trajectories
 
     <description>
+
+    Grids are evaluated in tiles, such that the working memory stays within
+    a memory budget (in bytes). Results are written directly into the output
+    array, which is memory-mapped to a temporary file (in memmap_dir) when
+    it is larger than the memory budget itself.
     """
 
-    def __init__(self, cluster_data, settings):
+    # default working memory for evaluating grids [bytes]
+    MEMORY_BUDGET = 2**28
+
+    # estimated peak memory per point during evaluation (coordinates,
+    # indices, intermediate results) [bytes]
+    EVAL_BYTES_PER_POINT = 512
+
+    def __init__(self, cluster_data, settings, instrumentation=None):
         """
-        cluster_data is a list of (x, Y)
+        cluster_data is a ClusterData, or a list of (x, Y)
+
+        instrumentation (optional) records the stages, see Instrumentation
 
         settings
         "model_type" = resampling, ML, or EM
         "ngaus": number of Gaussians to create for output
         REQUIRED for ML and EM
-        "basis_type" = gaussian, bernstein
+        "basis_type" = rbf, bernstein, bspline
         "nbasis": number of basis functions
+        OPTIONAL
+        "decimate_tol": trajectories are decimated before fitting, within
+        this distance (see ClusterData.decimate)
+        "decimate_method": douglas_peucker (default) or uniform
+        """
+
+        # check validity
+        self.checkSettings(settings)
+
+        self._initAttributes(instrumentation)
+
+        # columnar storage
+        cluster_data = self._as_cluster_data(cluster_data)
+
+        # write global settings
+        self._ndim = self._getDimension(cluster_data)
+
+        if settings.get("decimate_tol") is not None:
+            with tt.instrumentation.stage(self.instrumentation, "decimate",
+                                          cluster_data.getNumberOfPoints()):
+                # fewer data-points, fit time depends on the shapes
+                cluster_data = cluster_data.decimate(settings["decimate_tol"],
+                        settings.get("decimate_method", "douglas_peucker"))
+
+        # Fit x on a [0, 1] domain
+        norm_cluster_data = self._normalise_data(cluster_data)
+
+        with tt.instrumentation.stage(self.instrumentation, "fit",
+                                      cluster_data.getNumberOfPoints()):
+            # this part is specific for resampling
+            if settings["model_type"] == "resampling":
+                (mu_y, sig_y) = self._model_by_resampling(norm_cluster_data,
+                                                          settings["ngaus"])
+            elif settings["model_type"] == "ML":
+                (mu_y, sig_y) = self._model_by_ml(norm_cluster_data,
+                                                  settings["ngaus"],
+                                                  settings["basis_type"],
+                                                  settings["nbasis"])
+            elif settings["model_type"] == "EM":
+                (mu_y, sig_y) = self._model_by_em(norm_cluster_data,
+                                                  settings["ngaus"],
+                                                  settings["basis_type"],
+                                                  settings["nbasis"])
+
+            else:
+                raise NotImplementedError("{0} not available".format(settings["model_type"]))
+
+        with tt.instrumentation.stage(self.instrumentation, "cells",
+                                      settings["ngaus"]):
+            # convert to cells
+            (cc, cA) = self._getGMMCells(mu_y, sig_y, settings["ngaus"])
+            self._setCells(cc, cA)
+
+        # store values
+        self._settings = dict(settings)
+        self._mu_y = mu_y
+        self._sig_y = sig_y
+
+    def _initAttributes(self, instrumentation=None):
+        """
+        sets the attributes that do not depend on the fit (see __init__ and
+        load)
+        """
+
+        self.instrumentation = instrumentation
+
+        # create a list to store previous calculated values
+        self._list_tube = []
+        self._list_logp = []
+        # interpolation error estimates [ss, error] of stored values
+        self._list_error = []
+
+        # persistent cache of evaluated grids (storage.GridCache), optional
+        self.grid_cache = None
+        self._fingerprint = None
+
+        # parallel evaluation, see parallel.getExecutor
+        self.backend = "auto"
+        self.nworkers = None
+
+    def save(self, path, cached=False):
+        """
+        saves the model in directory path (see storage), including the
+        previously calculated grids if cached is True
+        """
+
+        manifest = {"ndim": self._ndim,
+                    "settings": self._settings,
+                    "matrix": isinstance(self._mu_y, np.matrix),
+                    "tube": [],
+                    "logp": []}
+
+        if cached:
+            for (i, [ss, sdwidth, axes]) in enumerate(self._list_tube):
+                name = "tube_{0}".format(i)
+                tt.storage.save_array(path, name, ss)
+                manifest["tube"].append({"name": name,
+                                         "sdwidth": float(sdwidth),
+                                         "axes": [list(map(float, axis))
+                                                  for axis in axes]})
+
+            for (i, [ss, axes]) in enumerate(self._list_logp):
+                name = "logp_{0}".format(i)
+                tt.storage.save_array(path, name, ss)
+                manifest["logp"].append({"name": name,
+                                         "axes": [list(map(float, axis))
+                                                  for axis in axes]})
+
+        tt.storage.save_array(path, "mu_y", self._mu_y)
+        tt.storage.save_array(path, "sig_y", self._sig_y)
+        tt.storage.save_array(path, "cc", np.array(self._cc, dtype=float))
+        tt.storage.save_array(path, "cA", np.array(self._cA, dtype=float))
+
+        # written last, once all arrays are in place (see storage.save_array)
+        tt.storage.write_manifest(path, "model", manifest)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        returns a Model saved in directory path, without fitting. Grids are
+        memory-mapped unless mmap_mode is None
+        """
+
+        manifest = tt.storage.read_manifest(path, "model")
+
+        new_model = cls.__new__(cls)
+        new_model._initAttributes()
+
+        new_model._ndim = manifest["ndim"]
+        new_model._settings = manifest["settings"]
+
+        new_model._mu_y = tt.storage.load_array(path, "mu_y")
+        new_model._sig_y = tt.storage.load_array(path, "sig_y")
+
+        if manifest["matrix"]:
+            new_model._mu_y = np.mat(new_model._mu_y)
+            new_model._sig_y = np.mat(new_model._sig_y)
+
+        cc = tt.storage.load_array(path, "cc")
+        cA = tt.storage.load_array(path, "cA")
+        new_model._setCells(cc.reshape(cA.shape[:2]), cA)
+
+        for item in manifest["tube"]:
+            ss = tt.storage.load_array(path, item["name"], mmap_mode)
+            axes = [np.array(axis) for axis in item["axes"]]
+            new_model._list_tube.append([ss, item["sdwidth"], axes])
+
+        for item in manifest["logp"]:
+            ss = tt.storage.load_array(path, item["name"], mmap_mode)
+            axes = [np.array(axis) for axis in item["axes"]]
+            new_model._list_logp.append([ss, axes])
+
+        return new_model
+
+    @staticmethod
+    def checkSettings(settings):
+        """
+        raises an error if settings are not valid
         """
 
         if "model_type" not in settings:
@@ -55,43 +263,18 @@ class Model(object):
             if settings["nbasis"] < 2:
                 raise ValueError("nbasis should be larger than 2")
 
-        # write global settings
-        self._ndim = self._getDimension(cluster_data)
-
-        # Fit x on a [0, 1] domain
-        norm_cluster_data = self._normalise_data(cluster_data)
-
-        # this part is specific for resampling
-        if settings["model_type"] == "resampling":
-            (mu_y, sig_y) = self._model_by_resampling(norm_cluster_data,
-                                                      settings["ngaus"])
-        elif settings["model_type"] == "ML":
-            (mu_y, sig_y) = self._model_by_ml(norm_cluster_data,
-                                              settings["ngaus"],
-                                              settings["basis_type"],
-                                              settings["nbasis"])
-        elif settings["model_type"] == "EM":
-            (mu_y, sig_y) = self._model_by_em(norm_cluster_data,
-                                              settings["ngaus"],
-                                              settings["basis_type"],
-                                              settings["nbasis"])
-
-        else:
-            raise NotImplementedError("{0} not available".format(settings["model_type"]))
-
-        # convert to cells
-        (cc, cA) = self._getGMMCells(mu_y, sig_y, settings["ngaus"])
+        if settings.get("decimate_tol") is not None:
+            if not isinstance(settings["decimate_tol"], (int, float)):
+                raise TypeError("expected number")
 
-        # store values
-        self._mu_y = mu_y
-        self._sig_y = sig_y
-        #
-        self._cc = cc
-        self._cA = cA
+            if settings["decimate_tol"] < 0:
+                raise ValueError("decimate_tol should be at least 0")
 
-        # create a list to store previous calculated values
-        self._list_tube = []
-        self._list_logp = []
+        if "decimate_method" in settings:
+            if (settings["decimate_method"] not in
+                tt.cluster_data.ClusterData.DECIMATE_METHODS):
+                raise ValueError("decimate_method should be one of {0}".format(
+                                tt.cluster_data.ClusterData.DECIMATE_METHODS))
 
     def getMean(self):
         """
@@ -128,7 +311,7 @@ class Model(object):
         mu_y = self._mu_y
         sig_y = self._sig_y
 
-        npoints = np.size(mu_y, axis=0) / ndim
+        npoints = np.size(mu_y, axis=0) // ndim
 
         [U, S_diag, V] = svd(sig_y)
 
@@ -155,9 +338,7 @@ class Model(object):
         evaluates the ellipse
         """
 
-        ndim = self._ndim
-
-        c = np.array(c)
+        c = np.array(c).reshape(1, -1)
         A = np.mat(A)
 
         # find the rotation matrix and radii of the axes
@@ -165,20 +346,29 @@ class Model(object):
 
         radii = sdwidth * np.sqrt(s)
 
+        ap = np.mat(self._getUnitEllipse(npoints) * radii)
+
+        ap = ap * rotation.transpose() + c
+
+        return np.mat(ap)
+
+    def _getUnitEllipse(self, npoints=10):
+        """
+        returns points on a unit circle [npoints x 2] (2d), or sphere
+        [npoints^2 x 3] (3d)
+        """
+
+        ndim = self._ndim
+
         if ndim == 2:
             # 2d
             u = np.linspace(0.0, 2.0 * np.pi, npoints)
-            x = radii[0] * np.cos(u)
-            y = radii[1] * np.sin(u)
 
-            ellipse = np.empty(shape=(npoints, ndim))
-            ellipse[:,0] = x
-            ellipse[:,1] = y
-            ellipse = np.mat(ellipse)
+            ap = np.empty(shape=(npoints, ndim))
+            ap[:, 0] = np.cos(u)
+            ap[:, 1] = np.sin(u)
 
-            ellipse = ellipse * rotation.transpose() + c.transpose()
-
-            return np.mat(ellipse)
+            return ap
 
         if ndim == 3:
             # 3d
@@ -186,27 +376,31 @@ class Model(object):
             u = np.linspace(0.0, 2.0 * np.pi, npoints)
             v = np.linspace(0.0, np.pi, npoints)
 
-            x = radii[0] * np.outer(np.cos(u), np.sin(v))
-            y = radii[1] * np.outer(np.sin(u), np.sin(v))
-            z = radii[2] * np.outer(np.ones_like(u), np.cos(v))
+            x = np.outer(np.cos(u), np.sin(v))
+            y = np.outer(np.sin(u), np.sin(v))
+            z = np.outer(np.ones_like(u), np.cos(v))
 
-            x = x.reshape((-1,1), order='F')
-            y = y.reshape((-1,1), order='F')
-            z = z.reshape((-1,1), order='F')
+            ap = np.empty(shape=(npoints*npoints, ndim))
+            ap[:, 0] = x.reshape(-1, order='F')
+            ap[:, 1] = y.reshape(-1, order='F')
+            ap[:, 2] = z.reshape(-1, order='F')
 
-            (nrows, ncols) = x.shape
+            return ap
 
-            ap = np.zeros(shape=(nrows, ndim))
+    def _getEllipses(self, sdwidth=1, npoints=10):
+        """
+        returns the ellipses of all cells at once, [ngaus x npoints x D]
+        (2d) or [ngaus x npoints^2 x D] (3d), as _getEllipse
+        """
 
-            ap[:, 0] = x.transpose()
-            ap[:, 1] = y.transpose()
-            ap[:, 2] = z.transpose()
+        # find the rotation matrices and radii of the axes
+        [_, s, rotation] = svd(self._cA)
 
-            ap = np.mat(ap)
+        radii = sdwidth * np.sqrt(s)
 
-            ap = ap * rotation.transpose() + c.transpose()
+        ap = self._getUnitEllipse(npoints)[np.newaxis, :, :] * radii[:, np.newaxis, :]
 
-            return np.mat(ap)
+        return np.matmul(ap, np.swapaxes(rotation, 1, 2)) + self._cc[:, np.newaxis, :]
 
 
     def _getSample(self, c, A, nsamples=1, std=1):
@@ -242,19 +436,8 @@ class Model(object):
 
         ndim = self._ndim
 
-        ngaus = len(self._cc)
-
-        Y_list = []
-
-        for i in range(ngaus):
-            c = self._cc[i]
-            A = self._cA[i]
-
-            Yi = self._getEllipse(c, A, sdwidth, nsamples)
-
-            Y_list.append(Yi)
-
-        Y = np.concatenate(Y_list, axis=0)
+        # all cells at once
+        Y = self._getEllipses(sdwidth, nsamples).reshape(-1, ndim)
 
         return np.mat(Y)
 
@@ -264,57 +447,86 @@ class Model(object):
         """
 
         (npoints, _) = Y_pos.shape
-        ndim = self._ndim
+        (ngaus, _) = self._cc.shape
 
-        # convert to list
-        Y_pos_list = []
+        # cells are shared once, tasks are ranges of points
+        with self._getExecutor(npoints * ngaus, "logp") as executor, \
+             executor.share(self._getCellArrays("cells")) as shared:
+            return self._eval_logp_shared(Y_pos, executor, shared)
 
-        for y in Y_pos:
-            Y_pos_list.append(y)
+    def _eval_logp_shared(self, Y_pos, executor, shared):
+        """
+        evaluates points Y_pos NxD, based on the cells shared with executor
+        (see _getCellArrays, named "cells")
+        """
 
-        # create partial function (map only takes one argument)
-        # ndim, cc, cA
-        func = partial(tt.helpers.gauss_logLc, ndim=ndim, cc=self._cc, cA=self._cA)
+        (npoints, _) = Y_pos.shape
 
-        # parallel processing
-        ncores = mp.cpu_count()
-        p = mp.Pool(processes=ncores)
+        list_jobs = [(_logp_range, i0, i1, ("P", "cells"))
+                     for (i0, i1) in tt.parallel.chunk_ranges(npoints,
+                            executor.nworkers, tt.parallel.MIN_CHUNK_POINTS)]
 
         # output - extract results
-        list_val = p.map(func, Y_pos_list)
+        list_val = tt.parallel.map_jobs({"P": Y_pos}, list_jobs, executor,
+                                        shared, self.instrumentation)
 
-        # cleanup
-        p.close()
-        p.join()
+        return np.concatenate(list_val).reshape(-1)
 
+    def _eval_grid(self, func, axes, dtype=float, memory_budget=None,
+                   memmap_dir=None, kind=None, arrays=None, nitems=1):
+        """
+        evaluates func on a grid, tile by tile, and returns the values
+
+        func: function of (points [N x D], executor, shared), returns N
+        values
+        axes: list of axis vectors, defining the grid
+        memory_budget: working memory in bytes (None is default)
+        memmap_dir: directory for memory-mapped output (None is RAM only)
+        kind: "logp" or "tube", a single executor (see _getExecutor, for
+        points x nitems) evaluates all tiles, and arrays (dict) are shared
+        once with its workers (shared)
         """
-        # parallel processing
-        p = mp.ProcessingPool()
 
-        # output
-        results = p.amap(self._gauss_logLc, Y_pos)
+        if memory_budget is None:
+            memory_budget = self.MEMORY_BUDGET
 
-        while not results.ready():
-            # obtain intermediate results
-            print(".", end="")
-            sys.stdout.flush()
-            time.sleep(1)
+        shape = tuple(len(axis) for axis in axes)
 
-        print("") # new line
+        # preallocate output
+        ss = tt.helpers.allocate_grid(shape, dtype, memory_budget,
+                                      memmap_dir)
 
-        # extract results
-        list_val = results.get()
-        """
+        # flat view, writing in C order
+        s = ss.reshape(-1)
 
-        s = np.array(list_val).squeeze()
+        npoints = s.size
+        ntile = int(max(1, memory_budget // self.EVAL_BYTES_PER_POINT))
 
-        return s
+        if arrays is None:
+            arrays = {}
+
+        with self._getExecutor(npoints * nitems, kind) as executor, \
+             executor.share(arrays) as shared:
+            for i0 in range(0, npoints, ntile):
+                i1 = min(i0 + ntile, npoints)
+                # points in this tile
+                with tt.instrumentation.stage(self.instrumentation, "grid",
+                                              i1 - i0):
+                    Y_pos = tt.helpers.getGridPoints(axes, i0, i1)
+                # evaluate
+                s_tile = func(Y_pos, executor, shared)
+                # write into output
+                with tt.instrumentation.stage(self.instrumentation, "scatter",
+                                              i1 - i0):
+                    s[i0:i1] = s_tile
+
+        return ss
 
     def _grid2points(self, xx, yy, zz=None):
         """
         returns an Y matrix for a given grid
 
-        xx, yy, (zz) are mgrid
+        xx, yy, (zz) are mgrid (or ogrid)
 
         """
 
@@ -376,7 +588,7 @@ class Model(object):
         for i, y_idx in enumerate(Y_idx):
             # pass all positions (passes rows)
 
-            if self._ndim is 2:
+            if self._ndim == 2:
                 # 2d
                 [ix, iy] = y_idx
                 ss[ix, iy] = s[i]
@@ -389,90 +601,466 @@ class Model(object):
 
         return ss
 
-    def isInside_grid(self, sdwidth, xx, yy, zz=None):
+    def _check_grid(self, xx, yy, zz=None):
+        """
+        checks a (dense or open) grid, returns the axis vectors
+        """
+
+        if (self._ndim == 3) and (zz is None):
+            raise ValueError("expected a 3d grid, zz is missing")
+
+        if (self._ndim == 2) and (zz is not None):
+            raise ValueError("expected a 2d grid, zz should be None")
+
+        try:
+            np.broadcast(*[g for g in (xx, yy, zz) if g is not None])
+            axes = tt.helpers.getGridAxes(xx, yy, zz)
+        except ValueError:
+            raise ValueError("dimensions should equal (use np.mgrid or np.ogrid)")
+
+        return axes
+
+    def _equal_axes(self, axes1, axes2):
+        """
+        returns True if both lists of axis vectors are identical
+        """
+
+        if len(axes1) != len(axes2):
+            return False
+
+        for (a1, a2) in zip(axes1, axes2):
+            if not np.array_equal(a1, a2):
+                return False
+
+        return True
+
+    def _getCached(self, kind, axes, sdwidth=None):
+        """
+        returns previously calculated values on a grid, or None
+
+        kind is "tube" (requires sdwidth) or "logp"
+        """
+
+        ss = None
+
+        if kind == "tube":
+            # pass previous calculated versions
+            for [ss1, sdwidth1, axes1] in self._list_tube:
+                # check if exactly the same
+                if (self._equal_axes(axes1, axes) and
+                    np.all(sdwidth1==sdwidth)):
+                    # copy
+                    ss = ss1
+        else:
+            # pass previous calculated versions
+            for [ss1, axes1] in self._list_logp:
+                # check if exactly the same
+                if self._equal_axes(axes1, axes):
+                    # copy
+                    ss = ss1
+
+        if (ss is None) and (self.grid_cache is not None):
+            # calculated by a previous run, or another process
+            key = self.grid_cache.getKey(self.getFingerprint(), kind, axes,
+                                         sdwidth)
+            ss = self.grid_cache.get(key)
+
+            if ss is not None:
+                self._storeCached(kind, ss, axes, sdwidth, persistent=False)
+
+        tt.instrumentation.count(self.instrumentation, "cache", ss is not None)
+
+        return ss
+
+    def _storeCached(self, kind, ss, axes, sdwidth=None, persistent=True):
+        """
+        stores calculated values on a grid (axis vectors only), also in the
+        persistent cache (if any) if persistent is True
+        """
+
+        if kind == "tube":
+            self._list_tube.append([ss, sdwidth, axes])
+        else:
+            self._list_logp.append([ss, axes])
+
+        if persistent and (self.grid_cache is not None):
+            key = self.grid_cache.getKey(self.getFingerprint(), kind, axes,
+                                         sdwidth)
+            self.grid_cache.put(key, ss)
+
+    def clearCached(self):
+        """
+        removes previously calculated values, the persistent cache (if any)
+        is not affected
+        """
+
+        self._list_tube = []
+        self._list_logp = []
+        self._list_error = []
+
+    def getFingerprint(self):
+        """
+        returns a fingerprint (sha1 hex digest) of the model, based on the
+        settings and the fitted parameters
+        """
+
+        if self._fingerprint is None:
+            h = hashlib.sha1()
+
+            settings = json.dumps(self._settings, sort_keys=True, default=str)
+
+            h.update(settings.encode("utf-8"))
+            h.update("{0}".format(self._ndim).encode("utf-8"))
+
+            for arr in [self._mu_y, self._sig_y, self._cc, self._cA]:
+                h.update(np.ascontiguousarray(arr, dtype=float).tobytes())
+
+            self._fingerprint = h.hexdigest()
+
+        return self._fingerprint
+
+    def _findCached(self, kind, P, sdwidth=None):
+        """
+        returns (ss, axes) of the finest previously calculated grid that
+        holds all points P NxD (and allows interpolation), or None
+        """
+
+        if kind == "tube":
+            list_cached = [[ss1, axes1] for [ss1, sdwidth1, axes1]
+                           in self._list_tube if np.all(sdwidth1==sdwidth)]
+        else:
+            list_cached = self._list_logp
+
+        found = None
+        found_volume = np.inf
+
+        for [ss1, axes1] in list_cached:
+            if len(axes1) != P.shape[1]:
+                continue
+
+            # at least two points along each axis
+            if min(len(axis) for axis in axes1) < 2:
+                continue
+
+            inside = True
+            for (d, axis) in enumerate(axes1):
+                eps = 1e-9*(axis[-1] - axis[0])
+                if ((P[:, d].min() < axis[0] - eps) or
+                    (P[:, d].max() > axis[-1] + eps)):
+                    inside = False
+
+            if not inside:
+                continue
+
+            # volume of a cell
+            volume = np.prod([(axis[-1] - axis[0]) / (len(axis) - 1.)
+                              for axis in axes1])
+
+            if volume < found_volume:
+                found = (ss1, axes1)
+                found_volume = volume
+
+        return found
+
+    def _getCachedError(self, ss):
+        """
+        returns the interpolation error estimate of previously calculated
+        values ss, see helpers.getInterpolationError
+        """
+
+        for [ss1, error1] in self._list_error:
+            if ss1 is ss:
+                return error1
+
+        error = tt.helpers.getInterpolationError(ss)
+
+        self._list_error.append([ss, error])
+
+        return error
+
+    def interpolateCached(self, kind, P, sdwidth=None, tol=1.):
+        """
+        returns values at points P NxD, interpolated from a previously
+        calculated grid that holds all points, or None if not available
+
+        kind is "tube" (requires sdwidth) or "logp". Values are interpolated
+        (multilinear), and recalculated where the estimated error exceeds
+        tol ("logp") or near the boundary of the tube ("tube")
+        """
+
+        P = np.array(P, dtype=float).reshape(-1, self._ndim)
+
+        found = self._findCached(kind, P, sdwidth)
+
+        tt.instrumentation.count(self.instrumentation, "interpolate",
+                                 found is not None)
+
+        if found is None:
+            return None
+
+        with tt.instrumentation.stage(self.instrumentation, "interpolate",
+                                      P.shape[0]):
+            return self._interpolateFound(kind, P, found, sdwidth, tol)
+
+    def _interpolateFound(self, kind, P, found, sdwidth, tol):
+        """
+        returns values at points P NxD, interpolated from found (ss, axes),
+        see interpolateCached
+        """
+
+        (ss, axes) = found
+
+        # clip, points are inside up to rounding
+        for (d, axis) in enumerate(axes):
+            P[:, d] = np.clip(P[:, d], axis[0], axis[-1])
+
+        # imported when needed, scipy.interpolate is slow to import
+        from scipy.interpolate import RegularGridInterpolator
+
+        interp = RegularGridInterpolator(tuple(axes), ss)
+        s = interp(P)
+
+        # lower corners of the cells
+        idx_low = [np.clip(np.searchsorted(axis, P[:, d], side="right") - 1,
+                           0, len(axis) - 2)
+                   for (d, axis) in enumerate(axes)]
+
+        if kind == "tube":
+            values = ss
+        else:
+            values = self._getCachedError(ss)
+
+        # extremes over the corners of the cells
+        vmin = np.empty(P.shape[0])
+        vmax = np.empty(P.shape[0])
+        vmin.fill(np.inf)
+        vmax.fill(-np.inf)
+
+        for corner in itertools.product([0, 1], repeat=len(axes)):
+            v = values[tuple(idx + c for (idx, c) in zip(idx_low, corner))]
+            vmin = np.minimum(vmin, v)
+            vmax = np.maximum(vmax, v)
+
+        if kind == "tube":
+            # not all corners agree
+            recalculate = (vmin != vmax)
+        else:
+            recalculate = ~(vmax <= tol)
+
+        idx = np.flatnonzero(recalculate)
+
+        if idx.size > 0:
+            if kind == "tube":
+                s[idx] = self.isInside_pnts(P[idx, :], sdwidth, nsamples=12)
+            else:
+                s[idx] = self.evalLogLikelihood_pnts(P[idx, :])
+
+        return s
+
+    def isInside_grid(self, sdwidth, xx, yy, zz=None, memory_budget=None,
+                      memmap_dir=None):
         """
         evaluate if points are inside a grid
 
+        accepts dense (np.mgrid) and open (np.ogrid) grids
+
         Input parameters:
             - sdwidth
             - xx
             - yy
             - zz (when 3d)
+            - memory_budget: working memory in bytes
+            - memmap_dir: directory for memory-mapped output
         """
 
-        # check values
-        if not (xx.shape == yy.shape):
-            raise ValueError("dimensions should equal (use np.mgrid)")
+        # check values, obtain axis vectors
+        axes = self._check_grid(xx, yy, zz)
 
         # ** check if this has been previously calculated
-
-        ss = None
-        # pass previous calculated versions
-        for [ss1, sdwidth1, xx1, yy1, zz1] in self._list_tube:
-            # check if exactly the same
-            if (np.all(xx1==xx) and
-                np.all(yy1==yy) and
-                np.all(zz1==zz) and
-                np.all(sdwidth1==sdwidth)):
-                # copy
-                ss = ss1
+        ss = self._getCached("tube", axes, sdwidth)
 
         if ss is None:
             # do the calculations
 
-            # grid2points
-            (Y_pos, Y_idx) = self._grid2points(xx, yy, zz)
+            # point clouds are shared once, by all tiles
+            list_Y = self._get_point_cloud(sdwidth, nsamples=12)
+            arrays = self._getCloudArrays(list_Y, "clouds")
 
-            # evaluate points
-            s = self.isInside_pnts(Y_pos, sdwidth, nsamples=12)
+            func = partial(self._isInside_shared,
+                           bounds=self._getCloudBounds(arrays),
+                           nclouds=len(list_Y))
 
-            # points2grid
-            ss = self._points2grid(s, Y_idx)
+            # evaluate tile by tile
+            ss = self._eval_grid(func, axes, float, memory_budget, memmap_dir,
+                                 "tube", arrays, len(list_Y))
 
-            # store results
-            self._list_tube.append([ss, sdwidth, xx, yy, zz])
+            # store results (axis vectors only)
+            self._storeCached("tube", ss, axes, sdwidth)
 
 
         # return values
         return ss
 
+    def isInside_grid_adaptive(self, sdwidth, xx, yy, zz=None, maxdepth=3):
+        """
+        evaluate if points are inside a grid, by adaptive refinement
+
+        cells on the boundary of the tube are refined, see
+        helpers.eval_adaptive, as are cells that overlap the bounding box of
+        a part of the tube (thin parts can fall between the coarse points).
+        The number of points along each axis of the grid should be
+        (k * 2^maxdepth + 1), see helpers.getAdaptiveAxes.
+
+        returns a dense array, as isInside_grid
+        """
+
+        # check values, obtain axis vectors
+        axes = self._check_grid(xx, yy, zz)
+
+        # point clouds are shared by all evaluations
+        list_Y = self._get_point_cloud(sdwidth, nsamples=12)
+
+        func = partial(self._isInside_cloud, list_Y=list_Y)
+
+        # all points inside are inside the bounding box of a cloud
+        boxes = (np.array([np.asarray(Y).min(axis=0) for Y in list_Y]),
+                 np.array([np.asarray(Y).max(axis=0) for Y in list_Y]))
+
+        (ss, _) = tt.helpers.eval_adaptive(func, axes, maxdepth,
+                                           boxes=boxes)
+
+        return ss
+
     def isInside_pnts(self, P, sdwidth=1, nsamples=10):
         """
         tests if points P NxD 'points' x 'dimensions' are inside the tube
         """
 
-        ndim = self._ndim
-
         # obtain a list of points, representing the Gaussian and area between
         list_Y = self._get_point_cloud(sdwidth, nsamples)
 
-        # P is an array
-        P = np.array(P)
+        return self._isInside_cloud(P, list_Y)
 
-        # create partial function (map only takes one argument)
-        func = partial(tt.helpers.in_hull, P)
+    def _isInside_cloud(self, P, list_Y):
+        """
+        tests if points P NxD are inside any of the point clouds in list_Y
+        """
 
-        # parallel processing
-        ncores = mp.cpu_count()
-        p = mp.Pool(processes=ncores)
+        # P is an array
+        P = np.array(P, dtype=float).reshape(-1, self._ndim)
 
-        # output - extract results
-        list_these_inside = p.map(func, list_Y)
+        # clouds are shared once, tasks are ranges of clouds
+        arrays = self._getCloudArrays(list_Y, "clouds")
 
-        # cleanup
-        p.close()
-        p.join()
+        with self._getExecutor(P.shape[0] * len(list_Y), "tube") as executor, \
+             executor.share(arrays) as shared:
+            return self._isInside_shared(P, executor, shared,
+                                         self._getCloudBounds(arrays),
+                                         len(list_Y))
 
-        # convert to array
-        arr_these_inside = np.array(list_these_inside).squeeze().transpose()
+    def _isInside_shared(self, P, executor, shared, bounds, nclouds):
+        """
+        tests if points P NxD are inside any of the nclouds point clouds
+        shared with executor (see _getCloudArrays, named "clouds"), bounds
+        (Ymin, Ymax) hold all clouds
+        """
 
         # an array of bools (all FALSE, thus zeros)
         # FALSE = not inside
         # TRUE  = inside
-        P_inside = np.any(arr_these_inside, axis=1)
+        P_inside = np.zeros(P.shape[0], dtype=bool)
+
+        if nclouds == 0:
+            return P_inside
+
+        # only points in the bounding box of the clouds can be inside
+        (Ymin, Ymax) = bounds
+        idx = np.flatnonzero(np.all((P >= Ymin) & (P <= Ymax), axis=1))
+
+        if idx.size == 0:
+            return P_inside
+
+        list_jobs = [(_inside_range, i0, i1, ("P", "clouds"))
+                     for (i0, i1) in tt.parallel.chunk_ranges(nclouds,
+                            executor.nworkers, tt.parallel.MIN_CHUNK_HULLS)]
+
+        # output - extract results [nchunks x N]
+        list_these_inside = tt.parallel.map_jobs({"P": P[idx, :]}, list_jobs,
+                            executor, shared, self.instrumentation)
+
+        for these_inside in list_these_inside:
+            P_inside[idx] |= these_inside
 
         return P_inside
 
+    def _getCloudBounds(self, arrays):
+        """
+        returns (Ymin, Ymax) of the point clouds in arrays (see
+        _getCloudArrays, named "clouds"), None if there are none
+        """
+
+        Y_all = arrays["clouds_Y"]
+
+        if Y_all.shape[0] == 0:
+            return None
+
+        return (Y_all.min(axis=0), Y_all.max(axis=0))
+
+    def _getCellArrays(self, name):
+        """
+        returns a dict with the arrays of the cells, to share with workers
+        (see _logp_range), named name_cc, name_cLinv, and name_clogdet
+        """
+
+        return {name + "_cc": self._cc,
+                name + "_cLinv": self._cLinv,
+                name + "_clogdet": self._clogdet}
+
+    def _getExecutor(self, work=None, kind=None):
+        """
+        returns an executor for work (e.g. points x cells) of kind ("logp"
+        or "tube"), based on backend and nworkers (see parallel.getExecutor)
+        """
+
+        return tt.parallel.getExecutor(self.backend, self.nworkers, work, kind)
+
+    def _getSharedArrays(self, kind, name, sdwidth=None):
+        """
+        returns (arrays, bounds, nclouds) to share with workers, the point
+        clouds ("tube", see _getCloudArrays) or the cells ("logp", see
+        _getCellArrays)
+
+        bounds (Ymin, Ymax) hold all points that can be inside the tube,
+        None if all points are to be evaluated
+        """
+
+        if kind == "tube":
+            # point clouds, representing the tube
+            list_Y = self._get_point_cloud(sdwidth, nsamples=12)
+            arrays = self._getCloudArrays(list_Y, name)
+            Y_all = arrays[name + "_Y"]
+            bounds = (Y_all.min(axis=0), Y_all.max(axis=0))
+            return (arrays, bounds, len(list_Y))
+
+        return (self._getCellArrays(name), None, 0)
+
+    def _getCloudArrays(self, list_Y, name):
+        """
+        returns a dict with the point clouds list_Y, to share with workers
+        (see _inside_range), concatenated (name_Y) with offsets
+        (name_offsets)
+        """
+
+        offsets = np.zeros(len(list_Y) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([Y.shape[0] for Y in list_Y])
+
+        if len(list_Y) > 0:
+            Y_all = np.concatenate([np.asarray(Y) for Y in list_Y], axis=0)
+        else:
+            Y_all = np.empty(shape=(0, self._ndim))
+
+        return {name + "_Y": Y_all, name + "_offsets": offsets}
+
 
     def _get_point_cloud(self, sdwidth=1, nsamples=10):
         """
@@ -486,88 +1074,112 @@ class Model(object):
 
         ngaus = len(self._cc)
 
-        # points of first Gaussian
-        c = self._cc[0]
-        A = self._cA[0]
-        Yi = self._getEllipse(c, A, sdwidth, nsamples)
-
-        for i in range(ngaus-1):
+        with tt.instrumentation.stage(self.instrumentation, "hulls", ngaus):
+            # points of all Gaussians
+            E = self._getEllipses(sdwidth, nsamples)
 
-            # points of next Gaussian
-            c = self._cc[i+1]
-            A = self._cA[i+1]
-            Yi1 = self._getEllipse(c, A, sdwidth, nsamples)
+            for i in range(ngaus-1):
 
-            # this is the 'cloud' to test
-            Y = np.concatenate((Yi, Yi1), axis=0)
+                # this is the 'cloud' to test, current and next Gaussian
+                Y = np.concatenate((E[i], E[i+1]), axis=0)
 
-            # remove duplicates
-            Y = tt.helpers.unique_rows(Y)
+                # remove duplicates
+                Y = tt.helpers.unique_rows(Y)
 
-            list_points_cloud.append(Y)
-
-            # new current Gaussian is next Gaussian
-            Yi = Yi1.copy()
+                list_points_cloud.append(Y)
 
         return list_points_cloud
 
 
-    def evalLogLikelihood(self, xx, yy, zz=None):
+    def evalLogLikelihood(self, xx, yy, zz=None, memory_budget=None,
+                          memmap_dir=None):
         """
         evaluates values in this grid [2d/3d] and returns values
 
+        memory_budget (bytes) limits the working memory, memmap_dir allows
+        the output to be memory-mapped
+
         example grid:
         xx, yy, zz = np.mgrid[-60:60:20j, -10:240:20j, -60:60:20j]
+        or, without the full coordinate arrays,
+        xx, yy, zz = np.ogrid[-60:60:20j, -10:240:20j, -60:60:20j]
         """
 
-        # check values
-        if not (xx.shape == yy.shape):
-            raise ValueError("dimensions should equal (use np.mgrid)")
+        # check values, obtain axis vectors
+        axes = self._check_grid(xx, yy, zz)
 
-        ss = None
-        # pass previous calculated versions
-        for [ss1, xx1, yy1, zz1] in self._list_logp:
-            # check if exactly the same
-            if ( np.all(xx1==xx) and
-                 np.all(yy1==yy) and
-                 np.all(zz1==zz) ):
-                # copy
-                ss = ss1
+        # check if this has been previously calculated
+        ss = self._getCached("logp", axes)
 
         if ss is None:
             # do the calculations
 
-            # grid2points
-            (Y_pos, Y_idx) = self._grid2points(xx, yy, zz)
+            # evaluate tile by tile, cells are shared once
+            ss = self._eval_grid(self._eval_logp_shared, axes, float,
+                                 memory_budget, memmap_dir, "logp",
+                                 self._getCellArrays("cells"),
+                                 self._cc.shape[0])
 
-            # evaluate points
-            s = self._eval_logp(Y_pos)
+            # replace NaN's with minimum
+            tt.helpers.fill_nan(ss, memory_budget)
 
-            # points2grid
-            ss = self._points2grid(s, Y_idx)
+            # store values (axis vectors only)
+            self._storeCached("logp", ss, axes)
 
-            # replace NaN's with minimum
-            ss[np.isnan(ss)] = np.nanmin(ss)
+        return ss
 
-            # store values
-            self._list_logp.append([ss, xx, yy, zz])
+
+    def evalLogLikelihood_pnts(self, P):
+        """
+        returns the log-likelihood of points P NxD, evaluated at once
+        """
+
+        return tt.helpers.gauss_logLc_cells(P, self._ndim, self._cc,
+                                            self._cLinv, self._clogdet)
+
+    def evalLogLikelihood_adaptive(self, xx, yy, zz=None, maxdepth=3, tol=1.):
+        """
+        evaluates values in this grid [2d/3d] by adaptive refinement
+
+        cells in which the log-likelihood varies by more than tol are
+        refined, see helpers.eval_adaptive. The number of points along each
+        axis of the grid should be (k * 2^maxdepth + 1), see
+        helpers.getAdaptiveAxes.
+
+        returns a dense array, as evalLogLikelihood
+        """
+
+        # check values, obtain axis vectors
+        axes = self._check_grid(xx, yy, zz)
+
+        (ss, _) = tt.helpers.eval_adaptive(self._eval_logp, axes, maxdepth,
+                                           tol)
+
+        # replace NaN's with minimum
+        tt.helpers.fill_nan(ss)
 
         return ss
 
+    def _as_cluster_data(self, cluster_data):
+        """
+        returns cluster_data as ClusterData (lists are converted)
+        """
+
+        if isinstance(cluster_data, tt.cluster_data.ClusterData):
+            return cluster_data
+
+        return tt.cluster_data.ClusterData.fromList(cluster_data)
 
     def _normalise_data(self, cluster_data):
         """
         normalises the x dimension
-        """
 
-        # determine minimum maximum
-        tuple_min_max = self._getMinMax(cluster_data)
+        returns a new ClusterData, the input is not modified
+        """
 
-        for (i, (x, Y)) in enumerate(cluster_data):
-            x = self._getNorm(x, tuple_min_max)  # normalise
-            cluster_data[i] = (x, Y)  # overwrite
+        cluster_data = self._as_cluster_data(cluster_data)
 
-        return cluster_data
+        return cluster_data.getNormalised()
 
     def _model_by_resampling(self, cluster_data, ngaus):
         """
@@ -575,46 +1187,30 @@ class Model(object):
         <description>
         """
 
+        cluster_data = self._as_cluster_data(cluster_data)
+
         mdim = self._ndim
 
         # predict these values
         xp = np.linspace(0, 1, ngaus)
 
-        yc = []  # list to put trajectories
-
-        for (xn, Yn) in cluster_data:
+        # all trajectories at once [ntraj x ngaus x mdim]
+        Yp = cluster_data.resample(xp)
 
-            # array to fill
-            yp = np.empty(shape=(ngaus, mdim))
+        ntraj = Yp.shape[0]  # number of trajectories
 
-            for d in range(mdim):
-                ynd = Yn[:, d]
-                yp[:, d] = np.interp(xp, xn, ynd)
-
-            # single column
-            yp1 = np.reshape(yp, (-1, 1), order='F')
-
-            yc.append(yp1)
+        # single row per trajectory, dimensions stacked (as order='F')
+        yc = np.reshape(np.transpose(Yp, (0, 2, 1)), (ntraj, mdim*ngaus))
 
         # compute values
 
-        ntraj = len(yc)  # number of trajectories
-
         # obtain average [mu]
-        mu_y = np.zeros(shape=(mdim*ngaus, 1))
-
-        for yn in yc:
-            mu_y += yn
-
-        mu_y = (mu_y / ntraj)
+        mu_y = np.reshape(np.mean(yc, axis=0), (-1, 1))
 
         # obtain standard deviation [sig]
-        sig_y_sum = np.zeros(shape=(mdim*ngaus, mdim*ngaus))
-
-        for yn in yc:
-            sig_y_sum += (yn - mu_y) * (yn - mu_y).transpose()
+        yc_centred = yc - mu_y.transpose()
 
-        sig_y = np.mat(sig_y_sum / ntraj)
+        sig_y = np.mat(np.dot(yc_centred.transpose(), yc_centred) / ntraj)
 
         return (mu_y, sig_y)
 
@@ -634,9 +1230,13 @@ class Model(object):
         wc = []
 
         for i, (xn, Y) in enumerate(cluster_data):
-            yn = np.reshape(Y, newshape=(-1,1), order='F')
-            Hn = basis.get(xn)
-            wn = pinv(Hn) * yn
+            if basis.isCompact():
+                # banded least squares, each dimension shares the basis
+                wn = self._solve_banded_ls(basis, xn, Y)
+            else:
+                yn = np.reshape(Y, newshape=(-1,1), order='F')
+                Hn = basis.get(xn)
+                wn = pinv(Hn) * yn
             wn = np.mat(wn)
             wc.append(wn)
 
@@ -665,6 +1265,35 @@ class Model(object):
 
         return (mu_y, sig_y)
 
+    def _solve_banded_ls(self, basis, xn, Yn):
+        """
+        returns weights wn [D*nbasis x 1] of the least squares fit of a
+        single trajectory, for a basis with compact support
+
+        the normal equations (B^T B) w = B^T y are banded, and solved by a
+        banded Cholesky decomposition
+        """
+
+        B = basis.get_1d_sparse(xn)
+        u = basis.getBandwidth()
+
+        (_, nbasis) = B.shape
+
+        BtB = (B.transpose() * B).tocsr()
+        BtY = B.transpose() * np.asarray(Yn)
+
+        # upper banded storage, ab[u + i - j, j] = BtB[i, j]
+        ab = np.zeros((u+1, nbasis))
+        for k in range(u+1):
+            ab[u-k, k:] = BtB.diagonal(k)
+
+        # basis functions without data have no weight (as pinv would)
+        ab[u, :] += 1e-10 * max(ab[u, :].max(), 1.)
+
+        W = solveh_banded(ab, BtY)
+
+        return np.reshape(W, newshape=(-1, 1), order='F')
+
     def _model_by_em(self, cluster_data, ngaus, type_basis, nbasis):
         """
         returns (mu_y, sig_y) by expectation-maximisation
@@ -677,24 +1306,35 @@ class Model(object):
         ndim = self._ndim
         ntraj = len(cluster_data)
 
-        Mstar = 0
-        for (xn, Yn) in cluster_data:
-            Mstar += np.size(xn)
+        cluster_data = self._as_cluster_data(cluster_data)
+
+        Mstar = cluster_data.getNumberOfPoints()
 
         # create a basis
         basis = tt.basis.Basis(type_basis, nbasis, ndim)
 
-        # prepare data
-        yc = []
-        Hc = []
+        # prepare data, only the sufficient statistics H^T H, H^T y and
+        # y^T y are required, which do not change during the iterations
+        HtHc = []
+        Htyc = []
+        ytyc = []
 
         for (xn, Yn)  in cluster_data:
             # data
             yn = np.reshape(Yn, newshape=(-1,1), order='F')
-            Hn = basis.get(xn)
+            if basis.isCompact():
+                # sparse products
+                Hn = basis.get_sparse(xn)
+                HtHn = (Hn.transpose() * Hn).toarray()
+                Htyn = Hn.transpose() * yn
+            else:
+                Hn = basis.get(xn)
+                HtHn = Hn.transpose() * Hn
+                Htyn = Hn.transpose() * yn
             # add to list
-            yc.append(yn)
-            Hc.append(Hn)
+            HtHc.append(np.mat(HtHn))
+            Htyc.append(np.mat(Htyn))
+            ytyc.append(float(np.dot(yn.transpose(), yn)))
 
         # hardcoded parameters
         MAX_ITERATIONS = 2001  # maximum number of iterations
@@ -718,14 +1358,14 @@ class Model(object):
             # Expectation (54) (55)
             for n  in range(ntraj):
                 # data
-                yn = yc[n]
-                Hn = Hc[n]
+                HtHn = HtHc[n]
+                Htyn = Htyc[n]
 
                 # calculate S :: (50)
-                Sn_inv = sig_w_inv + np.multiply(BETA_EM,(Hn.transpose()*Hn))
+                Sn_inv = sig_w_inv + np.multiply(BETA_EM, HtHn)
                 Sn = np.mat(inv(Sn_inv))
 
-                Ewn = (Sn *((np.multiply(BETA_EM,(Hn.transpose()*yn))) + ((sig_w_inv*mu_w))))
+                Ewn = (Sn *((np.multiply(BETA_EM, Htyn)) + ((sig_w_inv*mu_w))))
 
                 Ewn = np.mat(Ewn)
 
@@ -756,8 +1396,6 @@ class Model(object):
 
             for n  in range(ntraj):
                 # extract data
-                yn = yc[n]
-                Hn = Hc[n]
                 Ewn = Ewc[n]
                 Ewnwn = Ewwc[n]
 
@@ -771,33 +1409,26 @@ class Model(object):
             sig_w_inv = inv(sig_w)
 
             # E [BETA]
+            # yn^T yn - 2 yn^T Hn Ewn + trace(Hn^T Hn Ewnwn), this sum is
+            # also used for ln( p(Y|w) )
             BETA_sum_inv = 0.;
 
             for n  in range(ntraj):
                 # extract data
-                yn = yc[n]
-                Hn = Hc[n]
+                HtHn = HtHc[n]
+                Htyn = Htyc[n]
                 Ewn = Ewc[n]
                 Ewnwn = Ewwc[n]
 
-                BETA_sum_inv += np.dot(yn.transpose(),yn) - 2.*(np.dot(yn.transpose(),(Hn*Ewn))) + np.trace((Hn.transpose()*Hn)*Ewnwn)
+                # trace of a product of symmetric matrices
+                BETA_sum_inv += ytyc[n] - 2.*float(Htyn.transpose()*Ewn) + np.sum(np.multiply(HtHn, Ewnwn))
 
-            BETA_EM = np.mat((ndim*Mstar) / BETA_sum_inv)
+            BETA_EM = (ndim*Mstar) / BETA_sum_inv
 
             # ////  log likelihood ///////////
 
             # // ln( p(Y|w) - likelihood
-            loglikelihood_pYw_sum = 0.;
-
-            for n  in range(ntraj):
-                # extract data
-                yn = yc[n]
-                Hn = Hc[n]
-                Ewn = Ewc[n]
-                Ewnwn = Ewwc[n]
-
-                # loglikelihood_pYw_sum = loglikelihood_pYw_sum + ((yn.')*yn - 2*(yn.')*(Hn*Ewn) + trace(((Hn.')*Hn)*Ewnwn));
-                loglikelihood_pYw_sum += np.dot(yn.transpose(),yn) - 2.*(np.dot(yn.transpose(),(Hn*Ewn))) + np.trace((Hn.transpose()*Hn)*Ewnwn)
+            loglikelihood_pYw_sum = BETA_sum_inv
 
             #  loglikelihood_pYw =  + ((Mstar*D) / 2) * log(2*pi) - ((Mstar*D) / 2) * log( BETA_EM ) + (BETA_EM/2) * loglikelihood_pYw_sum;
             loglikelihood_pYw = (Mstar*ndim / 2.) * np.log(2.*np.pi) - (Mstar*ndim / 2.) * np.log(BETA_EM) + (BETA_EM / 2.) * loglikelihood_pYw_sum
@@ -850,6 +1481,10 @@ class Model(object):
         """
         returns tuple (xmin, xmax), to normalise data
         """
+
+        if isinstance(cluster_data, tt.cluster_data.ClusterData):
+            return cluster_data.getMinMax()
+
         xmin = np.inf
         xmax = -np.inf
         for (x, Y) in cluster_data:
@@ -880,24 +1515,49 @@ class Model(object):
 
     def _getGMMCells(self, mu_y, sig_y, ngaus):
         """
-        return Gaussian Mixture Model (GMM) in cells
+        return Gaussian Mixture Model (GMM) in cells, cc [ngaus x D] and
+        cA [ngaus x D x D]
         """
 
-        cc = []
-        cA = []
+        D = self._ndim
 
-        for m in range(ngaus):
-            # single cell
-            (c, A) = self._getMuSigma(mu_y, sig_y, m, ngaus)
+        # rows of cell m, [ngaus x D] (as _getMuSigma)
+        idx = np.arange(ngaus)[:, np.newaxis] + ngaus*np.arange(D)[np.newaxis, :]
 
-            # check for singularity
-            A = tt.helpers.nearest_spd(A)
+        cc = np.array(np.asarray(mu_y)[idx, 0], dtype=float)
+        cA = np.array(np.asarray(sig_y)[idx[:, :, np.newaxis],
+                                        idx[:, np.newaxis, :]], dtype=float)
 
-            cc.append(c)
-            cA.append(A)
+        for m in range(ngaus):
+            # check for singularity
+            cA[m] = tt.helpers.nearest_spd(cA[m])
 
         return (cc, cA)
 
+    def _setCells(self, cc, cA):
+        """
+        stores the GMM cells cc [ngaus x D] and cA [ngaus x D x D] as
+        contiguous arrays, with precomputed factors L (L L^T = A), inverse
+        factors, and log-determinants
+        """
+
+        cc = np.ascontiguousarray(cc, dtype=float)
+        cA = np.ascontiguousarray(cA, dtype=float)
+
+        try:
+            cL = np.linalg.cholesky(cA)
+        except np.linalg.LinAlgError:
+            # (nearly) singular cells, factor via the eigendecomposition
+            (w, V) = np.linalg.eigh(cA)
+            w = np.maximum(w, np.finfo(float).tiny)
+            cL = V * np.sqrt(w)[:, np.newaxis, :]
+
+        self._cc = cc
+        self._cA = cA
+        self._cL = cL
+        self._cLinv = np.linalg.inv(cL)
+        self._clogdet = 2.*np.log(np.abs(np.linalg.det(cL)))
+
 
     def _getMuSigma(self, mu_y, sig_y, npoint, ngaus):
         """
@@ -936,18 +1596,14 @@ class Model(object):
         # by adding a bit, the bounds include the edges
         sdwidth += 0.1
 
-        # obtain a list of points
-        list_points_cloud = self._get_point_cloud(sdwidth, nsamples=10)
+        # points of all Gaussians
+        Y = self._getEllipses(sdwidth, npoints=10).reshape(-1, self._ndim)
 
-        for Y in list_points_cloud:
+        Ymin = Y.min(axis=0)
+        Ymax = Y.max(axis=0)
 
-            for d in range(self._ndim):
-                x = Y[:, d]
-                xmin = x.min()
-                xmax = x.max()
-                if (outline[d*2] > xmin):
-                    outline[d*2] = xmin
-                if (outline[d*2+1] < xmax):
-                    outline[d*2+1] = xmax
+        for d in range(self._ndim):
+            outline[d*2] = Ymin[d]
+            outline[d*2+1] = Ymax[d]
 
         return outline
@@ -0,0 +1,443 @@
+# support for parallel evaluation, arrays are shared with worker processes
+
+import os
+import shutil
+import tempfile
+import multiprocessing as mp
+from multiprocessing.pool import ThreadPool
+import numpy as np
+import teetool as tt
+
+# smallest number of points evaluated by a single task
+MIN_CHUNK_POINTS = 2**12
+
+# smallest number of hulls (point clouds) tested by a single task
+MIN_CHUNK_HULLS = 8
+
+# number of tasks per worker, to balance the load
+CHUNKS_PER_WORKER = 4
+
+# "auto" evaluates less work (points x cells, or points x hulls) serially
+AUTO_MIN_WORK = 2**22
+
+# available backends
+BACKENDS = ["auto", "serial", "thread", "process"]
+
+
+def _getSharedDir():
+    """
+    returns the directory for shared arrays, memory (/dev/shm) if available
+    """
+
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+
+    return tempfile.gettempdir()
+
+
+class SharedArrays(object):
+    """
+    This class shares arrays with worker processes
+
+    The arrays are written once to memory-mapped files (in /dev/shm, if
+    available), tasks only carry references (see task). Workers map the
+    files read-only, the data is not pickled.
+
+    Initialisation arguments:
+     - arrays: dict {name: array}
+     - path: (optional) directory of the files
+    """
+
+    def __init__(self, arrays, path=None):
+        """
+        initialises SharedArrays, writes the arrays
+        """
+
+        if path is None:
+            path = _getSharedDir()
+
+        self._dir = tempfile.mkdtemp(prefix="teetool_", dir=path)
+
+        # name: (filename, shape, dtype)
+        self.refs = {}
+
+        for (name, arr) in arrays.items():
+            arr = np.ascontiguousarray(arr)
+
+            if arr.size == 0:
+                # nothing to map
+                self.refs[name] = (None, arr.shape, arr.dtype.str)
+                continue
+
+            filename = os.path.join(self._dir, "{0}.bin".format(name))
+
+            mm = np.memmap(filename, dtype=arr.dtype, mode="w+",
+                           shape=arr.shape)
+            mm[...] = arr
+            mm.flush()
+            del mm
+
+            self.refs[name] = (filename, arr.shape, arr.dtype.str)
+
+    def getArrays(self):
+        """
+        returns dict {name: array} of the shared arrays (read-only)
+        """
+
+        return attach(self.refs)
+
+    def close(self):
+        """
+        removes the files, workers should have finished
+        """
+
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def attach(refs):
+    """
+    returns dict {name: array} of shared arrays (read-only), based on refs
+    """
+
+    arrays = {}
+
+    for (name, (filename, shape, dtype)) in refs.items():
+        if filename is None:
+            arrays[name] = np.empty(shape=shape, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(filename, dtype=dtype, mode="r",
+                                     shape=tuple(shape))
+
+    return arrays
+
+
+def task(func, refs, i0, i1, *args):
+    """
+    returns a task, func(arrays, i0, i1, *args) is evaluated by run_task
+
+    func should be a module-level function (picklable), refs are the
+    references of SharedArrays (a dict, may be combined)
+    """
+
+    return (func, refs, i0, i1, args)
+
+
+def run_task(this_task):
+    """
+    evaluates a task (see task), in a worker or in this process
+
+    returns (result, elapsed), with elapsed the wall time in seconds
+    """
+
+    start = tt.instrumentation.clock()
+
+    (func, refs, i0, i1, args) = this_task
+
+    result = func(attach(refs), i0, i1, *args)
+
+    return (result, tt.instrumentation.clock() - start)
+
+
+def chunk_ranges(n, nworkers, min_chunk=1, chunks_per_worker=None):
+    """
+    returns a list of ranges (i0, i1) that split n items in chunks
+
+    there are at most chunks_per_worker chunks per worker, and each chunk
+    holds at least min_chunk items (if n allows)
+    """
+
+    if chunks_per_worker is None:
+        chunks_per_worker = CHUNKS_PER_WORKER
+
+    nchunks = max(1, min(n // max(1, min_chunk),
+                         nworkers * chunks_per_worker))
+
+    bounds = np.linspace(0, n, nchunks + 1).astype(int)
+
+    return [(int(i0), int(i1)) for (i0, i1) in zip(bounds[:-1], bounds[1:])
+            if i1 > i0]
+
+
+class LocalArrays(object):
+    """
+    This class holds arrays for workers in this process (threads), the
+    counterpart of SharedArrays, nothing is copied
+
+    Initialisation arguments:
+     - arrays: dict {name: array}
+    """
+
+    def __init__(self, arrays):
+        self._arrays = dict(arrays)
+
+    def getArrays(self):
+        """
+        returns dict {name: array}
+        """
+
+        return dict(self._arrays)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _run_local_task(this_task):
+    """
+    evaluates a task (func, arrays, i0, i1, args) in this process, returns
+    (result, elapsed)
+    """
+
+    start = tt.instrumentation.clock()
+
+    (func, arrays, i0, i1, args) = this_task
+
+    result = func(arrays, i0, i1, *args)
+
+    return (result, tt.instrumentation.clock() - start)
+
+
+class SerialExecutor(object):
+    """
+    evaluates in this process, one item at a time
+    """
+
+    name = "serial"
+    in_process = True
+
+    def __init__(self, nworkers=None):
+        self.nworkers = 1
+
+    def map(self, func, list_items):
+        return [func(item) for item in list_items]
+
+    def share(self, arrays):
+        """
+        returns arrays shared with the workers (see map_jobs)
+        """
+
+        return LocalArrays(arrays)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ThreadExecutor(SerialExecutor):
+    """
+    evaluates in a pool of threads, suited to vectorised kernels that
+    release the GIL (numpy, BLAS). Arrays are not copied.
+
+    The pool is created when first needed.
+    """
+
+    name = "thread"
+    in_process = True
+
+    def __init__(self, nworkers=None):
+        if nworkers is None:
+            nworkers = mp.cpu_count()
+
+        self.nworkers = nworkers
+        self._pool = None
+
+    def _getPool(self):
+        if self._pool is None:
+            self._pool = ThreadPool(processes=self.nworkers)
+        return self._pool
+
+    def map(self, func, list_items):
+        if (len(list_items) < 2) or (self.nworkers < 2):
+            # no need for a pool
+            return [func(item) for item in list_items]
+
+        return self._getPool().map(func, list_items)
+
+    def close(self):
+        # cleanup
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+class ProcessExecutor(ThreadExecutor):
+    """
+    evaluates in a pool of processes. Arrays are shared via memory-mapped
+    files (see SharedArrays), functions and arguments should be picklable.
+
+    The pool is created when first needed.
+    """
+
+    name = "process"
+    in_process = False
+
+    def _getPool(self):
+        if self._pool is None:
+            self._pool = mp.Pool(processes=self.nworkers)
+        return self._pool
+
+    def share(self, arrays):
+        return SharedArrays(arrays)
+
+
+class ExternalExecutor(SerialExecutor):
+    """
+    evaluates via a pool owned by the caller (any object with a map
+    function, e.g. a multiprocessing Pool, a concurrent.futures executor,
+    or one of the executors above), which is not closed
+
+    arrays are shared via memory-mapped files (see SharedArrays), unless
+    the pool is known to evaluate in this process
+
+    Initialisation arguments:
+     - pool: object with a map function
+    """
+
+    name = "external"
+
+    def __init__(self, pool):
+        if not callable(getattr(pool, "map", None)):
+            raise TypeError("expected an executor with a map function, not {0}".format(type(pool)))
+
+        self._pool = pool
+        self.in_process = getattr(pool, "in_process", False)
+        # size of the pool, if known
+        self.nworkers = getattr(pool, "nworkers",
+                        getattr(pool, "_processes",
+                        getattr(pool, "_max_workers", mp.cpu_count())))
+
+    def map(self, func, list_items):
+        return list(self._pool.map(func, list_items))
+
+    def share(self, arrays):
+        if self.in_process:
+            return LocalArrays(arrays)
+        return SharedArrays(arrays)
+
+
+def getExecutor(backend="auto", nworkers=None, work=None, kind=None):
+    """
+    returns an executor (SerialExecutor, ThreadExecutor, ProcessExecutor)
+
+    backend is "serial", "thread", "process", or "auto". For "auto", work
+    (e.g. points x cells) below AUTO_MIN_WORK is evaluated serially, and
+    otherwise kind "logp" (vectorised) in threads and other kinds (e.g.
+    "tube", convex hulls) in processes. nworkers (None is all cores) is the
+    size of the pool. A pool passed as backend is used via an
+    ExternalExecutor, closing that does not close the pool.
+    """
+
+    if not isinstance(backend, str):
+        # a pool of the caller
+        return ExternalExecutor(backend)
+
+    if backend not in BACKENDS:
+        raise ValueError("backend should be one of {0}, not {1}".format(
+                                                        BACKENDS, backend))
+
+    if nworkers is None:
+        nworkers = mp.cpu_count()
+
+    if backend == "auto":
+        if (nworkers < 2) or ((work is not None) and (work < AUTO_MIN_WORK)):
+            backend = "serial"
+        elif kind == "logp":
+            backend = "thread"
+        else:
+            backend = "process"
+
+    if backend == "serial":
+        return SerialExecutor()
+
+    if backend == "thread":
+        return ThreadExecutor(nworkers)
+
+    return ProcessExecutor(nworkers)
+
+
+def map_jobs(arrays, list_jobs, executor=None, shared=None,
+             instrumentation=None):
+    """
+    evaluates jobs (func, i0, i1, args), func(arrays, i0, i1, *args), and
+    returns the list of results
+
+    jobs are evaluated by executor (see getExecutor, None is serial). A
+    single job is evaluated in this process. For a process executor, arrays
+    (dict) are shared once (SharedArrays). shared (optional) holds arrays
+    that were shared before via executor.share, e.g. for several calls.
+
+    instrumentation (optional) records stages "dispatch" (wall time) and
+    "evaluate" (time spent in the workers, summed)
+    """
+
+    if len(list_jobs) == 0:
+        return []
+
+    if executor is None:
+        executor = SerialExecutor()
+
+    npoints = sum(i1 - i0 for (_, i0, i1, _) in list_jobs)
+
+    with tt.instrumentation.stage(instrumentation, "dispatch", npoints):
+        list_timed = _map_jobs(arrays, list_jobs, executor, shared)
+
+    if instrumentation is not None:
+        instrumentation.add("evaluate",
+                            sum(elapsed for (_, elapsed) in list_timed),
+                            calls=len(list_timed), npoints=npoints)
+
+    return [result for (result, _) in list_timed]
+
+
+def _map_jobs(arrays, list_jobs, executor, shared):
+    """
+    evaluates jobs, see map_jobs, returns a list of (result, elapsed)
+    """
+
+    if (len(list_jobs) == 1) or executor.in_process:
+        # in this process, no need to share
+        arrays_all = dict(arrays)
+        if shared is not None:
+            arrays_all.update(shared.getArrays())
+
+        list_tasks = [(func, arrays_all, i0, i1, args)
+                      for (func, i0, i1, args) in list_jobs]
+
+        if len(list_tasks) == 1:
+            return [_run_local_task(list_tasks[0])]
+
+        return executor.map(_run_local_task, list_tasks)
+
+    if (shared is not None) and not isinstance(shared, SharedArrays):
+        # not shared with processes yet
+        arrays = dict(arrays)
+        arrays.update(shared.getArrays())
+        shared = None
+
+    with SharedArrays(arrays) as these_shared:
+        refs = dict(these_shared.refs)
+        if shared is not None:
+            refs.update(shared.refs)
+
+        list_tasks = [task(func, refs, i0, i1, *args)
+                      for (func, i0, i1, args) in list_jobs]
+
+        # output - extract results
+        return executor.map(run_task, list_tasks)
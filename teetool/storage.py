@@ -0,0 +1,256 @@
+# on-disk storage of worlds, models, and cluster data
+
+import os
+import time
+import json
+import hashlib
+import tempfile
+import numpy as np
+
+# version of the on-disk format, increased on incompatible changes
+FORMAT_VERSION = 1
+
+# temporary files older than this (in seconds) are left by a crashed write
+STALE_SECONDS = 3600
+
+
+def write_manifest(path, kind, manifest):
+    """
+    writes manifest.json (a dict) in directory path, creates the directory
+    if needed
+
+    kind is "world", "model", or "cluster_data"
+    """
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    manifest = dict(manifest)
+    manifest["format_version"] = FORMAT_VERSION
+    manifest["kind"] = kind
+
+    # atomically, temporary file then renamed (unique, concurrent saves)
+    (fd, filename_tmp) = tempfile.mkstemp(suffix=".tmp", dir=path)
+
+    try:
+        with os.fdopen(fd, "w") as fid:
+            json.dump(manifest, fid, indent=1, sort_keys=True)
+        os.replace(filename_tmp, os.path.join(path, "manifest.json"))
+    except Exception:
+        if os.path.exists(filename_tmp):
+            os.remove(filename_tmp)
+        raise
+
+
+def remove_manifest(path):
+    """
+    removes manifest.json in directory path (if any), before its arrays are
+    overwritten, such that a partial save can not be loaded
+    """
+
+    filename = os.path.join(path, "manifest.json")
+
+    if os.path.isfile(filename):
+        os.remove(filename)
+
+
+def read_manifest(path, kind):
+    """
+    returns the manifest (a dict) in directory path, checks kind and version
+    """
+
+    filename = os.path.join(path, "manifest.json")
+
+    if not os.path.isfile(filename):
+        raise IOError("no manifest in {0}".format(path))
+
+    with open(filename, "r") as fid:
+        manifest = json.load(fid)
+
+    if manifest.get("kind") != kind:
+        raise ValueError("expected {0}, not {1}".format(kind,
+                                                        manifest.get("kind")))
+
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError("format version {0} not supported, expected {1}".format(
+                                manifest.get("format_version"), FORMAT_VERSION))
+
+    return manifest
+
+
+def save_array(path, name, arr):
+    """
+    saves arr as name.npy in directory path, creates the directory if
+    needed
+
+    written to a temporary file, then renamed: a previous name.npy that is
+    memory-mapped (e.g. loaded from path) remains valid
+    """
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    (fd, filename_tmp) = tempfile.mkstemp(suffix=".tmp", dir=path)
+
+    try:
+        with os.fdopen(fd, "wb") as fid:
+            np.save(fid, np.asarray(arr))
+        os.replace(filename_tmp, os.path.join(path, name + ".npy"))
+    except Exception:
+        if os.path.exists(filename_tmp):
+            os.remove(filename_tmp)
+        raise
+
+
+def load_array(path, name, mmap_mode=None):
+    """
+    returns array name.npy in directory path, memory-mapped if mmap_mode
+    is set (e.g. "r")
+    """
+
+    return np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode)
+
+
+class GridCache(object):
+    """
+    persistent cache of evaluated grids, shared by processes
+
+    grids are stored as <key>.npy in directory path, with key a fingerprint
+    of the model and the grid (see getKey). Files are written atomically
+    (temporary file, then renamed), and the least recently used files are
+    removed when the total size exceeds max_bytes.
+
+    Initialisation arguments:
+     - path: directory, created if needed
+     - max_bytes: size limit of the cache in bytes
+    """
+
+    def __init__(self, path, max_bytes=2**30):
+        """
+        initialises the cache
+        """
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        self._path = path
+        self.max_bytes = max_bytes
+
+    def getKey(self, fingerprint, kind, axes, sdwidth=None):
+        """
+        returns the key of a grid, based on the fingerprint of a model, the
+        kind ("tube" or "logp"), the axis vectors, and sdwidth
+        """
+
+        h = hashlib.sha1()
+
+        # equal widths give equal keys (1 and 1.0)
+        if sdwidth is not None:
+            sdwidth = repr(float(sdwidth))
+
+        h.update(fingerprint.encode("utf-8"))
+        h.update("{0} {1}".format(kind, sdwidth).encode("utf-8"))
+
+        for axis in axes:
+            h.update(np.ascontiguousarray(axis, dtype=float).tobytes())
+            h.update(b"|")
+
+        return h.hexdigest()
+
+    def _getFilename(self, key):
+        return os.path.join(self._path, key + ".npy")
+
+    def get(self, key, mmap_mode="r"):
+        """
+        returns the grid stored under key (memory-mapped unless mmap_mode is
+        None), or None
+        """
+
+        filename = self._getFilename(key)
+
+        try:
+            ss = np.load(filename, mmap_mode=mmap_mode)
+        except (IOError, OSError, ValueError):
+            # not available (or removed meanwhile)
+            return None
+
+        # recently used
+        try:
+            os.utime(filename, None)
+        except OSError:
+            pass
+
+        return ss
+
+    def put(self, key, ss):
+        """
+        stores the grid ss under key, and removes the least recently used
+        grids if the cache is too large
+        """
+
+        (fd, filename_tmp) = tempfile.mkstemp(suffix=".tmp", dir=self._path)
+
+        try:
+            with os.fdopen(fd, "wb") as fid:
+                np.save(fid, np.asarray(ss))
+            # atomic, readers see the old or the new file
+            os.replace(filename_tmp, self._getFilename(key))
+        except Exception:
+            if os.path.exists(filename_tmp):
+                os.remove(filename_tmp)
+            raise
+
+        self._evict()
+
+    def _evict(self):
+        """
+        removes least recently used grids, until within max_bytes, and
+        temporary files of crashed writes (older than STALE_SECONDS)
+        """
+
+        list_files = []
+
+        tstale = time.time() - STALE_SECONDS
+
+        for name in os.listdir(self._path):
+            if not name.endswith((".npy", ".tmp")):
+                continue
+            filename = os.path.join(self._path, name)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            if name.endswith(".tmp"):
+                # recent ones are being written by another process
+                if stat.st_mtime < tstale:
+                    try:
+                        os.remove(filename)
+                    except OSError:
+                        pass
+                continue
+            list_files.append((stat.st_mtime, stat.st_size, filename))
+
+        nbytes = sum(size for (_, size, _) in list_files)
+
+        # oldest first
+        for (_, size, filename) in sorted(list_files):
+            if nbytes <= self.max_bytes:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                # removed by another process
+                pass
+            nbytes -= size
+
+    def clear(self):
+        """
+        removes all grids
+        """
+
+        for name in os.listdir(self._path):
+            if name.endswith(".npy"):
+                try:
+                    os.remove(os.path.join(self._path, name))
+                except OSError:
+                    pass
@@ -0,0 +1,286 @@
+# synthetic trajectory data, e.g. for load testing
+
+import os
+import multiprocessing as mp
+import numpy as np
+import teetool as tt
+
+# domain of x
+X_DOMAIN = (-50., 50.)
+
+
+def _toy_0(x):
+    return np.stack([x, 0.05*(x**2), 0.03*(x**2)], axis=1)
+
+
+def _toy_1(x):
+    return np.stack([x, -x, -0.03*(x**2)], axis=1)
+
+
+def _line(x):
+    return np.stack([x, 0.5*x, 0.*x], axis=1)
+
+
+def _arc(x):
+    phi = np.pi * (x - X_DOMAIN[0]) / (X_DOMAIN[1] - X_DOMAIN[0])
+    return np.stack([50.*np.cos(phi), 50.*np.sin(phi), 0.2*x], axis=1)
+
+
+def _helix(x):
+    return np.stack([20.*np.cos(x / 8.), 20.*np.sin(x / 8.), x], axis=1)
+
+
+# shapes, (function of x [M] returning [M x 3], spread [3], offset [3]),
+# each trajectory is shifted by spread * N(0, 1) + offset. toy_0 and toy_1
+# match helpers.get_trajectories
+SHAPES = {"toy_0": (_toy_0, [2., 10., 3.], [-2.5, 90., 2.5]),
+          "toy_1": (_toy_1, [2., 5., 3.], [-2.5, 45., 2.5]),
+          "line": (_line, [2., 2., 2.], [0., 0., 0.]),
+          "arc": (_arc, [2., 2., 2.], [0., 0., 0.]),
+          "helix": (_helix, [1., 1., 2.], [0., 0., 0.])}
+
+
+def _getShape(shape):
+    """
+    returns (function, spread, offset) of shape, a name in SHAPES or a
+    tuple (function, spread, offset)
+    """
+
+    if isinstance(shape, str):
+        if shape not in SHAPES:
+            raise ValueError("shape should be one of {0}, not {1}".format(
+                                                sorted(SHAPES), shape))
+        return SHAPES[shape]
+
+    if (type(shape) is not tuple) or (len(shape) != 3) or not callable(shape[0]):
+        raise TypeError("expected shape name or (function, spread, offset)")
+
+    return shape
+
+
+def _getSeed(seed):
+    """
+    returns a new SeedSequence from seed (int, None, or SeedSequence)
+
+    a SeedSequence is copied, spawning from it would change its state (and
+    thus the output of a next call with the same seed)
+    """
+
+    if isinstance(seed, np.random.SeedSequence):
+        return np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key,
+                                      pool_size=seed.pool_size)
+
+    return np.random.SeedSequence(seed)
+
+
+def _generate_chunk(spec, lengths, seed):
+    """
+    returns (x, Y) of trajectories with lengths, spec is a dict (see
+    getClusterData), seed a SeedSequence of this chunk
+    """
+
+    rng = np.random.default_rng(seed)
+
+    (func, spread, offset) = _getShape(spec["shape"])
+    ndim = spec["ndim"]
+
+    ntraj = lengths.size
+    npoints = int(lengths.sum())
+
+    # trajectory of each data-point
+    itraj = np.repeat(np.arange(ntraj), lengths)
+
+    # first data-point of each trajectory
+    starts = np.cumsum(lengths) - lengths
+
+    if spec["irregular"]:
+        # sorted random samples, without sorting: normalised cumulative
+        # sums of exponential spacings within each trajectory
+        c = np.cumsum(rng.standard_exponential(npoints))
+        c_before = np.concatenate(([0.], c[starts[1:] - 1]))
+        c -= c_before[itraj]
+        total = c[starts + lengths - 1] + rng.standard_exponential(ntraj)
+        u = c / total[itraj]
+    else:
+        # uniform samples
+        u = (np.arange(npoints) - starts[itraj]) / np.maximum(
+                                                lengths[itraj] - 1., 1.)
+
+    (xmin, xmax) = X_DOMAIN
+    x = xmin + (xmax - xmin) * u
+
+    Y = np.asarray(func(x), dtype=float)[:, :ndim]
+
+    # shift per trajectory
+    shift = (rng.standard_normal((ntraj, ndim)) * np.asarray(spread)[:ndim] +
+             np.asarray(offset)[:ndim])
+    Y += shift[itraj, :]
+
+    # noise
+    Y += spec["noise_std"] * rng.standard_normal((npoints, ndim))
+
+    # outliers
+    if spec["outlier_fraction"] > 0:
+        mask = (rng.random(npoints) < spec["outlier_fraction"])
+        Y[mask, :] += spec["outlier_std"] * rng.standard_normal(
+                                                    (int(mask.sum()), ndim))
+
+    return (x, Y)
+
+
+def _generate_chunk_task(task):
+    """
+    generates a chunk in a worker, task is a tuple (spec, lengths, seed,
+    path, i0), returns (x, Y), or writes them at data-point i0 of the arrays
+    in path (returns None)
+    """
+
+    (spec, lengths, seed, path, i0) = task
+
+    (x, Y) = _generate_chunk(spec, lengths, seed)
+
+    if path is None:
+        return (x, Y)
+
+    i1 = i0 + x.shape[0]
+
+    x_out = np.load(os.path.join(path, "x.npy"), mmap_mode="r+")
+    Y_out = np.load(os.path.join(path, "Y.npy"), mmap_mode="r+")
+
+    x_out[i0:i1] = x
+    Y_out[i0:i1, :] = Y
+
+    x_out.flush()
+    Y_out.flush()
+
+    return None
+
+
+def getClusterData(ntraj, npoints=100, ndim=3, shape="toy_0",
+                   npoints_max=None, irregular=False, noise_std=.5,
+                   outlier_fraction=0., outlier_std=50., seed=None,
+                   chunksize=2**12, nworkers=1, path=None, dtype=float):
+    """
+    returns ClusterData with ntraj synthetic trajectories
+
+    shape: name in SHAPES, or a tuple (function, spread, offset)
+    npoints: number of data-points, or the minimum if npoints_max is set
+    npoints_max: (optional) number of data-points varies per trajectory
+    irregular: if True, x is sampled at random, otherwise uniformly
+    noise_std: noise on each data-point
+    outlier_fraction: fraction of data-points shifted by N(0, outlier_std)
+    seed: int or numpy SeedSequence, the output depends on seed and
+    chunksize, not on nworkers
+    chunksize: number of trajectories generated at once (each chunk has an
+    independent stream)
+    nworkers: number of processes
+    path: (optional) directory, the arrays are written directly to disk (see
+    ClusterData.save) and memory-mapped
+    """
+
+    if (ndim != 2) and (ndim != 3):
+        raise ValueError("expected dimensionality 2 or 3, not {0}".format(ndim))
+
+    if (ntraj < 1) or (npoints < 1):
+        raise ValueError("expected at least one trajectory and data-point")
+
+    if (npoints_max is not None) and (npoints_max < npoints):
+        raise ValueError("npoints_max should be at least npoints")
+
+    # check
+    _getShape(shape)
+
+    seed = _getSeed(seed)
+
+    nchunks = (ntraj + chunksize - 1) // chunksize
+
+    # independent streams, lengths and chunks
+    list_seeds = seed.spawn(nchunks + 1)
+
+    if npoints_max is None:
+        lengths = np.empty(ntraj, dtype=np.int64)
+        lengths.fill(npoints)
+    else:
+        rng = np.random.default_rng(list_seeds[0])
+        lengths = rng.integers(npoints, npoints_max + 1, size=ntraj,
+                               dtype=np.int64)
+
+    offsets = np.zeros(ntraj + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+
+    spec = {"ndim": ndim, "shape": shape, "irregular": irregular,
+            "noise_std": noise_std, "outlier_fraction": outlier_fraction,
+            "outlier_std": outlier_std}
+
+    if path is not None:
+        # preallocate on disk, filled by the chunks
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        tt.storage.remove_manifest(path)
+        np.lib.format.open_memmap(os.path.join(path, "x.npy"), mode="w+",
+                                  dtype=dtype, shape=(offsets[-1],))
+        np.lib.format.open_memmap(os.path.join(path, "Y.npy"), mode="w+",
+                                  dtype=dtype, shape=(offsets[-1], ndim))
+        tt.storage.save_array(path, "offsets", offsets)
+
+    list_tasks = []
+
+    for ichunk in range(nchunks):
+        k0 = ichunk * chunksize
+        k1 = min(k0 + chunksize, ntraj)
+        list_tasks.append((spec, lengths[k0:k1], list_seeds[ichunk + 1], path,
+                           int(offsets[k0])))
+
+    if (nworkers is not None) and (nworkers > 1) and (nchunks > 1):
+        # parallel processing
+        p = mp.Pool(processes=nworkers)
+
+        # output - extract results
+        list_results = p.map(_generate_chunk_task, list_tasks)
+
+        # cleanup
+        p.close()
+        p.join()
+    else:
+        list_results = [_generate_chunk_task(task) for task in list_tasks]
+
+    if path is not None:
+        # written last, as ClusterData.save
+        tt.storage.write_manifest(path, "cluster_data",
+                                  {"ntraj": ntraj, "ndim": ndim})
+        return tt.cluster_data.ClusterData.load(path)
+
+    x = np.concatenate([x for (x, Y) in list_results])
+    Y = np.concatenate([Y for (x, Y) in list_results], axis=0)
+
+    return tt.cluster_data.ClusterData(x, Y, offsets, dtype)
+
+
+def getClusters(nclusters, ntraj, shapes=None, seed=None, path=None,
+                **kwargs):
+    """
+    returns a list of nclusters ClusterData of ntraj trajectories, each
+    with an independent stream (see getClusterData for kwargs)
+
+    shapes: (optional) list of shapes, repeated, by default all SHAPES
+    path: (optional) directory, cluster i is written to path/cluster_i
+    """
+
+    if shapes is None:
+        shapes = sorted(SHAPES)
+
+    seed = _getSeed(seed)
+
+    list_cluster_data = []
+
+    for (i, this_seed) in enumerate(seed.spawn(nclusters)):
+        if path is None:
+            this_path = None
+        else:
+            this_path = os.path.join(path, "cluster_{0}".format(i))
+
+        list_cluster_data.append(getClusterData(ntraj,
+                shape=shapes[i % len(shapes)], seed=this_seed, path=this_path,
+                **kwargs))
+
+    return list_cluster_data
@@ -2,7 +2,6 @@
 # (trajectories / probability) in 2 dimensions
 
 import numpy as np
-from scipy.interpolate import griddata
 import matplotlib.pyplot as plt
 
 import teetool as tt
@@ -42,11 +41,10 @@ class Visual_2d(object):
         # unique colours
         colours = tt.helpers.getDistinctColours(len(clusters), colour)
 
-        clusters = self._world.getCluster(list_icluster)
-        for (i, this_cluster) in enumerate(clusters):
-            # pass clusters
-            Y = this_cluster["model"].getMean()
+        # mean trajectories (fits the models, if pending)
+        Y_list = self._world.getMean(list_icluster)
 
+        for (i, Y) in enumerate(Y_list):
             a_line, = self._ax.plot(Y[:, 0],
                                     Y[:, 1],
                                     color=colours[i],
@@ -165,7 +163,11 @@ class Visual_2d(object):
         (ss_list, [xx, yy, zz]) = self._world.getTube(list_icluster,
                                                       sdwidth,
                                                       z=z,
-                                                      resolution=resolution)
+                                                      resolution=resolution,
+                                                      sparse=True)
+
+        # coordinates as (read-only) views
+        [xx, yy, _] = tt.helpers.materialiseGrid(xx, yy, copy=False)
 
         # get colours
         lcolours = tt.helpers.getDistinctColours(len(ss_list))
@@ -190,9 +192,13 @@ class Visual_2d(object):
         (ss_list, [xx, yy, zz]) = self._world.getLogLikelihood(
                                                     list_icluster,
                                                     z=z,
-                                                    resolution=resolution)
+                                                    resolution=resolution,
+                                                    sparse=True)
+
+        # coordinates as (read-only) views
+        [xx, yy, _] = tt.helpers.materialiseGrid(xx, yy, copy=False)
 
-        ss = np.zeros_like(xx)
+        ss = np.zeros_like(ss_list[0], dtype=float)
 
         for ss1 in ss_list:
             # sum
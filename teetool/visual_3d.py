@@ -2,7 +2,6 @@
 # (trajectories / probability) in 3 dimensions
 
 import numpy as np
-from scipy.interpolate import griddata
 import mayavi.mlab as mlab
 import time
 
@@ -65,9 +64,13 @@ class Visual_3d(object):
         icluster1, and icluster2 should be both integers
         """
 
-        (ss_list, [xx, yy, zz]) = self._world.getLogLikelihood([icluster1, icluster2])
+        (ss_list, [xx, yy, zz]) = self._world.getLogLikelihood([icluster1, icluster2],
+                                                               sparse=True)
 
-        ss = np.zeros_like(xx)
+        # mayavi requires full coordinate arrays
+        [xx, yy, zz] = tt.helpers.materialiseGrid(xx, yy, zz)
+
+        ss = np.zeros_like(ss_list[0], dtype=float)
 
         # add
         ss += ss_list[0]
@@ -112,7 +115,11 @@ class Visual_3d(object):
 
         # extract
         (ss_list, [xx, yy, zz]) = self._world.getTube([icluster1, icluster2],
-                                                      sdwidth, resolution)
+                                                      sdwidth, resolution,
+                                                      sparse=True)
+
+        # mayavi requires full coordinate arrays
+        [xx, yy, zz] = tt.helpers.materialiseGrid(xx, yy, zz)
 
 
         # produce some stats
@@ -225,7 +232,11 @@ class Visual_3d(object):
             outline = self._world._get_outline(list_icluster)
 
         # 3d
-        [xx, yy, zz] = tt.helpers.getGridFromResolution(outline, resolution)
+        [xx, yy, zz] = tt.helpers.getGridFromResolution(outline, resolution,
+                                                        sparse=True)
+
+        # mayavi requires full coordinate arrays
+        [xx, yy, zz] = tt.helpers.materialiseGrid(xx, yy, zz)
 
         # fake data (not used)
         ss = np.ones_like(xx)
@@ -253,7 +264,11 @@ class Visual_3d(object):
 
         # extract
         (ss_list, [xx, yy, zz]) = self._world.getTube(list_icluster,
-                                                      sdwidth, resolution)
+                                                      sdwidth, resolution,
+                                                      sparse=True)
+
+        # mayavi requires full coordinate arrays
+        [xx, yy, zz] = tt.helpers.materialiseGrid(xx, yy, zz)
 
         # get colours
         lcolours = tt.helpers.getDistinctColours(len(self._world._clusters),
@@ -286,9 +301,13 @@ class Visual_3d(object):
 
         # extract
         (ss_list, [xx, yy, zz]) = self._world.getLogLikelihood(list_icluster,
-                                                               resolution)
+                                                               resolution,
+                                                               sparse=True)
+
+        # mayavi requires full coordinate arrays
+        [xx, yy, zz] = tt.helpers.materialiseGrid(xx, yy, zz)
 
-        ss = np.zeros_like(xx)
+        ss = np.zeros_like(ss_list[0], dtype=float)
 
         for ss1 in ss_list:
             # sum
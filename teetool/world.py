@@ -3,10 +3,33 @@
 # (whatever settings desired), and visualised in whatever is
 # desired (single / multiple clusters)
 
+import os
 import numpy as np
 import teetool as tt
 
 
+
+def _build_model_task(task):
+    """
+    fits a model, task is a tuple (cluster_data, settings, instrument)
+
+    returns (model, None), or (None, error) if the fit failed. If instrument
+    is True, the stages are recorded by a new Instrumentation of the model
+    """
+
+    (cluster_data, settings, instrument) = task
+
+    if instrument:
+        instrumentation = tt.instrumentation.Instrumentation()
+    else:
+        instrumentation = None
+
+    try:
+        return (tt.model.Model(cluster_data, settings, instrumentation), None)
+    except Exception as e:
+        return (None, e)
+
+
 class World(object):
     """
     This class provides the interface for the trajectory analysis tool.
@@ -59,6 +82,29 @@ class World(object):
         # default value
         self.fraction_to_expand = 0.1
 
+        # working memory for grid evaluations in bytes (None is default),
+        # grids larger than this are memory-mapped if memmap_dir is set
+        self.memory_budget = None
+        self.memmap_dir = None
+
+        # slices and queries inside previously calculated grids are
+        # interpolated, points with an estimated error above slice_tol
+        # (log-likelihood) are recalculated (None always recalculates)
+        self.slice_tol = 1.
+
+        # persistent cache of evaluated grids (storage.GridCache), shared
+        # by the models of all clusters (None is no persistent cache)
+        self.grid_cache = None
+
+        # parallel evaluation, "auto", "serial", "thread", or "process",
+        # by nworkers (None is all cores), see parallel.getExecutor
+        self.backend = "auto"
+        self.nworkers = None
+
+        # records the stages of all models (instrumentation.Instrumentation),
+        # opt-in (None records nothing)
+        self.instrumentation = None
+
     def overview(self):
         """
         prints overview in console
@@ -70,19 +116,29 @@ class World(object):
 
             if ("model" in this_cluster):
                 has_model = "*"
+            elif ("error" in this_cluster):
+                # failed to fit
+                has_model = "!"
+            elif ("settings" in this_cluster):
+                # fitted when needed
+                has_model = "~"
             else:
                 has_model = "-"
 
             print("{0} [{1}] [{2}]".format(
                         i, this_cluster["name"], has_model))
 
-    def addCluster(self, cluster_data, cluster_name=""):
+    def addCluster(self, cluster_data, cluster_name="", dtype=None):
         """
         <description>
 
         Input arguments:
-            - aCluster: list with tuples (x, Y) representing trajectory data
+            - aCluster: list with tuples (x, Y) representing trajectory data,
+              or a ClusterData
             - name: a string with the name of the cluster
+            - dtype: (optional) e.g. np.float32, storage of the data
+
+        the data is stored in columnar form (ClusterData)
         """
 
         # validate cluster_name
@@ -90,28 +146,17 @@ class World(object):
             raise TypeError(
                 "expected string, not {0}".format(type(cluster_name)))
 
-        # validate cluster_data
-        if type(cluster_data) is not list:
-            raise TypeError(
-                "expected list, not {0}".format(type(cluster_data)))
-
-        # validate trajectory_data
-        for (i, trajectory_data) in enumerate(cluster_data):
-            # check type
-            if type(trajectory_data) is not tuple:
-                raise TypeError(
-                    "expected tuple, item {0} is a {1}".format(
-                        i, type(trajectory_data)))
-            # check values x [M x 1], Y [M x D]
-            (x, Y) = trajectory_data
-            (M, D) = Y.shape
-            if (D != self._ndim):
+        # validate cluster_data, convert to columnar storage
+        if isinstance(cluster_data, tt.cluster_data.ClusterData):
+            if (cluster_data.getDimension() != self._ndim):
                 raise ValueError("dimension not correct")
-            if (M != np.size(x, 0)):
-                raise ValueError("number of data-points do not match")
-            # check if all finite
-            if not np.isfinite(x).all():
-                raise ValueError("x holds non-finite values")
+            if dtype is not None:
+                (x, Y, offsets) = cluster_data.getArrays()
+                cluster_data = tt.cluster_data.ClusterData(x, Y, offsets,
+                                                           dtype)
+        else:
+            cluster_data = tt.cluster_data.ClusterData.fromList(
+                                            cluster_data, self._ndim, dtype)
 
         # add new cluster [ holds "name" and "data" ]
         new_cluster = {}
@@ -124,6 +169,146 @@ class World(object):
         # add cluster to the list
         self._clusters.append(new_cluster)
 
+    def addClusters(self, list_cluster_data, list_cluster_name=None,
+                    dtype=None):
+        """
+        adds several clusters at once, see addCluster
+
+        list_cluster_name (optional) holds a name for each cluster
+        """
+
+        if list_cluster_name is None:
+            list_cluster_name = [""]*len(list_cluster_data)
+
+        if len(list_cluster_name) != len(list_cluster_data):
+            raise ValueError("expected {0} names, not {1}".format(
+                        len(list_cluster_data), len(list_cluster_name)))
+
+        for (cluster_data, cluster_name) in zip(list_cluster_data,
+                                                list_cluster_name):
+            self.addCluster(cluster_data, cluster_name, dtype)
+
+    def addClustersFromCSV(self, filename, usecols=None, delimiter=",",
+                           skiprows=0, chunksize=2**16, dtype=None):
+        """
+        adds clusters from a CSV file, one row per data-point, and returns
+        the names of the clusters added
+
+        usecols are the columns (cluster id, track id, x, y, (z)), by
+        default the first ndim+3 columns. Clusters are added in order of
+        their id, named by their id. See ClusterData.fromTable
+        """
+
+        ndim = self._ndim
+
+        if usecols is None:
+            usecols = tuple(range(ndim+3))
+
+        if len(usecols) != (ndim+3):
+            raise ValueError("expected {0} columns (cluster id, track id, x, Y)".format(ndim+3))
+
+        if dtype is None:
+            dtype = float
+
+        table = tt.cluster_data.readCSV(filename, usecols, delimiter,
+                                        skiprows, chunksize, dtype)
+
+        # group rows by cluster
+        order = np.argsort(table[:, 0], kind="stable")
+        table = table[order]
+
+        (cluster_ids, starts) = np.unique(table[:, 0], return_index=True)
+        stops = np.append(starts[1:], table.shape[0])
+
+        list_cluster_name = []
+
+        for (cluster_id, i0, i1) in zip(cluster_ids, starts, stops):
+            cluster_data = tt.cluster_data.ClusterData.fromTable(
+                table[i0:i1, 1], table[i0:i1, 2], table[i0:i1, 3:], dtype)
+
+            cluster_name = "{0:g}".format(cluster_id)
+
+            self.addCluster(cluster_data, cluster_name)
+            list_cluster_name.append(cluster_name)
+
+        return list_cluster_name
+
+    def save(self, path, cached=False):
+        """
+        saves the world in directory path (see storage): the data, the
+        settings, and the fitted models of all clusters, including the
+        previously calculated grids if cached is True
+        """
+
+        list_manifest_clusters = []
+
+        for (i, this_cluster) in enumerate(self._clusters):
+            this_manifest = {"name": this_cluster["name"],
+                             "outl": list(map(float, this_cluster["outl"]))}
+
+            this_cluster["data"].save(os.path.join(path,
+                                                   "cluster_{0}".format(i)))
+
+            if "settings" in this_cluster:
+                this_manifest["settings"] = this_cluster["settings"]
+
+            # only models that belong to the current data
+            this_manifest["model"] = (("model" in this_cluster) and
+                (this_cluster.get("model_for") is this_cluster["data"]))
+
+            if this_manifest["model"]:
+                this_cluster["model"].save(
+                    os.path.join(path, "model_{0}".format(i)), cached)
+
+            list_manifest_clusters.append(this_manifest)
+
+        manifest = {"name": self._name,
+                    "ndim": self._ndim,
+                    "resolution": self._resolution,
+                    "fraction_to_expand": self.fraction_to_expand,
+                    "slice_tol": self.slice_tol,
+                    "clusters": list_manifest_clusters}
+
+        # written last, once all arrays are in place (see storage.save_array)
+        tt.storage.write_manifest(path, "world", manifest)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        returns a World saved in directory path, the models are not fitted
+        again. Data and grids are memory-mapped unless mmap_mode is None
+        """
+
+        manifest = tt.storage.read_manifest(path, "world")
+
+        new_world = cls(name=str(manifest["name"]), ndim=manifest["ndim"],
+                        resolution=manifest["resolution"])
+
+        new_world.fraction_to_expand = manifest["fraction_to_expand"]
+        new_world.slice_tol = manifest["slice_tol"]
+
+        for (i, this_manifest) in enumerate(manifest["clusters"]):
+            cluster_data = tt.cluster_data.ClusterData.load(
+                os.path.join(path, "cluster_{0}".format(i)), mmap_mode)
+
+            new_cluster = {}
+
+            new_cluster["name"] = str(this_manifest["name"])
+            new_cluster["data"] = cluster_data
+            new_cluster["outl"] = this_manifest["outl"]
+
+            if "settings" in this_manifest:
+                new_cluster["settings"] = this_manifest["settings"]
+
+            if this_manifest["model"]:
+                new_cluster["model"] = tt.model.Model.load(
+                    os.path.join(path, "model_{0}".format(i)), mmap_mode)
+                new_cluster["model_for"] = cluster_data
+
+            new_world._clusters.append(new_cluster)
+
+        return new_world
+
     def getName(self):
         """
         returns name, if any, otherwise returns None
@@ -168,7 +353,7 @@ class World(object):
         # default
         if (list_icluster == None):
             # all
-            list_icluster = range(len(self._clusters))
+            list_icluster = list(range(len(self._clusters)))
 
         if type(list_icluster) is not list:
             raise TypeError("expected list, not {0}".format(type(list_icluster)))
@@ -181,17 +366,73 @@ class World(object):
 
     def isInside(self, P, sdwidth=1, list_icluster=None):
         """
-        returns list of bools, whether or not the points P are inside any of the models
+        returns an array of bools [N x nclusters], whether or not the points
+        P [N x D] are inside the tube (sdwidth) of each of the models
 
         list_icluster can be set to limit the check to a single values
+
+        points outside the outline of a tube are discarded before testing,
+        the tests of all clusters are evaluated in a single parallel pass
         """
 
         # check validity
         list_icluster = self._check_list_icluster(list_icluster)
 
-        list_inside = []
+        P = np.array(P, dtype=float).reshape(-1, self._ndim)
+
+        (npoints, _) = P.shape
+
+        arr_inside = np.zeros(shape=(npoints, len(list_icluster)), dtype=bool)
+
+        # collect candidates and point clouds of all clusters, the arrays
+        # are shared once
+        arrays = {}
+        list_candidates = []
+        work = 0
+
+        for (j, icluster) in enumerate(list_icluster):
+            # extract (fits the model, if pending)
+            this_model = self._getModel(icluster)
+
+            name = "c{0}".format(j)
+
+            # point clouds, representing the tube
+            (arrays_j, (Ymin, Ymax), nclouds) = this_model._getSharedArrays(
+                                                        "tube", name, sdwidth)
+
+            # candidates
+            mask = np.all((P >= Ymin) & (P <= Ymax), axis=1)
+            idx = np.flatnonzero(mask)
+
+            if idx.size == 0:
+                continue
+
+            arrays.update(arrays_j)
+            arrays["P_" + name] = P[idx, :]
+
+            list_candidates.append((j, name, idx, nclouds))
+            work += idx.size * nclouds
+
+        with self._getExecutor(work, "tube") as executor:
+            # jobs are ranges of point clouds
+            list_jobs = []
+            list_owner = []
 
-        return list_inside
+            for (j, name, idx, nclouds) in list_candidates:
+                for (i0, i1) in tt.parallel.chunk_ranges(nclouds,
+                                executor.nworkers, tt.parallel.MIN_CHUNK_HULLS):
+                    list_jobs.append((tt.model._inside_range, i0, i1,
+                                      ("P_" + name, name)))
+                    list_owner.append((j, idx))
+
+            # output - extract results
+            list_these_inside = tt.parallel.map_jobs(arrays, list_jobs,
+                                executor, instrumentation=self.instrumentation)
+
+        for ((j, idx), these_inside) in zip(list_owner, list_these_inside):
+            arr_inside[idx, j] |= these_inside
+
+        return arr_inside
 
 
     def getSamples(self, icluster, nsamples=50):
@@ -202,36 +443,163 @@ class World(object):
         # check validity
         self._check_icluster(icluster)
 
-        # extract
-        this_cluster = self._clusters[icluster]
+        # extract (fits the model, if pending)
+        this_model = self._getModel(icluster)
 
-        generated_samples = this_cluster["model"].getSamples(nsamples)
+        generated_samples = this_model.getSamples(nsamples)
 
         return generated_samples
 
-    def buildModel(self, settings, list_icluster=None):
+    def buildModel(self, settings, list_icluster=None, nworkers=None,
+                   executor=None, lazy=False):
         """
         creates a model
 
         settings are
         model_type: [resample]
         mgaus: number of Gaussians (e.g. 50-100)
+
+        clusters are fitted in separate processes if nworkers > 1, or via
+        executor (any object with a map function, e.g. a multiprocessing
+        Pool or concurrent.futures executor, which is not closed), and
+        otherwise as chosen by backend and nworkers of the world (see
+        parallel.getExecutor). Results are collected in the order of
+        list_icluster.
+
+        if lazy is True, only the settings are recorded, and each model is
+        fitted when first needed (getMean, getTube, getLogLikelihood,
+        getSamples, ...)
+
+        returns a dict {icluster: error} of clusters that failed to fit,
+        other clusters are not affected. The error is recorded, and raised
+        again when the model of such a cluster is needed
         """
 
         # check validity
         list_icluster = self._check_list_icluster(list_icluster)
 
+        tt.model.Model.checkSettings(settings)
+
+        # record settings (copy, changes by the caller have no effect)
+        for icluster in list_icluster:
+            this_cluster = self._clusters[icluster]
+            this_cluster["settings"] = dict(settings)
+            # previous model (or error) is outdated
+            this_cluster.pop("model", None)
+            this_cluster.pop("error", None)
+
+        if lazy:
+            return {}
+
+        list_tasks = []
+        work = 0
+
         for icluster in list_icluster:
             # extract
             this_cluster = self._clusters[icluster]
+            list_tasks.append((this_cluster["data"], settings,
+                               self.instrumentation is not None))
+            work += this_cluster["data"].getNumberOfPoints()
+
+        if executor is None:
+            if (nworkers is not None) and (nworkers > 1):
+                executor = tt.parallel.getExecutor("process", nworkers)
+            elif len(list_tasks) > 1:
+                executor = self._getExecutor(work, "fit")
+            else:
+                executor = tt.parallel.SerialExecutor()
+        else:
+            # provided by user, not closed
+            executor = tt.parallel.getExecutor(executor)
+
+        # output - extract results, cleanup also on errors
+        with executor:
+            list_results = executor.map(_build_model_task, list_tasks)
 
-            # build a new model
-            new_model = tt.model.Model(this_cluster["data"], settings)
+        failures = {}
+
+        for (icluster, (new_model, error)) in zip(list_icluster,
+                                                  list_results):
+            # extract
+            this_cluster = self._clusters[icluster]
+
+            if error is None:
+                if self.instrumentation is not None:
+                    # recorded by the model, possibly in another process
+                    self.instrumentation.merge(new_model.instrumentation)
+                    new_model.instrumentation = self.instrumentation
+
+                # overwrite
+                this_cluster.pop("error", None)
+                this_cluster["model"] = new_model
+                this_cluster["model_for"] = this_cluster["data"]
+            else:
+                failures[icluster] = error
+                self._setError(icluster, error)
+                print("warning: cluster {0} [{1}] failed to fit ({2})".format(
+                            icluster, this_cluster["name"], error))
 
-            # overwrite
-            this_cluster["model"] = new_model
             self._clusters[icluster] = this_cluster
 
+        return failures
+
+    def _setError(self, icluster, error):
+        """
+        records that the model of a cluster failed to fit, for its current
+        data
+        """
+
+        this_cluster = self._clusters[icluster]
+
+        this_cluster.pop("model", None)
+        this_cluster["error"] = error
+        this_cluster["model_for"] = this_cluster["data"]
+
+    def _getModel(self, icluster):
+        """
+        returns the model of a cluster, fits it first if pending (lazy) or
+        if the data has changed since
+
+        raises the error of a previous fit that failed (on the same data and
+        settings)
+        """
+
+        this_cluster = self._clusters[icluster]
+
+        if (("error" in this_cluster) and
+            (this_cluster.get("model_for") is this_cluster["data"])):
+            raise this_cluster["error"]
+
+        if (("model" in this_cluster) and
+            (this_cluster.get("model_for") is this_cluster["data"])):
+            this_model = this_cluster["model"]
+            this_model.grid_cache = self.grid_cache
+            (this_model.backend, this_model.nworkers) = (self.backend,
+                                                         self.nworkers)
+            this_model.instrumentation = self.instrumentation
+            return this_model
+
+        if "settings" not in this_cluster:
+            raise ValueError("cluster {0} has no model, use buildModel".format(icluster))
+
+        # fit now
+        try:
+            new_model = tt.model.Model(this_cluster["data"],
+                                       this_cluster["settings"],
+                                       self.instrumentation)
+        except Exception as e:
+            self._setError(icluster, e)
+            raise
+
+        this_cluster.pop("error", None)
+        this_cluster["model"] = new_model
+        this_cluster["model_for"] = this_cluster["data"]
+
+        new_model.grid_cache = self.grid_cache
+        (new_model.backend, new_model.nworkers) = (self.backend, self.nworkers)
+
+        return new_model
+
     def getMean(self, list_icluster=None):
         """
         returns the mean trajectory [x, y, z] for list_icluster
@@ -243,17 +611,18 @@ class World(object):
         Y_list = []
 
         for icluster in list_icluster:
-            # extract
-            this_cluster = self._clusters[icluster]
+            # extract (fits the model, if pending)
+            this_model = self._getModel(icluster)
             # obtain mean
-            Y = this_cluster["model"].getMean()
+            Y = this_model.getMean()
             # append to list
             Y_list.append(Y)
 
         return Y_list
 
 
-    def getTube(self, list_icluster=None, sdwidth=1, resolution=None, z=None):
+    def getTube(self, list_icluster=None, sdwidth=1, resolution=None, z=None,
+                sparse=False, maxdepth=None):
         """
         return (ss_list, [xx, yy, zz]) of models that fall within sdwidth
 
@@ -261,6 +630,10 @@ class World(object):
             - list_icluster
             - sdwidth
             - z
+            - sparse: if True, [xx, yy, zz] is an open grid (np.ogrid)
+            - maxdepth: if set, evaluates adaptively, refining a coarse grid
+              up to maxdepth times near the tube boundary (the resolution is
+              rounded up to allow this)
         """
 
         # check validity
@@ -274,42 +647,55 @@ class World(object):
             outline = outline[:4]
 
         # obtain grid to evaluate on
-        [xx, yy, zz] = self._getGrid(outline, resolution)
+        [xx, yy, zz] = self._getGrid(outline, resolution, sparse, maxdepth)
 
         # temporary adjust arrays
         if z is not None:
-            xx = np.reshape(xx, newshape=(xx.shape[0], xx.shape[1], 1))
-            yy = np.reshape(yy, newshape=(yy.shape[0], yy.shape[1], 1))
-            zz = np.ones_like(xx)*1.0*z;
+            [xx, yy, zz] = self._getGridLayer(xx, yy, z)
+
+        # evaluate all clusters in a single pass
+        if maxdepth is None:
+            ss_shared = self._evalGridClusters("tube", list_icluster,
+                                               xx, yy, zz, sdwidth)
 
         # values returned
         ss_list = []
 
         for icluster in list_icluster:
-            # extract
-            this_cluster = self._clusters[icluster]
-
-            ss = this_cluster["model"].isInside_grid(sdwidth, xx, yy, zz)
+            if maxdepth is None:
+                # all clusters at once
+                ss = ss_shared.pop(0)
+            else:
+                # extract (fits the model, if pending)
+                this_model = self._getModel(icluster)
+                ss = this_model.isInside_grid_adaptive(sdwidth, xx, yy, zz,
+                                                       maxdepth)
 
             if z is not None:
-                ss = np.reshape(ss, newshape=(xx.shape[0], xx.shape[1]))
+                ss = ss[:, :, 0]
 
             ss_list.append(ss)
 
         # re-adjust
         if z is not None:
-            xx = np.reshape(xx, newshape=(xx.shape[0], xx.shape[1]))
-            yy = np.reshape(yy, newshape=(yy.shape[0], yy.shape[1]))
+            xx = xx[:, :, 0]
+            yy = yy[:, :, 0]
             zz = None
 
         return (ss_list, [xx, yy, zz])
 
-    def getLogLikelihood(self, list_icluster=None, resolution=None, z=None):
+    def getLogLikelihood(self, list_icluster=None, resolution=None, z=None,
+                         sparse=False, maxdepth=None, tol=1.):
         """
         return (ss_list, [xx, yy, zz]) of models and corresponding log-likelihood
 
         Input parameters:
             - list_icluster
+            - sparse: if True, [xx, yy, zz] is an open grid (np.ogrid)
+            - maxdepth: if set, evaluates adaptively, refining a coarse grid
+              up to maxdepth times where the log-likelihood varies more than
+              tol (the resolution is rounded up to allow this)
+            - tol
         """
 
         # check validity
@@ -323,41 +709,368 @@ class World(object):
             outline = outline[:4]
 
         # obtain grid to evaluate on
-        [xx, yy, zz] = self._getGrid(outline, resolution)
+        [xx, yy, zz] = self._getGrid(outline, resolution, sparse, maxdepth)
 
         # temporary adjust arrays
         if z is not None:
-            xx = np.reshape(xx, newshape=(xx.shape[0], xx.shape[1], 1))
-            yy = np.reshape(yy, newshape=(yy.shape[0], yy.shape[1], 1))
-            zz = np.ones_like(xx)*1.0*z;
+            [xx, yy, zz] = self._getGridLayer(xx, yy, z)
+
+        # evaluate all clusters in a single pass
+        if maxdepth is None:
+            ss_shared = self._evalGridClusters("logp", list_icluster,
+                                               xx, yy, zz)
 
         # values returned
         ss_list = []
 
         for icluster in list_icluster:
-            # extract
-            this_cluster = self._clusters[icluster]
-
-            ss = this_cluster["model"].evalLogLikelihood(xx, yy, zz)
+            if maxdepth is None:
+                # all clusters at once
+                ss = ss_shared.pop(0)
+            else:
+                # extract (fits the model, if pending)
+                this_model = self._getModel(icluster)
+                ss = this_model.evalLogLikelihood_adaptive(xx, yy, zz,
+                                                           maxdepth, tol)
 
             if z is not None:
-                ss = np.reshape(ss, newshape=(xx.shape[0], xx.shape[1]))
+                ss = ss[:, :, 0]
 
             ss_list.append(ss)
 
         # re-adjust
         if z is not None:
-            xx = np.reshape(xx, newshape=(xx.shape[0], xx.shape[1]))
-            yy = np.reshape(yy, newshape=(yy.shape[0], yy.shape[1]))
+            xx = xx[:, :, 0]
+            yy = yy[:, :, 0]
             zz = None
 
         return (ss_list, [xx, yy, zz])
 
-    def _getGrid(self, outline, resolution=None):
+    def getTubePlane(self, origin, u, v, list_icluster=None, sdwidth=1,
+                     resolution=[20, 20]):
+        """
+        return (ss_list, [xx, yy, zz]) of models that fall within sdwidth,
+        on a plane of any orientation, spanned from origin by the vectors u
+        and v (see helpers.getPlanePoints). [xx, yy, zz] are the coordinates
+        [nu x nv] of the points on the plane (zz is None in 2d)
+
+        only the points on the plane are evaluated
+        """
+
+        P = tt.helpers.getPlanePoints(origin, u, v, resolution)
+
+        ss_list = self._evalPointsClusters("tube", P, list_icluster, sdwidth)
+
+        return (ss_list, self._getPointsCoordinates(P))
+
+    def getLogLikelihoodPlane(self, origin, u, v, list_icluster=None,
+                              resolution=[20, 20]):
+        """
+        return (ss_list, [xx, yy, zz]) of models and corresponding
+        log-likelihood, on a plane of any orientation (see getTubePlane)
+        """
+
+        P = tt.helpers.getPlanePoints(origin, u, v, resolution)
+
+        ss_list = self._evalPointsClusters("logp", P, list_icluster)
+
+        return (ss_list, self._getPointsCoordinates(P))
+
+    def getTubePolyline(self, Y_path, list_icluster=None, sdwidth=1,
+                        npoints=100):
+        """
+        return (ss_list, P, s) of models that fall within sdwidth, at npoints
+        P [npoints x D] spaced equally along the polyline Y_path [M x D], s
+        is the distance along the polyline
+        """
+
+        (P, s) = tt.helpers.getPolylinePoints(Y_path, npoints)
+
+        ss_list = self._evalPointsClusters("tube", P, list_icluster, sdwidth)
+
+        return (ss_list, P, s)
+
+    def getLogLikelihoodPolyline(self, Y_path, list_icluster=None,
+                                 npoints=100):
+        """
+        return (ss_list, P, s) of models and corresponding log-likelihood,
+        along the polyline Y_path [M x D] (see getTubePolyline)
+        """
+
+        (P, s) = tt.helpers.getPolylinePoints(Y_path, npoints)
+
+        ss_list = self._evalPointsClusters("logp", P, list_icluster)
+
+        return (ss_list, P, s)
+
+    def getTubeCorridor(self, Y_path, width, list_icluster=None, sdwidth=1,
+                        npoints=100, nwidth=11):
+        """
+        return (ss_list, P, s) of models that fall within sdwidth, in a
+        corridor (up to width) around the polyline Y_path [M x D], see
+        helpers.getCorridorPoints for the layout of the points P
+        """
+
+        (P, s) = tt.helpers.getCorridorPoints(Y_path, width, npoints, nwidth)
+
+        ss_list = self._evalPointsClusters("tube", P, list_icluster, sdwidth)
+
+        return (ss_list, P, s)
+
+    def getLogLikelihoodCorridor(self, Y_path, width, list_icluster=None,
+                                 npoints=100, nwidth=11):
+        """
+        return (ss_list, P, s) of models and corresponding log-likelihood, in
+        a corridor around the polyline Y_path [M x D] (see getTubeCorridor)
+        """
+
+        (P, s) = tt.helpers.getCorridorPoints(Y_path, width, npoints, nwidth)
+
+        ss_list = self._evalPointsClusters("logp", P, list_icluster)
+
+        return (ss_list, P, s)
+
+    def _evalPointsClusters(self, kind, P, list_icluster=None, sdwidth=None):
+        """
+        evaluates the tube ("tube", requires sdwidth) or log-likelihood
+        ("logp") of clusters at points P [... x D]
+
+        the points are evaluated at once, in this process (queries are small
+        compared to grids), or interpolated from a previously calculated
+        grid (see slice_tol). For the tube, points outside the outline of a
+        cluster are not evaluated.
+
+        returns list of arrays, shaped as P without the last dimension
+        """
+
+        # check validity
+        list_icluster = self._check_list_icluster(list_icluster)
+
+        P = np.array(P, dtype=float)
+
+        if P.shape[-1] != self._ndim:
+            raise ValueError("expected points in {0}d, not {1}d".format(
+                                                    self._ndim, P.shape[-1]))
+
+        shape = P.shape[:-1]
+        P = P.reshape(-1, self._ndim)
+
+        ss_list = []
+
+        for icluster in list_icluster:
+            # extract (fits the model, if pending)
+            this_model = self._getModel(icluster)
+
+            s = None
+
+            if self.slice_tol is not None:
+                # interpolate from a previously calculated grid
+                s = this_model.interpolateCached(kind, P, sdwidth,
+                                                 self.slice_tol)
+
+            if (s is None) and (kind == "logp"):
+                s = this_model.evalLogLikelihood_pnts(P)
+            elif s is None:
+                s = this_model.isInside_pnts(P, sdwidth,
+                                             nsamples=12).astype(float)
+
+            ss_list.append(s.reshape(shape))
+
+        return ss_list
+
+    def _getPointsCoordinates(self, P):
+        """
+        returns [xx, yy, zz] from points P [... x D], zz is None in 2d
+        """
+
+        list_coords = [P[..., d] for d in range(P.shape[-1])]
+
+        if len(list_coords) == 2:
+            list_coords.append(None)
+
+        return list_coords
+
+    def _getExecutor(self, work=None, kind=None):
+        """
+        returns an executor for work (e.g. points x cells) of kind ("logp"
+        or "tube"), based on backend and nworkers (see parallel.getExecutor)
+        """
+
+        return tt.parallel.getExecutor(self.backend, self.nworkers, work, kind)
+
+    def _evalGridClusters(self, kind, list_icluster, xx, yy, zz=None,
+                          sdwidth=None):
+        """
+        evaluates the tube ("tube", requires sdwidth) or log-likelihood
+        ("logp") of all clusters on a shared grid, in a single pass
+
+        the grid is walked in tiles (memory_budget), the points of a tile
+        are generated once and shared by all clusters. For the tube, points
+        outside the outline of a cluster are not evaluated. The arrays of
+        the models and tiles are shared with the workers (see parallel), the
+        tasks of all clusters are evaluated by a single executor (see
+        backend). Values are cached by the models.
+
+        returns list of arrays
+        """
+
+        axes = tt.helpers.getGridAxes(xx, yy, zz)
+        shape = tuple(len(axis) for axis in axes)
+
+        memory_budget = self.memory_budget
+        if memory_budget is None:
+            memory_budget = tt.model.Model.MEMORY_BUDGET
+
+        ss_list = [None]*len(list_icluster)
+
+        # clusters that require an evaluation, and their arrays
+        list_pending = []
+        arrays_models = {}
+        work = 0
+
+        for (j, icluster) in enumerate(list_icluster):
+            # extract (fits the model, if pending)
+            this_model = self._getModel(icluster)
+
+            ss = this_model._getCached(kind, axes, sdwidth)
+
+            if ss is not None:
+                ss_list[j] = ss
+                continue
+
+            # a slice, interpolate from a previously calculated grid
+            if (self.slice_tol is not None) and (min(shape) == 1):
+                s = this_model.interpolateCached(kind,
+                                        tt.helpers.getGridPoints(axes),
+                                        sdwidth, self.slice_tol)
+                if s is not None:
+                    ss_list[j] = s.reshape(shape)
+                    continue
+
+            name = "c{0}".format(j)
+
+            (arrays_j, bounds, nclouds) = this_model._getSharedArrays(kind,
+                                                            name, sdwidth)
+
+            arrays_models.update(arrays_j)
+
+            # cells evaluated per point
+            if kind == "logp":
+                ncells = arrays_j[name + "_cc"].shape[0]
+            else:
+                ncells = nclouds
+
+            work += int(np.prod(shape)) * ncells
+
+            ss = tt.helpers.allocate_grid(shape, float, memory_budget,
+                                          self.memmap_dir)
+
+            # not evaluated is not inside
+            ss[...] = 0.
+
+            list_pending.append((j, this_model, ss, name, bounds, nclouds))
+
+        if len(list_pending) == 0:
+            return ss_list
+
+        npoints = int(np.prod(shape))
+        ntile = int(max(1, memory_budget // tt.model.Model.EVAL_BYTES_PER_POINT))
+
+        # the arrays of the models are shared once, for all tiles, cleanup
+        # also on errors
+        with self._getExecutor(work, kind) as executor, \
+             executor.share(arrays_models) as shared_models:
+            ncores = executor.nworkers
+
+            for i0 in range(0, npoints, ntile):
+                i1 = min(i0 + ntile, npoints)
+
+                # points in this tile, shared by all clusters
+                with tt.instrumentation.stage(self.instrumentation, "grid",
+                                              i1 - i0):
+                    P = tt.helpers.getGridPoints(axes, i0, i1)
+
+                arrays = {"P": P}
+                list_jobs = []
+                list_owner = []
+
+                for (j, this_model, ss, name, bounds, nclouds) in list_pending:
+                    if kind == "logp":
+                        # ranges of points
+                        for (k0, k1) in tt.parallel.chunk_ranges(i1 - i0, ncores,
+                                                tt.parallel.MIN_CHUNK_POINTS):
+                            list_jobs.append((tt.model._logp_range, k0, k1,
+                                              ("P", name)))
+                            list_owner.append((ss, np.arange(i0 + k0, i0 + k1)))
+                        continue
+
+                    (Ymin, Ymax) = bounds
+                    idx = np.flatnonzero(np.all((P >= Ymin) & (P <= Ymax), axis=1))
+
+                    if idx.size == 0:
+                        continue
+
+                    arrays["P_" + name] = P[idx, :]
+
+                    # ranges of point clouds
+                    for (k0, k1) in tt.parallel.chunk_ranges(nclouds, ncores,
+                                                tt.parallel.MIN_CHUNK_HULLS):
+                        list_jobs.append((tt.model._inside_range, k0, k1,
+                                          ("P_" + name, name)))
+                        list_owner.append((ss, i0 + idx))
+
+                # output - extract results
+                list_val = tt.parallel.map_jobs(arrays, list_jobs, executor,
+                                                shared_models,
+                                                self.instrumentation)
+
+                with tt.instrumentation.stage(self.instrumentation, "scatter",
+                                              i1 - i0):
+                    for ((ss, idx_flat), s) in zip(list_owner, list_val):
+                        s_flat = ss.reshape(-1)
+                        if kind == "logp":
+                            s_flat[idx_flat] = s
+                        else:
+                            # inside any of the point clouds
+                            s_flat[idx_flat] = np.maximum(s_flat[idx_flat], s)
+
+
+        for (j, this_model, ss, name, bounds, nclouds) in list_pending:
+            if kind == "logp":
+                # replace NaN's with minimum
+                tt.helpers.fill_nan(ss, memory_budget)
+
+            this_model._storeCached(kind, ss, axes, sdwidth)
+
+            ss_list[j] = ss
+
+        return ss_list
+
+    def _getGridLayer(self, xx, yy, z):
+        """
+        returns a 3d grid [xx, yy, zz] holding a single layer at height z,
+        based on a 2d (dense or open) grid
+        """
+
+        xx = xx[:, :, np.newaxis]
+        yy = yy[:, :, np.newaxis]
+
+        if (xx.shape == yy.shape):
+            # dense grid
+            zz = np.ones_like(xx)*1.0*z
+        else:
+            # open grid
+            zz = np.ones(shape=(1, 1, 1))*1.0*z
+
+        return [xx, yy, zz]
+
+    def _getGrid(self, outline, resolution=None, sparse=False, maxdepth=None):
         """
         returns the grid
 
-        based on outline and resolution
+        based on outline and resolution, if sparse is True an open grid
+        (np.ogrid) is returned. If maxdepth is set, the number of points is
+        rounded up to allow maxdepth refinements of a coarse grid
         """
 
         # default resolution
@@ -367,7 +1080,13 @@ class World(object):
         # use expanded grid for calculations
         #outline = self._get_outline_expanded(list_icluster)
 
-        [xx, yy, zz] = tt.helpers.getGridFromResolution(outline, resolution)
+        [xx, yy, zz] = tt.helpers.getGridFromResolution(outline, resolution,
+                                                        sparse)
+
+        if maxdepth is not None:
+            axes = tt.helpers.getGridAxes(xx, yy, zz)
+            axes = tt.helpers.getAdaptiveAxes(axes, maxdepth)
+            [xx, yy, zz] = tt.helpers.getGridFromAxes(axes, sparse)
 
         return [xx, yy, zz]
 
@@ -450,10 +1169,10 @@ class World(object):
         global_outline = tt.helpers.getMaxOutline(self._ndim)
 
         for icluster in list_icluster:
-            # pass clusters
-            this_cluster = self._clusters[icluster]
+            # pass clusters (fits the model, if pending)
+            this_model = self._getModel(icluster)
 
-            local_outline = this_cluster["model"].getOutline(sdwidth)
+            local_outline = this_model.getOutline(sdwidth)
 
             for d in range(self._ndim):
 
@@ -476,17 +1195,7 @@ class World(object):
         returns an array
         """
 
-        this_cluster_data_outline = tt.helpers.getMaxOutline(self._ndim)
-
-        for (x, Y) in cluster_data:
+        if not isinstance(cluster_data, tt.cluster_data.ClusterData):
+            cluster_data = tt.cluster_data.ClusterData.fromList(cluster_data)
 
-            for d in range(self._ndim):
-                x = Y[:, d]
-                xmin = x.min()
-                xmax = x.max()
-                if (this_cluster_data_outline[d*2] > xmin):
-                    this_cluster_data_outline[d*2] = xmin
-                if (this_cluster_data_outline[d*2+1] < xmax):
-                    this_cluster_data_outline[d*2+1] = xmax
-
-        return this_cluster_data_outline
+        return cluster_data.getOutline()
@@ -42,7 +42,7 @@ def test_basis():
     # test assortment
     for mbasis in [5]:
         for mdim in [2]:
-            for mtype in ["rbf", "bernstein"]:
+            for mtype in ["rbf", "bernstein", "bspline"]:
                 # settings
                 myBasis = tt.basis.Basis(basisType=mtype, nbasis=mbasis, ndim=mdim)
                 # obtain basis
@@ -51,3 +51,134 @@ def test_basis():
                 assert (H.shape == (mpoints*mdim, mbasis*mdim))
                 # all finite numbers
                 assert (np.any(np.isfinite(res)))
+
+def test_basis_bspline():
+    """
+    testing compact support basis
+    """
+
+    mpoints = 25
+    x_test = np.linspace(0, 1, mpoints)
+
+    for mbasis in [2, 4, 20]:
+        myBasis = tt.basis.Basis(basisType="bspline", nbasis=mbasis, ndim=2)
+
+        assert (myBasis.isCompact())
+
+        # single dimension
+        B = myBasis.get_1d_sparse(x_test)
+        assert (B.shape == (mpoints, mbasis))
+
+        # partition of unity
+        np.testing.assert_allclose(B.sum(axis=1), 1.)
+
+        # at most (degree + 1) non-zero values per row
+        nbandwidth = myBasis.getBandwidth()
+        assert (np.diff(B.indptr).max() <= nbandwidth + 1)
+
+        # sparse and dense agree
+        H = myBasis.get(x_test)
+        Hs = myBasis.get_sparse(x_test)
+        assert (H.shape == (mpoints*2, mbasis*2))
+        np.testing.assert_allclose(Hs.toarray(), H)
+
+    # dense basis types are not compact
+    myBasis = tt.basis.Basis(basisType="rbf", nbasis=5, ndim=2)
+    assert (not myBasis.isCompact())
+    assert (myBasis.getBandwidth() is None)
+    np.testing.assert_allclose(myBasis.get_sparse(x_test).toarray(),
+                               myBasis.get(x_test))
+
+
+def test_basis_cache():
+    """
+    testing memoization of the design matrices
+    """
+
+    tt.basis.Basis.clearCache()
+
+    x_test = np.linspace(0, 1, 10)
+
+    myBasis = tt.basis.Basis(basisType="rbf", nbasis=5, ndim=2)
+
+    H1 = myBasis.get(x_test)
+    H2 = myBasis.get(x_test.copy())
+
+    # same sampling vector, same (cached) matrix
+    assert (H1 is H2)
+
+    # shared copy can not be modified
+    with pt.raises(ValueError) as testException:
+        H1[0, 0] = 1.
+
+    # shared between instances with the same parameters
+    otherBasis = tt.basis.Basis(basisType="rbf", nbasis=5, ndim=2)
+    assert (otherBasis.get(x_test) is H1)
+
+    # different parameters, different matrix
+    otherBasis = tt.basis.Basis(basisType="bernstein", nbasis=5, ndim=2)
+    H3 = otherBasis.get(x_test)
+    assert (H3 is not H1)
+
+    # values are identical to a fresh evaluation
+    np.testing.assert_array_equal(H1, myBasis._get(x_test))
+
+    # shared sparse copies can not be modified either
+    for basisType in ["rbf", "bspline"]:
+        otherBasis = tt.basis.Basis(basisType=basisType, nbasis=5, ndim=2)
+        for Hs in [otherBasis.get_sparse(x_test),
+                   otherBasis.get_1d_sparse(x_test)]:
+            with pt.raises(ValueError) as testException:
+                Hs.data[0] = 1.
+            with pt.raises(ValueError) as testException:
+                Hs *= 2.
+            # usable
+            np.testing.assert_allclose(Hs.dot(np.ones(Hs.shape[1])),
+                                       Hs.toarray().sum(axis=1))
+
+    # bounded size
+    for i in range(tt.basis.Basis.CACHE_SIZE + 10):
+        myBasis.get(np.linspace(0, 1, 3 + i))
+
+    assert (len(tt.basis.Basis._cache) == tt.basis.Basis.CACHE_SIZE)
+
+    tt.basis.Basis.clearCache()
+    assert (len(tt.basis.Basis._cache) == 0)
+
+
+def test_basis_cache_bytes(monkeypatch):
+    """
+    testing the size limit of the memo cache, on irregularly sampled x
+    """
+
+    tt.basis.Basis.clearCache()
+
+    monkeypatch.setattr(tt.basis.Basis, "CACHE_BYTES", 2**20)
+
+    # a different x for each trajectory
+    cluster_data = tt.synthetic.getClusterData(30, npoints=200, ndim=3,
+                                               irregular=True, seed=0)
+
+    settings = {"model_type": "ML", "ngaus": 10, "basis_type": "rbf",
+                "nbasis": 10}
+    tt.model.Model(cluster_data, settings)
+
+    def retained():
+        return sum(np.asarray(value).nbytes for (value, _)
+                   in tt.basis.Basis._cache.values())
+
+    assert (0 < retained() <= tt.basis.Basis.CACHE_BYTES)
+    assert (tt.basis.Basis._cache_nbytes == retained())
+
+    # large matrices are not memoized, but read-only as well
+    monkeypatch.setattr(tt.basis.Basis, "CACHE_MAX_ENTRY_BYTES", 2**10)
+    tt.basis.Basis.clearCache()
+
+    myBasis = tt.basis.Basis(basisType="rbf", nbasis=10, ndim=3)
+    H = myBasis.get(np.linspace(0, 1, 100))
+    assert (not H.flags.writeable)
+    assert (len(tt.basis.Basis._cache) == 0)
+    assert (tt.basis.Basis._cache_nbytes == 0)
+
+    tt.basis.Basis.clearCache()
+
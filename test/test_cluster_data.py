@@ -0,0 +1,270 @@
+"""
+<description>
+"""
+
+import os
+import numpy as np
+import pytest as pt
+
+import teetool as tt
+
+
+def test_init():
+    """
+    tests columnar storage of trajectories
+    """
+
+    mdim = 3
+
+    list_data = tt.helpers.get_trajectories(0, ndim=mdim, ntraj=5, npoints=20)
+    # varying lengths
+    list_data = [(x[i:], Y[i:, :]) for (i, (x, Y)) in enumerate(list_data)]
+
+    cluster_data = tt.ClusterData.fromList(list_data)
+
+    assert (len(cluster_data) == 5)
+    assert (cluster_data.getDimension() == mdim)
+    assert (cluster_data.getNumberOfPoints() == 20+19+18+17+16)
+    np.testing.assert_array_equal(cluster_data.getLengths(),
+                                  [20, 19, 18, 17, 16])
+
+    # behaves as a list, trajectories are views
+    for ((x1, Y1), (x2, Y2)) in zip(list_data, cluster_data):
+        np.testing.assert_array_equal(x1, x2)
+        np.testing.assert_array_equal(Y1, Y2)
+
+    (x, Y) = cluster_data[-1]
+    (x_all, Y_all, offsets) = cluster_data.getArrays()
+    assert (np.shares_memory(Y, Y_all))
+
+    assert (len(cluster_data[1:3]) == 2)
+    assert (len(cluster_data.toList()) == 5)
+
+    with pt.raises(IndexError) as testException:
+        _ = cluster_data[5]
+
+    # outline
+    Y_list = np.concatenate([Y for (x, Y) in list_data], axis=0)
+    outline = cluster_data.getOutline()
+    for d in range(mdim):
+        assert (outline[d*2] == Y_list[:, d].min())
+        assert (outline[d*2+1] == Y_list[:, d].max())
+
+    # normalised, Y shared
+    norm_data = cluster_data.getNormalised()
+    assert (norm_data.getMinMax() == (0, 1))
+    assert (np.shares_memory(norm_data.getArrays()[1], Y_all))
+
+    # resampled, as np.interp per trajectory
+    xp = np.linspace(-60, 60, 7)
+    Yp = cluster_data.resample(xp)
+    assert (Yp.shape == (5, 7, mdim))
+    for (i, (x, Y)) in enumerate(list_data):
+        for d in range(mdim):
+            np.testing.assert_allclose(Yp[i, :, d], np.interp(xp, x, Y[:, d]))
+
+    # reduced precision
+    cluster_data = tt.ClusterData.fromList(list_data, dtype=np.float32)
+    assert (cluster_data.getArrays()[1].dtype == np.float32)
+
+
+def test_downsample():
+    """
+    tests selecting data-points nearest to equally spaced x
+    """
+
+    list_data = tt.helpers.get_trajectories(0, ndim=2, ntraj=5, npoints=50)
+    # varying lengths
+    list_data = [(x[i*10:], Y[i*10:, :]) for (i, (x, Y)) in
+                 enumerate(list_data)]
+
+    cluster_data = tt.ClusterData.fromList(list_data)
+
+    small_data = cluster_data.downsample(10)
+
+    assert (len(small_data) == 5)
+    np.testing.assert_array_equal(small_data.getLengths(), 10)
+
+    # as find_nearest per trajectory
+    for ((x1, Y1), (x2, Y2)) in zip(list_data, small_data):
+        idx = tt.helpers.find_nearest(x1, np.linspace(x1[0], x1[-1], 10))
+        np.testing.assert_array_equal(x2, x1[idx])
+        np.testing.assert_array_equal(Y2, Y1[idx, :])
+
+    # short trajectories keep all data-points, once
+    large_data = cluster_data.downsample(100)
+    np.testing.assert_array_equal(large_data.getLengths(),
+                                  cluster_data.getLengths())
+
+    with pt.raises(ValueError):
+        cluster_data.downsample(1)
+
+
+def test_decimate():
+    """
+    tests decimating trajectories within a tolerance
+    """
+
+    cluster_data = tt.synthetic.getClusterData(20, npoints=200, ndim=3,
+                                               shape="helix", npoints_max=400,
+                                               irregular=True, noise_std=.1,
+                                               seed=1)
+
+    (x, Y, offsets) = cluster_data.getArrays()
+
+    for method in tt.ClusterData.DECIMATE_METHODS:
+        for tol in [0., 0.5, 5.]:
+            small_data = cluster_data.decimate(tol, method)
+
+            assert (len(small_data) == 20)
+
+            # data-points are selected, first and last are kept
+            for ((x1, Y1), (x2, Y2)) in zip(cluster_data, small_data):
+                idx = np.searchsorted(x1, x2)
+                np.testing.assert_array_equal(x1[idx], x2)
+                np.testing.assert_array_equal(Y1[idx, :], Y2)
+                assert (x2[0] == x1[0])
+                assert (x2[-1] == x1[-1])
+
+            # within tolerance
+            keep = np.isin(x, small_data.getArrays()[0])
+            error = tt.helpers.getDecimationError(x, Y, offsets, keep)
+            assert np.all(error <= tol)
+
+        # fewer data-points on a larger tolerance
+        assert (cluster_data.decimate(5., method).getNumberOfPoints() <
+                cluster_data.decimate(.5, method).getNumberOfPoints() <
+                cluster_data.getNumberOfPoints())
+
+    # straight lines hold their first and last data-point only
+    list_data = [(np.linspace(0, 1, 50), np.outer(np.linspace(0, 1, 50),
+                                                  [1., 2.]) + i)
+                 for i in range(3)]
+    line_data = tt.ClusterData.fromList(list_data)
+
+    for method in tt.ClusterData.DECIMATE_METHODS:
+        np.testing.assert_array_equal(line_data.decimate(1e-9,
+                                                method).getLengths(), 2)
+
+    with pt.raises(ValueError):
+        cluster_data.decimate(-1.)
+
+    with pt.raises(ValueError):
+        cluster_data.decimate(1., "unknown")
+
+
+def test_validation():
+    """
+    tests validation of the data
+    """
+
+    list_data = tt.helpers.get_trajectories(0, ndim=2, ntraj=3)
+
+    with pt.raises(TypeError) as testException:
+        _ = tt.ClusterData.fromList(5)
+
+    with pt.raises(TypeError) as testException:
+        _ = tt.ClusterData.fromList(list_data + [5])
+
+    with pt.raises(ValueError) as testException:
+        _ = tt.ClusterData.fromList(list_data, ndim=3)
+
+    (x, Y) = list_data[0]
+
+    with pt.raises(ValueError) as testException:
+        _ = tt.ClusterData.fromList([(x[1:], Y)])
+
+    x_bad = x.copy()
+    x_bad[0] = np.nan
+    with pt.raises(ValueError) as testException:
+        _ = tt.ClusterData.fromList([(x_bad, Y)])
+
+    with pt.raises(ValueError) as testException:
+        _ = tt.ClusterData(x, Y, [0, 10])
+
+    with pt.raises(ValueError) as testException:
+        _ = tt.ClusterData(x, Y, [0, 0, x.size])
+
+
+def test_save_load(tmp_path):
+    """
+    tests saving and (memory-mapped) loading
+    """
+
+    cluster_data = tt.ClusterData.fromList(
+                        tt.helpers.get_trajectories(0, ndim=2, ntraj=5),
+                        dtype=np.float32)
+
+    path = str(tmp_path / "cluster")
+    cluster_data.save(path)
+
+    loaded = tt.ClusterData.load(path)
+
+    (x, Y, offsets) = loaded.getArrays()
+    assert (isinstance(Y.base, np.memmap) or isinstance(Y, np.memmap))
+    assert (Y.dtype == np.float32)
+
+    for ((x1, Y1), (x2, Y2)) in zip(cluster_data, loaded):
+        np.testing.assert_array_equal(x1, x2)
+        np.testing.assert_array_equal(Y1, Y2)
+
+    # in RAM
+    loaded = tt.ClusterData.load(path, mmap_mode=None)
+    assert (len(loaded) == 5)
+
+    # not cluster data
+    with pt.raises(IOError) as testException:
+        tt.ClusterData.load(str(tmp_path))
+
+
+def test_ingest(tmp_path):
+    """
+    tests bulk ingest from tables and files
+    """
+
+    cluster_data = tt.ClusterData.fromList(
+                        tt.helpers.get_trajectories(1, ndim=3, ntraj=4))
+
+    (x, Y, offsets) = cluster_data.getArrays()
+    track_id = np.repeat(np.arange(4), cluster_data.getLengths())
+
+    # consecutive rows
+    new_data = tt.ClusterData.fromTable(track_id, x, Y)
+    np.testing.assert_array_equal(new_data.getArrays()[2], offsets)
+
+    # interleaved rows, sorted by track id
+    order = np.arange(x.size).reshape(4, -1).T.ravel()
+    new_data = tt.ClusterData.fromTable(track_id[order], x[order], Y[order])
+    for ((x1, Y1), (x2, Y2)) in zip(cluster_data, new_data):
+        np.testing.assert_array_equal(x1, x2)
+        np.testing.assert_array_equal(Y1, Y2)
+
+    with pt.raises(ValueError) as testException:
+        tt.ClusterData.fromTable(track_id[:-1], x, Y)
+
+    # CSV, with a header, in small chunks
+    path = str(tmp_path)
+    filename = os.path.join(path, "tracks.csv")
+    np.savetxt(filename, np.column_stack((track_id, x, Y)), delimiter=",",
+               header="id,x,y,z", comments="")
+
+    new_data = tt.ClusterData.fromCSV(filename, 3, skiprows=1, chunksize=7)
+    np.testing.assert_array_equal(new_data.getArrays()[2], offsets)
+    np.testing.assert_allclose(new_data.getArrays()[1], Y)
+
+    # columns in another order
+    new_data = tt.ClusterData.fromCSV(filename, 2, usecols=(0, 1, 3, 2),
+                                      skiprows=1, dtype=np.float32)
+    assert (new_data.getArrays()[1].dtype == np.float32)
+    np.testing.assert_allclose(new_data.getArrays()[1], Y[:, [1, 0]],
+                               rtol=1e-6)
+
+    # flat binary files, memory-mapped
+    list_files = []
+    for (name, arr) in zip(["x", "Y", "offsets"], [x, Y, offsets]):
+        list_files.append(os.path.join(path, name + ".npy"))
+        np.save(list_files[-1], arr)
+
+    new_data = tt.ClusterData.fromNpy(*list_files)
+    assert (len(new_data) == 4)
+    np.testing.assert_array_equal(new_data[2][1], cluster_data[2][1])
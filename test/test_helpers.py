@@ -43,6 +43,24 @@ def test_toy_trajectories():
         for (x, Y) in traj:
             assert (np.size(Y,1) == d)
 
+def test_find_nearest():
+    """
+    tests finding nearest values, sorted and unsorted
+    """
+
+    target_values = [-1., 0.2, 0.5, 1.5, 2.6, 10.]
+
+    for target_array in [[0., 1., 1., 2., 3.], [3., 1., 0., 2., 1.]]:
+        idx = tt.helpers.find_nearest(target_array, target_values)
+        # as argmin, the first index on a tie
+        expected = [np.abs(np.array(target_array) - v).argmin()
+                    for v in target_values]
+        np.testing.assert_array_equal(idx, expected)
+
+    with pt.raises(ValueError):
+        tt.helpers.find_nearest([], [1.])
+
+
 def test_inside_hull():
     """
     tests if points are inside a hull
@@ -76,3 +94,178 @@ def test_inside_hull():
     p = np.array([0, 0, 0])
 
     assert(tt.helpers.in_hull(p, Y))
+
+def test_grid():
+    """
+    tests dense and open grids
+    """
+
+    for outline in [[0, 1, 0, 2], [0, 1, 0, 2, -1, 1]]:
+        for resolution in [0.5, [3, 4, 5][:len(outline)//2]]:
+
+            grid_dense = tt.helpers.getGridFromResolution(outline, resolution)
+            grid_open = tt.helpers.getGridFromResolution(outline, resolution,
+                                                         sparse=True)
+
+            # same axes, same shape
+            shape = tt.helpers.getGridShape(*grid_dense)
+            assert (shape == tt.helpers.getGridShape(*grid_open))
+
+            for (a1, a2) in zip(tt.helpers.getGridAxes(*grid_dense),
+                                tt.helpers.getGridAxes(*grid_open)):
+                np.testing.assert_array_equal(a1, a2)
+
+            # open grid holds only the axes
+            for grid_d in grid_open:
+                if grid_d is not None:
+                    assert (grid_d.size in shape)
+
+            # materialised open grid equals dense grid
+            for copy in [True, False]:
+                grid_full = tt.helpers.materialiseGrid(*grid_open, copy=copy)
+                for (g1, g2) in zip(grid_dense, grid_full):
+                    if g1 is None:
+                        assert (g2 is None)
+                    else:
+                        np.testing.assert_array_equal(g1, g2)
+
+def test_grid_tiles(tmp_path):
+    """
+    tests grid points, allocation and filling in blocks
+    """
+
+    axes = [np.linspace(0, 1, 3), np.linspace(-1, 1, 4), np.linspace(2, 3, 5)]
+
+    xx, yy, zz = np.meshgrid(*axes, indexing="ij")
+    Y_full = np.array([xx.ravel(), yy.ravel(), zz.ravel()]).T
+
+    # tiles cover all points, in C order
+    np.testing.assert_array_equal(tt.helpers.getGridPoints(axes), Y_full)
+    np.testing.assert_array_equal(tt.helpers.getGridPoints(axes, 7, 23),
+                                  Y_full[7:23])
+
+    # in RAM
+    ss = tt.helpers.allocate_grid((3, 4, 5))
+    assert (type(ss) is np.ndarray)
+
+    # memory-mapped, larger than budget
+    ss = tt.helpers.allocate_grid((3, 4, 5), memory_budget=16,
+                                  memmap_dir=str(tmp_path))
+    assert (isinstance(ss, np.memmap))
+    assert (ss.shape == (3, 4, 5))
+
+    # fill NaN's with minimum, in small blocks
+    ss[:] = np.arange(60).reshape((3, 4, 5)) + 1.
+    ss[0, 0, :] = np.nan
+    tt.helpers.fill_nan(ss, memory_budget=24)
+    assert (np.all(ss[0, 0, :] == 6.))
+
+def test_adaptive():
+    """
+    tests adaptive evaluation on a grid
+    """
+
+    def func_inside(P):
+        return 1.*(np.sum(P**2, axis=1) < 0.5)
+
+    def func_smooth(P):
+        return -10.*np.sum(P**2, axis=1)
+
+    for ndim in [2, 3]:
+        axes = [np.linspace(-1, 1, 30)]*ndim
+
+        with pt.raises(ValueError) as testException:
+            _ = tt.helpers.eval_adaptive(func_inside, axes, maxdepth=2)
+
+        # number of points allows the refinement
+        axes = tt.helpers.getAdaptiveAxes(axes, maxdepth=2)
+        for axis in axes:
+            assert ((len(axis) - 1) % 4 == 0)
+            assert (axis[0] == -1) and (axis[-1] == 1)
+
+        P = tt.helpers.getGridPoints(axes)
+        shape = tuple(len(axis) for axis in axes)
+
+        # inside / outside, exact with fewer evaluations
+        (ss, nevaluated) = tt.helpers.eval_adaptive(func_inside, axes, 2)
+        np.testing.assert_array_equal(ss, func_inside(P).reshape(shape))
+        assert (nevaluated < P.shape[0])
+
+        # smooth function, interpolation errors bounded
+        (ss, nevaluated) = tt.helpers.eval_adaptive(func_smooth, axes, 2,
+                                                    tol=0.5)
+        assert (np.max(np.abs(ss - func_smooth(P).reshape(shape))) < 0.5)
+
+        # no tolerance, all points evaluated
+        (ss, nevaluated) = tt.helpers.eval_adaptive(func_smooth, axes, 2,
+                                                    tol=0.)
+        assert (nevaluated == P.shape[0])
+
+    # grid from axes
+    for sparse in [True, False]:
+        grid = tt.helpers.getGridFromAxes(axes, sparse)
+        for (a1, a2) in zip(tt.helpers.getGridAxes(*grid), axes):
+            np.testing.assert_array_equal(a1, a2)
+
+def test_query_points():
+    """
+    tests points on planes, polylines, and corridors
+    """
+
+    # plane, any orientation
+    P = tt.helpers.getPlanePoints([0, 0, 1], [2, 0, 0], [0, 1, 1], [3, 5])
+    assert (P.shape == (3, 5, 3))
+    np.testing.assert_allclose(P[-1, -1, :], [2, 1, 2])
+
+    with pt.raises(ValueError) as testException:
+        tt.helpers.getPlanePoints([0, 0, 1], [2, 0, 0], [1, 0, 0])
+
+    # polyline, equally spaced
+    Y_path = np.array([[0., 0.], [3., 0.], [3., 4.]])
+    (P, s) = tt.helpers.getPolylinePoints(Y_path, npoints=8)
+    assert (P.shape == (8, 2))
+    np.testing.assert_allclose(s, np.linspace(0, 7, 8))
+    np.testing.assert_allclose(P[5, :], [3., 2.])
+
+    with pt.raises(ValueError) as testException:
+        tt.helpers.getPolylinePoints(Y_path[:1, :])
+
+    # corridor, perpendicular to the path
+    (P, s) = tt.helpers.getCorridorPoints(Y_path, 1., npoints=8, nwidth=3)
+    assert (P.shape == (8, 3, 2))
+    np.testing.assert_allclose(P[1, :, 0], [1., 1., 1.])
+    np.testing.assert_allclose(np.abs(P[1, :, 1]), [1., 0., 1.])
+
+    Y_path = np.array([[0., 0., 0.], [0., 0., 5.]])
+    (P, s) = tt.helpers.getCorridorPoints(Y_path, 1., npoints=4, nwidth=5)
+    assert (P.shape == (4, 5, 5, 3))
+    np.testing.assert_allclose(P[2, :, :, 2], 10./3)
+    np.testing.assert_allclose(np.max(np.abs(P[..., :2]), axis=(1, 2, 3)), 1.)
+
+    # vectorised log-likelihood
+    cc = [np.mat([[0.], [1.]]), np.mat([[2.], [0.]])]
+    cA = [np.mat([[1., .2], [.2, 2.]]), np.mat([[.5, 0.], [0., .5]])]
+    Y = np.random.randn(10, 2)
+    cL = np.linalg.cholesky(np.array(cA))
+    cLinv = np.linalg.inv(cL)
+    clogdet = 2.*np.log(np.linalg.det(cL))
+    s = tt.helpers.gauss_logLc_cells(Y, 2, np.array(cc).reshape(2, 2), cLinv,
+                                     clogdet)
+    for (i, y) in enumerate(Y):
+        np.testing.assert_allclose(s[i], tt.helpers.gauss_logLc(y, 2, cc, cA))
+
+def test_interpolation_error():
+    """
+    tests the estimate of the interpolation error on a grid
+    """
+
+    x = np.arange(5.)
+    xx, yy = np.meshgrid(x, x, indexing="ij")
+
+    # linear, no error
+    np.testing.assert_allclose(tt.helpers.getInterpolationError(xx + 2*yy), 0.)
+
+    # quadratic, h^2 |f''| / 8
+    np.testing.assert_allclose(tt.helpers.getInterpolationError(xx**2), .25)
+    np.testing.assert_allclose(
+        tt.helpers.getInterpolationError(xx**2 + yy**2), .5)
@@ -0,0 +1,64 @@
+"""
+<description>
+"""
+
+import subprocess
+import sys
+import pytest as pt
+
+import teetool as tt
+
+# import time of the core (World, Model) path [s], generous for slow machines
+IMPORT_TIME_BUDGET = 3.
+
+
+def _run(code):
+    """
+    returns the output of code, run by a new interpreter
+    """
+
+    return subprocess.check_output([sys.executable, "-c", code]).decode()
+
+
+def test_import_core():
+    """
+    core does not import the plotting modules, within the time budget
+    """
+
+    output = _run(
+        "import sys, time\n"
+        "start = time.time()\n"
+        "import teetool as tt\n"
+        "world_1 = tt.World(ndim=2)\n"
+        "print(time.time() - start)\n"
+        "print(int('matplotlib' in sys.modules))\n"
+        "print(int('mayavi' in sys.modules))\n"
+        "print(int('teetool.visual_2d' in sys.modules))\n")
+
+    (elapsed, matplotlib, mayavi, visual) = output.split()
+
+    assert (float(elapsed) < IMPORT_TIME_BUDGET)
+    assert (matplotlib == "0")
+    assert (mayavi == "0")
+    assert (visual == "0")
+
+
+def test_import_lazy():
+    """
+    plotting modules are imported on first access
+    """
+
+    output = _run(
+        "import sys\n"
+        "import teetool as tt\n"
+        "print(tt.visual_2d.__name__)\n"
+        "print(int('matplotlib' in sys.modules))\n"
+        "print(int('mayavi' in sys.modules))\n")
+
+    assert (output.split() == ["teetool.visual_2d", "1", "0"])
+
+    assert ("visual_2d" in dir(tt))
+    assert ("visual_3d" in tt.__all__)
+
+    with pt.raises(AttributeError):
+        tt.visual_4d
@@ -0,0 +1,75 @@
+"""
+<description>
+"""
+
+import os
+import json
+import numpy as np
+import pytest as pt
+
+import teetool as tt
+
+
+def test_instrumentation(tmp_path):
+    """
+    tests recording, merging, and exporting stages
+    """
+
+    instr = tt.Instrumentation()
+
+    assert (instr.asDict() == {})
+
+    with instr.stage("grid", 100):
+        pass
+
+    instr.add("evaluate", 0.5, calls=4, npoints=100)
+    instr.count("cache", True)
+    instr.count("cache", False)
+    instr.count("cache", False)
+
+    records = instr.asDict()
+
+    assert (records["grid"]["calls"] == 1)
+    assert (records["grid"]["points"] == 100)
+    assert (records["grid"]["time"] >= 0.)
+    assert (records["evaluate"]["calls"] == 4)
+    assert (records["evaluate"]["time"] == 0.5)
+    assert (records["cache"]["hits"] == 1)
+    assert (records["cache"]["misses"] == 2)
+
+    # a copy
+    records["grid"]["calls"] = 10
+    assert (instr.asDict()["grid"]["calls"] == 1)
+
+    # merge
+    other = tt.Instrumentation()
+    other.add("evaluate", 0.25, npoints=10)
+    other.add("fit", 1.)
+    instr.merge(other)
+
+    records = instr.asDict()
+    assert (records["evaluate"]["calls"] == 5)
+    assert (records["evaluate"]["time"] == 0.75)
+    assert (records["evaluate"]["points"] == 110)
+    assert (records["fit"]["calls"] == 1)
+
+    # export
+    path = str(tmp_path)
+
+    instr.export(os.path.join(path, "stages.json"))
+    with open(os.path.join(path, "stages.json")) as fid:
+        assert (json.load(fid) == records)
+
+    instr.export(os.path.join(path, "stages.csv"))
+    table = np.genfromtxt(os.path.join(path, "stages.csv"), delimiter=",",
+                          names=True, dtype=None, encoding="utf-8")
+    assert (len(table) == len(records))
+    assert (list(table.dtype.names) == ["stage"] + tt.instrumentation.FIELDS)
+
+    instr.reset()
+    assert (instr.asDict() == {})
+
+    # off, records nothing
+    with tt.instrumentation.stage(None, "grid", 100):
+        pass
+    tt.instrumentation.count(None, "cache", True)
@@ -137,7 +137,7 @@ def test_init():
     assert (len(cA) == mgaus)
 
     # CHECK dimensions
-    assert (cc[0].shape == (mdim, 1))  # [mdim x 1]
+    assert (cc[0].shape == (mdim,))  # [mdim]
     assert (cA[0].shape == (mdim, mdim))  # [mdim x mdim]
 
     # CHECK
@@ -145,3 +145,94 @@ def test_init():
         _, yy = np.mgrid[-10:10:2j, -10:10:2j]
         xx, _, _ = np.mgrid[-10:10:2j, -10:10:2j, -10:10:2j]
         _ = new_model.evalLogLikelihood(xx, yy)
+
+
+def test_decimate():
+    """
+    tests fitting a model on decimated trajectories
+    """
+
+    cluster_data = tt.helpers.get_trajectories(1, ndim=3, ntraj=20,
+                                               npoints=200)
+
+    for model_type in ["resampling", "ML", "EM"]:
+        settings = {"model_type": model_type, "ngaus": 20,
+                    "basis_type": "bernstein", "nbasis": 5}
+
+        model_1 = tt.model.Model(cluster_data, settings)
+
+        settings["decimate_tol"] = 2.
+        instr = tt.Instrumentation()
+        model_2 = tt.model.Model(cluster_data, settings, instr)
+
+        # fitted on fewer data-points
+        records = instr.asDict()
+        assert (records["fit"]["points"] < records["decimate"]["points"])
+
+        if model_type != "EM":
+            # (almost) the same model, EM does not converge on these
+            np.testing.assert_allclose(model_2.getMean(), model_1.getMean(),
+                                       atol=2.)
+
+    with pt.raises(TypeError):
+        tt.model.Model(cluster_data, {"model_type": "resampling",
+                                      "ngaus": 20, "decimate_tol": "1"})
+
+    with pt.raises(ValueError):
+        tt.model.Model(cluster_data, {"model_type": "resampling",
+                                      "ngaus": 20, "decimate_tol": -1.})
+
+    with pt.raises(ValueError):
+        tt.model.Model(cluster_data, {"model_type": "resampling",
+                                      "ngaus": 20, "decimate_tol": 1.,
+                                      "decimate_method": "unknown"})
+
+
+def test_eval_grid_shared(monkeypatch):
+    """
+    tests that a grid is evaluated by one executor, sharing the model once
+    """
+
+    cluster_data = tt.helpers.get_trajectories(1, ndim=2, ntraj=10)
+    new_model = tt.model.Model(cluster_data, {"model_type": "resampling",
+                                              "ngaus": 10})
+
+    xx, yy = np.ogrid[-60:60:40j, -10:240:40j]
+
+    ss_logp = new_model.evalLogLikelihood(xx, yy)
+    ss_tube = new_model.isInside_grid(1, xx, yy)
+
+    counts = {"share": 0, "pool": 0}
+
+    share = tt.parallel.ProcessExecutor.share
+    getPool = tt.parallel.ProcessExecutor._getPool
+
+    def counted_share(self, arrays):
+        counts["share"] += 1
+        return share(self, arrays)
+
+    def counted_getPool(self):
+        if self._pool is None:
+            counts["pool"] += 1
+        return getPool(self)
+
+    monkeypatch.setattr(tt.parallel.ProcessExecutor, "share", counted_share)
+    monkeypatch.setattr(tt.parallel.ProcessExecutor, "_getPool",
+                        counted_getPool)
+
+    new_model.backend = "process"
+    new_model.nworkers = 2
+    new_model.clearCached()
+
+    # many tiles
+    budget = 100 * tt.model.Model.EVAL_BYTES_PER_POINT
+
+    np.testing.assert_array_almost_equal(
+        new_model.evalLogLikelihood(xx, yy, memory_budget=budget), ss_logp)
+    np.testing.assert_array_equal(
+        new_model.isInside_grid(1, xx, yy, memory_budget=budget), ss_tube)
+
+    # once per grid, not per tile
+    assert (counts["share"] == 2)
+    assert (counts["pool"] <= 2)
+
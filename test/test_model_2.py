@@ -32,6 +32,15 @@ def test_eval():
             ss2 = model.evalLogLikelihood(xx, yy, zz)
             assert (ss1.shape==ss2.shape)
 
+        # open grids give identical results
+        if (mdim == 2):
+            grid_open = np.ogrid[-10:10:2j, -10:10:2j] + [None]
+        if (mdim == 3):
+            grid_open = np.ogrid[-10:10:2j, -10:10:2j, -10:10:2j]
+        [xo, yo, zo] = grid_open
+        np.testing.assert_array_equal(ss1, model.isInside_grid(1, xo, yo, zo))
+        np.testing.assert_array_equal(ss2, model.evalLogLikelihood(xo, yo, zo))
+
         # test subfunctions
         y = np.zeros((mdim, 1))
         y = np.mat(y)
@@ -53,8 +62,11 @@ def test_eval():
 
     #
     for model_type1 in ["ML"]:
-        for basis_type1 in ["rbf", "bernstein"]:
+        for basis_type1 in ["rbf", "bernstein", "bspline"]:
             do_this_test(mdim=2, model_type=model_type1, basis_type=basis_type1)
 
+    # compact support basis, sparse EM statistics
+    do_this_test(mdim=2, model_type="EM", basis_type="bspline")
+
     # test EM, long test
     # do_this_test(mdim=2, model_type="EM", basis_type="bernstein")
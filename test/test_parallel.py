@@ -0,0 +1,104 @@
+"""
+<description>
+"""
+
+from multiprocessing.pool import ThreadPool
+import numpy as np
+import pytest as pt
+
+import teetool as tt
+
+
+def _sum_range(arrays, i0, i1, name):
+    """
+    returns the sum of rows i0 up to i1 (module-level, picklable)
+    """
+    return arrays[name][i0:i1].sum(axis=0)
+
+
+def test_chunk_ranges():
+    """
+    ranges cover all items, in order, without overlap
+    """
+
+    for (n, nworkers, min_chunk) in [(0, 4, 1), (1, 4, 1), (10, 4, 1),
+                                     (1000, 3, 100), (17, 2, 5)]:
+        ranges = tt.parallel.chunk_ranges(n, nworkers, min_chunk)
+        if n == 0:
+            assert (ranges == [])
+            continue
+        assert (ranges[0][0] == 0)
+        assert (ranges[-1][1] == n)
+        for ((a0, a1), (b0, b1)) in zip(ranges[:-1], ranges[1:]):
+            assert (a1 == b0)
+        # at least min_chunk per chunk
+        assert (len(ranges) <= max(1, n // min_chunk))
+
+
+def test_map_jobs():
+    """
+    results equal for all executors, with shared arrays
+    """
+
+    A = np.arange(60.).reshape(20, 3)
+    B = -np.arange(40.).reshape(20, 2)
+
+    list_jobs = [(_sum_range, i0, i1, ("A",))
+                 for (i0, i1) in tt.parallel.chunk_ranges(20, 2)]
+    list_jobs.append((_sum_range, 5, 15, ("B",)))
+
+    expected = [A[i0:i1].sum(axis=0) for (_, i0, i1, _) in list_jobs[:-1]]
+    expected.append(B[5:15].sum(axis=0))
+
+    for backend in ["serial", "thread", "process"]:
+        with tt.parallel.getExecutor(backend, nworkers=2) as executor:
+            assert (executor.name == backend)
+
+            with executor.share({"B": B}) as shared:
+                list_results = tt.parallel.map_jobs({"A": A}, list_jobs,
+                                                    executor, shared)
+
+            assert (len(list_results) == len(expected))
+            for (r, e) in zip(list_results, expected):
+                np.testing.assert_array_equal(r, e)
+
+    # arrays shared with processes are read-only
+    with tt.parallel.SharedArrays({"B": B}) as shared:
+        arrays = shared.getArrays()
+        with pt.raises(ValueError):
+            arrays["B"][0, 0] = 1.
+
+
+def test_getExecutor():
+    """
+    auto selects serial for small work, threads or processes otherwise
+    """
+
+    small = tt.parallel.AUTO_MIN_WORK - 1
+    large = tt.parallel.AUTO_MIN_WORK
+
+    assert (tt.parallel.getExecutor("auto", 4, small, "logp").name == "serial")
+    assert (tt.parallel.getExecutor("auto", 4, large, "logp").name == "thread")
+    assert (tt.parallel.getExecutor("auto", 4, large, "tube").name == "process")
+    assert (tt.parallel.getExecutor("auto", 1, large, "tube").name == "serial")
+
+    # pools of the caller are used, not closed
+    pool = ThreadPool(processes=2)
+    arrays = {"A": np.arange(10.)}
+    list_jobs = [(_sum_range, 0, 5, ("A",)), (_sum_range, 5, 10, ("A",))]
+
+    with tt.parallel.getExecutor(pool) as executor:
+        assert (executor.name == "external")
+        assert (executor.nworkers == 2)
+        assert (tt.parallel.map_jobs(arrays, list_jobs, executor) ==
+                [10., 35.])
+
+    assert (pool.map(abs, [-1]) == [1])
+    pool.close()
+    pool.join()
+
+    with pt.raises(TypeError):
+        tt.parallel.getExecutor(object())
+
+    with pt.raises(ValueError):
+        tt.parallel.getExecutor("gpu")
@@ -0,0 +1,106 @@
+"""
+<description>
+"""
+
+import os
+import time
+import numpy as np
+import pytest as pt
+
+import teetool as tt
+
+
+def test_manifest(tmp_path):
+    """
+    tests writing and reading manifests
+    """
+
+    path = str(tmp_path / "item")
+
+    tt.storage.write_manifest(path, "model", {"ndim": 3})
+
+    manifest = tt.storage.read_manifest(path, "model")
+    assert (manifest["ndim"] == 3)
+    assert (manifest["format_version"] == tt.storage.FORMAT_VERSION)
+
+    # no temporary files remain
+    assert (os.listdir(path) == ["manifest.json"])
+
+    # wrong kind
+    with pt.raises(ValueError) as testException:
+        tt.storage.read_manifest(path, "world")
+
+    # unknown version
+    tt.storage.write_manifest(path, "model", {})
+    with open(os.path.join(path, "manifest.json"), "r") as fid:
+        text = fid.read()
+    with open(os.path.join(path, "manifest.json"), "w") as fid:
+        fid.write(text.replace('"format_version": {0}'.format(
+                                    tt.storage.FORMAT_VERSION),
+                               '"format_version": 999'))
+    with pt.raises(ValueError) as testException:
+        tt.storage.read_manifest(path, "model")
+
+
+def test_grid_cache(tmp_path):
+    """
+    tests the persistent grid cache
+    """
+
+    path = str(tmp_path)
+
+    cache = tt.storage.GridCache(path, max_bytes=3000)
+
+    axes = [np.linspace(0, 1, 10), np.linspace(0, 2, 11)]
+
+    # keys depend on all input
+    key = cache.getKey("abc", "tube", axes, 1)
+    assert (key == cache.getKey("abc", "tube", axes, 1))
+    assert (key == cache.getKey("abc", "tube", axes, 1.0))
+    assert (key == cache.getKey("abc", "tube", axes, np.float64(1)))
+    assert (key != cache.getKey("abd", "tube", axes, 1))
+    assert (key != cache.getKey("abc", "tube", axes, 2))
+    assert (key != cache.getKey("abc", "logp", axes))
+    assert (key != cache.getKey("abc", "tube", [axes[0], axes[1]*2], 1))
+
+    assert (cache.get(key) is None)
+
+    ss = np.random.rand(10, 11)
+    cache.put(key, ss)
+
+    ss2 = cache.get(key)
+    assert (isinstance(ss2, np.memmap))
+    np.testing.assert_array_equal(ss, ss2)
+
+    # no temporary files remain
+    assert (sorted(os.listdir(path)) == [key + ".npy"])
+
+    # least recently used grids are removed (each ~1 kB), explicit times
+    t0 = time.time() - 100
+    os.utime(cache._getFilename(key), (t0, t0))
+    list_keys = [key]
+    for i in range(3):
+        list_keys.append(cache.getKey("abc", "tube", axes, i+2))
+        cache.put(list_keys[-1], ss)
+        os.utime(cache._getFilename(list_keys[-1]), (t0+i+1, t0+i+1))
+
+    assert (cache.get(list_keys[0]) is None)
+    assert (cache.get(list_keys[-1]) is not None)
+
+    # temporary files of a crashed put are removed once stale
+    filename_stale = os.path.join(path, "stale.tmp")
+    filename_recent = os.path.join(path, "recent.tmp")
+    for filename in [filename_stale, filename_recent]:
+        with open(filename, "wb") as fid:
+            fid.write(b"0" * 5000)
+    tstale = time.time() - tt.storage.STALE_SECONDS - 1
+    os.utime(filename_stale, (tstale, tstale))
+
+    cache.put(list_keys[0], ss)
+    assert (not os.path.exists(filename_stale))
+    assert (os.path.exists(filename_recent))
+    assert (cache.get(list_keys[0]) is not None)
+    os.remove(filename_recent)
+
+    cache.clear()
+    assert (os.listdir(path) == [])
@@ -0,0 +1,120 @@
+"""
+<description>
+"""
+
+import os
+import numpy as np
+import pytest as pt
+
+import teetool as tt
+
+
+def test_getClusterData():
+    """
+    tests shapes, sampling, and reproducibility
+    """
+
+    for ndim in [2, 3]:
+        for shape in sorted(tt.synthetic.SHAPES):
+            cluster_data = tt.synthetic.getClusterData(20, 30, ndim=ndim,
+                                                       shape=shape, seed=1)
+            assert (len(cluster_data) == 20)
+            assert (cluster_data.getDimension() == ndim)
+            assert np.all(cluster_data.getLengths() == 30)
+
+    # same seed, same data, regardless of chunks in parallel
+    kwargs = {"npoints_max": 40, "irregular": True, "outlier_fraction": .05,
+              "seed": 3, "chunksize": 16}
+    cd1 = tt.synthetic.getClusterData(100, 10, **kwargs)
+    cd2 = tt.synthetic.getClusterData(100, 10, nworkers=2, **kwargs)
+
+    for (a1, a2) in zip(cd1.getArrays(), cd2.getArrays()):
+        np.testing.assert_array_equal(a1, a2)
+
+    # varying lengths, increasing x in domain
+    lengths = cd1.getLengths()
+    assert (lengths.min() >= 10) and (lengths.max() <= 40)
+    assert (np.unique(lengths).size > 1)
+    for (x, Y) in cd1:
+        assert np.all(np.diff(x) >= 0)
+        assert (x.min() >= -50.) and (x.max() <= 50.)
+
+    # a SeedSequence gives the same data each time (it is not spawned from)
+    seed = np.random.SeedSequence(5)
+    cd5 = tt.synthetic.getClusterData(50, 10, npoints_max=20, seed=seed,
+                                      chunksize=16)
+    cd6 = tt.synthetic.getClusterData(50, 10, npoints_max=20, seed=seed,
+                                      chunksize=16)
+    assert (seed.n_children_spawned == 0)
+    for (a1, a2) in zip(cd5.getArrays(), cd6.getArrays()):
+        np.testing.assert_array_equal(a1, a2)
+
+    # other seed, other data
+    cd3 = tt.synthetic.getClusterData(100, 10, npoints_max=40, seed=4)
+    assert not np.array_equal(cd1.getLengths(), cd3.getLengths())
+
+    # custom shape
+    shape = (lambda x: np.stack([x, x, x], axis=1), [0., 0., 0.], [0., 0., 0.])
+    cd4 = tt.synthetic.getClusterData(5, 10, ndim=2, shape=shape,
+                                      noise_std=0.)
+    (x, Y) = cd4[0]
+    np.testing.assert_allclose(Y, np.stack([x, x], axis=1))
+
+    # usable by a model
+    tt.model.Model(cd1, {"model_type": "resampling", "ngaus": 10})
+
+    with pt.raises(ValueError):
+        tt.synthetic.getClusterData(5, 10, ndim=4)
+
+    with pt.raises(ValueError):
+        tt.synthetic.getClusterData(5, 10, shape="unknown")
+
+    with pt.raises(TypeError):
+        tt.synthetic.getClusterData(5, 10, shape=[1, 2, 3])
+
+    with pt.raises(ValueError):
+        tt.synthetic.getClusterData(5, 10, npoints_max=5)
+
+
+def test_getClusters(tmp_path):
+    """
+    tests independent clusters, written to disk
+    """
+
+    path = str(tmp_path)
+
+    list_cd = tt.synthetic.getClusters(3, 50, seed=7, npoints=20,
+                                       chunksize=8, path=path,
+                                       dtype=np.float32)
+    list_cd_mem = tt.synthetic.getClusters(3, 50, seed=7, npoints=20,
+                                           chunksize=8, dtype=np.float32)
+
+    assert (len(list_cd) == 3)
+
+    for (i, (cd, cd_mem)) in enumerate(zip(list_cd, list_cd_mem)):
+        # memory-mapped
+        (x, Y, offsets) = cd.getArrays()
+        assert (isinstance(Y.base, np.memmap) or isinstance(Y, np.memmap))
+        assert (Y.dtype == np.float32)
+        for (a1, a2) in zip(cd.getArrays(), cd_mem.getArrays()):
+            np.testing.assert_array_equal(a1, a2)
+        # saved as ClusterData
+        cd_loaded = tt.ClusterData.load(os.path.join(path,
+                                                     "cluster_{0}".format(i)))
+        np.testing.assert_array_equal(cd_loaded.getArrays()[1], Y)
+
+    # independent streams
+    assert not np.array_equal(list_cd[0].getArrays()[1],
+                              list_cd[1].getArrays()[1])
+
+    # same SeedSequence, same clusters
+    seed = np.random.SeedSequence(7)
+    list_cd_1 = tt.synthetic.getClusters(2, 10, seed=seed, npoints=5)
+    list_cd_2 = tt.synthetic.getClusters(2, 10, seed=seed, npoints=5)
+    for (cd_1, cd_2) in zip(list_cd_1, list_cd_2):
+        np.testing.assert_array_equal(cd_1.getArrays()[1],
+                                      cd_2.getArrays()[1])
+
+    world_1 = tt.World(ndim=3)
+    world_1.addClusters(list_cd_mem)
+    assert (len(world_1.getCluster()) == 3)
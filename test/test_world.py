@@ -2,12 +2,29 @@
 <description>
 """
 
+import os
+import multiprocessing as mp
 import numpy as np
 import pytest as pt
 
 import teetool as tt
 
 
+def _getWorld(name, ndim, list_ntype=[0, 1], **kwargs):
+    """
+    returns a world with a cluster of 10 toy trajectories per type in
+    list_ntype, kwargs are passed to World (e.g. resolution)
+    """
+
+    world_1 = tt.World(name=name, ndim=ndim, **kwargs)
+
+    for ntype in list_ntype:
+        cluster_data = tt.helpers.get_trajectories(ntype, ndim=ndim, ntraj=10)
+        world_1.addCluster(cluster_data, "toy {0}".format(ntype))
+
+    return world_1
+
+
 def test_init():
     """
     <description>
@@ -69,6 +86,21 @@ def test_addCluster():
 
     assert (len(these_clusters) == 2)
 
+    # columnar storage, float32 and ClusterData input
+    world_1.addCluster(correct_cluster_data, correct_cluster_name,
+                       dtype=np.float32)
+    world_1.addCluster(tt.ClusterData.fromList(correct_cluster_data),
+                       correct_cluster_name)
+
+    these_clusters = world_1.getCluster([2, 3])
+    assert (isinstance(these_clusters[0]["data"], tt.ClusterData))
+    assert (these_clusters[0]["data"].getArrays()[1].dtype == np.float32)
+    assert (len(these_clusters[1]["data"]) == len(correct_cluster_data))
+
+    with pt.raises(ValueError) as testException:
+        world_2d = tt.World(name="test", ndim=2)
+        world_2d.addCluster(tt.ClusterData.fromList(correct_cluster_data))
+
     #
     wrong_cluster_name = 5
     with pt.raises(TypeError) as testException:
@@ -127,3 +159,656 @@ def test_model():
     # build tube (twice!)
     for i in range(2):
         (ss_list, [xx, yy, zz]) = world_1.getTube([0, 1])
+
+
+def test_sparse_grid():
+    """
+    tests open grids returned by the world
+    """
+
+    world_1 = _getWorld("sparse test", 3, resolution=[4, 5, 6])
+
+    settings = {"model_type": "resampling", "ngaus": 10}
+    world_1.buildModel(settings)
+
+    for func in [world_1.getTube, world_1.getLogLikelihood]:
+        (ss_list, grid) = func([0, 1])
+        (ss_list_o, grid_o) = func([0, 1], sparse=True)
+
+        # only the axes are stored
+        assert (grid_o[0].shape == (4, 1, 1))
+        assert (grid_o[2].shape == (1, 1, 6))
+
+        for (ss, ss_o) in zip(ss_list, ss_list_o):
+            assert (ss.shape == (4, 5, 6))
+            np.testing.assert_array_equal(ss, ss_o)
+
+        # single layer
+        (ss_list, [xx, yy, zz]) = func([0], z=0.0)
+        (ss_list_o, [xo, yo, zo]) = func([0], z=0.0, sparse=True)
+
+        assert (xx.shape == (4, 5))
+        assert (xo.shape == (4, 1))
+        assert (zz is None) and (zo is None)
+        np.testing.assert_array_equal(ss_list[0], ss_list_o[0])
+
+
+def test_shared_grid():
+    """
+    tests the single pass evaluation of all clusters on a shared grid
+    """
+
+    world_1 = _getWorld("shared test", 2, resolution=[20, 30])
+
+    settings = {"model_type": "resampling", "ngaus": 10}
+    world_1.buildModel(settings)
+
+    (ss_tube, [xx, yy, zz]) = world_1.getTube([0, 1], sdwidth=2)
+    (ss_logp, [xl, yl, zl]) = world_1.getLogLikelihood([0, 1])
+
+    # stored by the models
+    for (icluster, ss) in enumerate(ss_tube):
+        this_model = world_1._getModel(icluster)
+        assert (this_model._getCached("tube", [xx[:, 0], yy[0, :]], 2) is ss)
+
+    # same values as a cluster by cluster evaluation
+    settings_2 = dict(settings)
+    for (icluster, (ss1, ss2)) in enumerate(zip(ss_tube, ss_logp)):
+        cluster_data = world_1._clusters[icluster]["data"]
+        this_model = tt.model.Model(cluster_data, settings_2)
+        np.testing.assert_array_equal(
+            ss1, this_model.isInside_grid(2, xx, yy))
+        np.testing.assert_allclose(
+            ss2, this_model.evalLogLikelihood(xl, yl))
+
+    # second call returns the cached values
+    (ss_tube_2, _) = world_1.getTube([0, 1], sdwidth=2)
+    assert all(ss1 is ss2 for (ss1, ss2) in zip(ss_tube, ss_tube_2))
+
+
+def test_backend():
+    """
+    tests that all backends give the same values
+    """
+
+    world_1 = _getWorld("backend test", 2, resolution=[15, 20])
+
+    world_1.buildModel({"model_type": "resampling", "ngaus": 10})
+
+    # not cached
+    world_1.slice_tol = None
+
+    P = np.random.uniform(-20., 20., size=(50, 2))
+
+    list_results = []
+
+    for backend in ["serial", "thread", "process", "auto"]:
+        world_1.backend = backend
+        world_1.nworkers = 2
+
+        for icluster in [0, 1]:
+            this_model = world_1._getModel(icluster)
+            assert (this_model.backend == backend)
+            this_model._list_tube = []
+            this_model._list_logp = []
+            this_model._list_error = []
+
+        (ss_tube, _) = world_1.getTube(sdwidth=2)
+        (ss_logp, _) = world_1.getLogLikelihood()
+
+        list_results.append((ss_tube, ss_logp, world_1.isInside(P)))
+
+    for (ss_tube, ss_logp, inside) in list_results[1:]:
+        for (ss1, ss2) in zip(ss_tube, list_results[0][0]):
+            np.testing.assert_array_equal(ss1, ss2)
+        for (ss1, ss2) in zip(ss_logp, list_results[0][1]):
+            np.testing.assert_allclose(ss1, ss2)
+        np.testing.assert_array_equal(inside, list_results[0][2])
+
+    world_1.backend = "gpu"
+    with pt.raises(ValueError):
+        world_1.isInside(P)
+
+
+def test_instrumentation():
+    """
+    tests recording the stages of a world and its models
+    """
+
+    world_1 = _getWorld("instrumentation test", 2, resolution=[15, 20])
+
+    world_1.instrumentation = tt.Instrumentation()
+
+    world_1.buildModel({"model_type": "resampling", "ngaus": 10}, nworkers=2)
+
+    records = world_1.instrumentation.asDict()
+    assert (records["fit"]["calls"] == 2)
+    assert (records["cells"]["calls"] == 2)
+
+    # shared by the models
+    this_model = world_1._getModel(0)
+    assert (this_model.instrumentation is world_1.instrumentation)
+
+    world_1.getTube()
+    world_1.getLogLikelihood()
+
+    records = world_1.instrumentation.asDict()
+    for name in ["hulls", "grid", "dispatch", "evaluate", "scatter"]:
+        assert (records[name]["calls"] > 0)
+    assert (records["grid"]["points"] == 2 * 15 * 20)
+    assert (records["cache"]["misses"] == 4)
+    assert (records["cache"]["hits"] == 0)
+
+    # cached
+    world_1.getLogLikelihood()
+    assert (world_1.instrumentation.asDict()["cache"]["hits"] == 2)
+
+    # off
+    world_1.instrumentation = None
+    world_1.getTube(sdwidth=2)
+    assert (this_model.instrumentation is None)
+
+
+def test_queries():
+    """
+    tests plane, polyline, and corridor queries
+    """
+
+    world_1 = _getWorld("query test", 3, resolution=[6, 7, 8])
+
+    settings = {"model_type": "resampling", "ngaus": 10}
+    world_1.buildModel(settings)
+
+    # an axis-aligned plane, equals a layer of the grid
+    (ss_list, [xx, yy, zz]) = world_1.getLogLikelihood([0, 1], z=5.)
+
+    origin = [xx[0, 0], yy[0, 0], 5.]
+    u = [xx[-1, 0] - xx[0, 0], 0., 0.]
+    v = [0., yy[0, -1] - yy[0, 0], 0.]
+
+    (ss_list_p, [xp, yp, zp]) = world_1.getLogLikelihoodPlane(origin, u, v,
+                                            [0, 1], resolution=[6, 7])
+
+    np.testing.assert_allclose(xp, xx)
+    np.testing.assert_allclose(yp, yy)
+    assert (np.all(zp == 5.))
+
+    for (ss, ss_p) in zip(ss_list, ss_list_p):
+        np.testing.assert_allclose(ss_p, ss)
+
+    (ss_list_p, _) = world_1.getTubePlane(origin, u, v, [0, 1], sdwidth=2,
+                                          resolution=[6, 7])
+    assert (ss_list_p[0].shape == (6, 7))
+
+    # along the mean, inside the tube
+    Y_mean = world_1.getMean([0])[0]
+    (ss_list, P, s) = world_1.getTubePolyline(Y_mean, [0], sdwidth=2,
+                                              npoints=20)
+    assert (P.shape == (20, 3))
+    assert (np.all(ss_list[0] == 1.))
+    np.testing.assert_array_equal(ss_list[0] == 1.,
+                                  world_1.isInside(P, 2, [0])[:, 0])
+
+    (ss_list, P, s) = world_1.getLogLikelihoodPolyline(Y_mean, [0, 1],
+                                                       npoints=20)
+    assert (ss_list[1].shape == (20,))
+
+    # corridor around the mean
+    (ss_list, P, s) = world_1.getTubeCorridor(Y_mean, 1., [0, 1], sdwidth=2,
+                                              npoints=10, nwidth=3)
+    assert (ss_list[0].shape == (10, 3, 3))
+    assert (np.all(ss_list[0][:, 1, 1] == 1.))
+
+    (ss_list, P, s) = world_1.getLogLikelihoodCorridor(Y_mean, 1., [0],
+                                                       npoints=10, nwidth=3)
+    assert (ss_list[0].shape == (10, 3, 3))
+
+    with pt.raises(ValueError) as testException:
+        world_1.getTubePolyline(Y_mean[:, :2])
+
+
+def test_slices():
+    """
+    tests slices interpolated from a previously calculated volume
+    """
+
+    world_1 = _getWorld("slice test", 3, resolution=[8, 9, 10])
+    world_2 = tt.World(name="slice test", ndim=3, resolution=[8, 9, 10])
+    world_2.slice_tol = None
+    world_2.addClusters([c["data"] for c in world_1._clusters],
+                        [c["name"] for c in world_1._clusters])
+
+    settings = {"model_type": "resampling", "ngaus": 10}
+    world_1.buildModel(settings)
+    world_2.buildModel(settings)
+
+    # volumes
+    (ss_volume, [xx, yy, zz]) = world_1.getLogLikelihood()
+    (_, [xt, yt, zt]) = world_1.getTube(sdwidth=2)
+
+    z = 0.7*zz[0, 0, 3] + 0.3*zz[0, 0, 4]
+
+    # the 2d grid of a slice is the same as that of the volume
+    (ss_list_1, _) = world_1.getLogLikelihood(z=z)
+    (ss_list_2, _) = world_2.getLogLikelihood(z=z)
+
+    for (ss_1, ss_2) in zip(ss_list_1, ss_list_2):
+        assert (ss_1.shape == ss_2.shape)
+        np.testing.assert_allclose(ss_1, ss_2, atol=5.)
+
+    # exact, points near the boundary are recalculated
+    z = 0.7*zt[0, 0, 3] + 0.3*zt[0, 0, 4]
+
+    (ss_list_1, _) = world_1.getTube(sdwidth=2, z=z)
+    (ss_list_2, _) = world_2.getTube(sdwidth=2, z=z)
+
+    for (ss_1, ss_2) in zip(ss_list_1, ss_list_2):
+        np.testing.assert_array_equal(ss_1, ss_2)
+
+    # at the nodes of the volume, interpolation is exact
+    this_model = world_1._getModel(0)
+    P = tt.helpers.getGridPoints(tt.helpers.getGridAxes(xx, yy, zz))
+    s = this_model.interpolateCached("logp", P, tol=np.inf)
+    np.testing.assert_allclose(s, ss_volume[0].reshape(-1))
+
+    # not available outside the volume
+    assert (this_model.interpolateCached("logp", P + 1e3) is None)
+    assert (this_model.interpolateCached("tube", P, sdwidth=3) is None)
+
+
+def test_save_load(tmp_path, monkeypatch):
+    """
+    tests saving and loading a world, without fitting again
+    """
+
+    world_1 = _getWorld("save test", 2, [0, 1, 2], resolution=[10, 12])
+
+    settings = {"model_type": "resampling", "ngaus": 10}
+    world_1.buildModel(settings, list_icluster=[0, 1])
+    world_1.buildModel(settings, list_icluster=[2], lazy=True)
+
+    (ss_list, [xx, yy, zz]) = world_1.getLogLikelihood([0, 1])
+
+    path = str(tmp_path / "world")
+    world_1.save(path, cached=True)
+
+    world_2 = tt.World.load(path)
+
+    assert (world_2.getName() == "save test")
+    assert ([c["name"] for c in world_2._clusters] ==
+            ["toy 0", "toy 1", "toy 2"])
+
+    # models are loaded, pending models remain pending
+    assert ("model" in world_2._clusters[1])
+    assert ("model" not in world_2._clusters[2])
+    assert (world_2._clusters[2]["settings"] == settings)
+
+    for icluster in [0, 1]:
+        model_1 = world_1._getModel(icluster)
+        model_2 = world_2._getModel(icluster)
+        np.testing.assert_array_equal(model_1._mu_y, model_2._mu_y)
+        np.testing.assert_array_equal(model_1._sig_y, model_2._sig_y)
+        assert (model_2._settings == settings)
+
+    # grids from the cache, memory-mapped
+    (ss_list_2, [xx2, yy2, zz2]) = world_2.getLogLikelihood([0, 1])
+    for (ss, ss2) in zip(ss_list, ss_list_2):
+        assert (isinstance(ss2, np.memmap))
+        np.testing.assert_array_equal(ss, ss2)
+
+    # same results as a fitted model
+    np.testing.assert_array_equal(world_1.getMean([0])[0],
+                                  world_2.getMean([0])[0])
+
+    # a model on its own
+    world_1._getModel(0).save(os.path.join(path, "single"))
+    model_3 = tt.model.Model.load(os.path.join(path, "single"))
+    assert (len(model_3._list_logp) == 0)
+    np.testing.assert_array_equal(model_3._mu_y, world_1._getModel(0)._mu_y)
+
+    # attributes that do not depend on the fit, as a new model
+    for name in ["backend", "nworkers", "grid_cache", "instrumentation",
+                 "_list_tube", "_list_error", "_fingerprint"]:
+        assert (getattr(model_3, name) == getattr(
+                    tt.model.Model(world_1._clusters[2]["data"], settings),
+                    name))
+
+    with pt.raises(ValueError) as testException:
+        tt.World.load(os.path.join(path, "single"))
+
+    # saved back to the directory it was loaded from (memory-mapped)
+    world_2.save(path, cached=True)
+    world_3 = tt.World.load(path)
+    np.testing.assert_array_equal(world_3.getMean([0])[0],
+                                  world_1.getMean([0])[0])
+    (ss_list_3, _) = world_3.getLogLikelihood([0, 1])
+    for (ss, ss3) in zip(ss_list, ss_list_3):
+        np.testing.assert_array_equal(ss, ss3)
+
+    # an interrupted save leaves the previous one
+    def failing_save(*args, **kwargs):
+        raise RuntimeError("interrupted")
+
+    monkeypatch.setattr(tt.model.Model, "save", failing_save)
+
+    with pt.raises(RuntimeError) as testException:
+        world_1.save(path)
+
+    world_3 = tt.World.load(path)
+    np.testing.assert_array_equal(world_3.getMean([1])[0],
+                                  world_1.getMean([1])[0])
+
+    # no temporary files remain
+    assert not [name for name in os.listdir(path) if name.endswith(".tmp")]
+
+
+def test_addClustersFromCSV(tmp_path):
+    """
+    tests adding several clusters from a file
+    """
+
+    list_rows = []
+
+    for ntype in [0, 1]:
+        cluster_data = tt.ClusterData.fromList(
+                            tt.helpers.get_trajectories(ntype, ndim=2, ntraj=3))
+        (x, Y, _) = cluster_data.getArrays()
+        track_id = np.repeat(np.arange(3), cluster_data.getLengths())
+        list_rows.append(np.column_stack((Y, np.ones_like(x)*(5-ntype),
+                                          track_id, x)))
+
+    filename = str(tmp_path / "clusters.csv")
+    np.savetxt(filename, np.concatenate(list_rows), delimiter=",")
+
+    world_1 = tt.World(name="csv test", ndim=2)
+    list_name = world_1.addClustersFromCSV(filename, usecols=(2, 3, 4, 0, 1))
+
+    # ordered by cluster id
+    assert (list_name == ["4", "5"])
+    assert (len(world_1.getCluster([0, 1])) == 2)
+    assert (len(world_1._clusters[1]["data"]) == 3)
+
+    world_1.addClusters([world_1._clusters[0]["data"]], ["copy"])
+    assert (world_1._clusters[2]["name"] == "copy")
+
+    with pt.raises(ValueError) as testException:
+        world_1.addClusters([world_1._clusters[0]["data"]], ["a", "b"])
+
+
+def test_grid_cache(tmp_path):
+    """
+    tests sharing evaluated grids between worlds via a persistent cache
+    """
+
+    cache = tt.storage.GridCache(str(tmp_path))
+
+    list_world = []
+
+    for i in range(2):
+        world_1 = tt.World(name="cache test", ndim=2, resolution=[8, 9])
+        world_1.grid_cache = cache
+        np.random.seed(1)
+        cluster_data = tt.helpers.get_trajectories(0, ndim=2, ntraj=10)
+        world_1.addCluster(cluster_data, "toy")
+        world_1.buildModel({"model_type": "resampling", "ngaus": 10})
+        list_world.append(world_1)
+
+    (ss_list_1, _) = list_world[0].getLogLikelihood()
+    (ss_tube_1, _) = list_world[0].getTube(sdwidth=2)
+
+    # same model, read from the cache
+    (ss_list_2, _) = list_world[1].getLogLikelihood()
+    (ss_tube_2, _) = list_world[1].getTube(sdwidth=2)
+
+    assert (isinstance(ss_list_2[0], np.memmap))
+    assert (isinstance(ss_tube_2[0], np.memmap))
+    np.testing.assert_array_equal(ss_list_1[0], ss_list_2[0])
+    np.testing.assert_array_equal(ss_tube_1[0], ss_tube_2[0])
+
+    model_1 = list_world[0]._getModel(0)
+    model_2 = list_world[1]._getModel(0)
+    assert (model_1.getFingerprint() == model_2.getFingerprint())
+
+
+def test_memory_budget(tmp_path):
+    """
+    tests tiled evaluation with a small memory budget
+    """
+
+    world_1 = tt.World(name="budget test", ndim=2, resolution=[20, 30])
+
+    cluster_data = tt.helpers.get_trajectories(0, ndim=2, ntraj=10)
+    world_1.addCluster(cluster_data, "toy 0")
+
+    settings = {"model_type": "resampling", "ngaus": 10}
+    world_1.buildModel(settings)
+
+    (ss_tube, _) = world_1.getTube()
+    (ss_logp, _) = world_1.getLogLikelihood()
+
+    # new model (empty cache), many small tiles, memory-mapped output
+    world_1.buildModel(settings)
+    world_1.memory_budget = 4096
+    world_1.memmap_dir = str(tmp_path)
+
+    (ss_tube_2, _) = world_1.getTube()
+    (ss_logp_2, _) = world_1.getLogLikelihood()
+
+    assert (isinstance(ss_logp_2[0], np.memmap))
+    np.testing.assert_array_equal(ss_tube[0], ss_tube_2[0])
+    np.testing.assert_array_almost_equal(ss_logp[0], ss_logp_2[0])
+
+
+def test_adaptive():
+    """
+    tests adaptive evaluation of tube and log-likelihood
+    """
+
+    world_1 = tt.World(name="adaptive test", ndim=2, resolution=[30, 30])
+
+    cluster_data = tt.helpers.get_trajectories(0, ndim=2, ntraj=10)
+    world_1.addCluster(cluster_data, "toy 0")
+
+    settings = {"model_type": "resampling", "ngaus": 10}
+    world_1.buildModel(settings)
+
+    (ss_list, [xx, yy, zz]) = world_1.getTube(maxdepth=2, sparse=True)
+
+    # resolution rounded up to (k * 4 + 1)
+    assert (ss_list[0].shape == (33, 33))
+    assert (xx.shape == (33, 1))
+
+    # compare to uniform grid, only at the boundary differences may occur
+    model = world_1.getCluster([0])[0]["model"]
+    ss_uniform = model.isInside_grid(1, xx, yy)
+    assert (np.mean(ss_uniform == ss_list[0]) > 0.95)
+
+    (ss_list, [xx, yy, zz]) = world_1.getLogLikelihood(maxdepth=2, tol=0.)
+    np.testing.assert_array_almost_equal(ss_list[0],
+                                         model.evalLogLikelihood(xx, yy))
+
+    # 3d, thin parts of the tube fall between the coarse points
+    world_2 = tt.World(name="adaptive test", ndim=3)
+
+    for ntype in [0, 1]:
+        cluster_data = tt.helpers.get_trajectories(ntype, ndim=3, ntraj=20)
+        world_2.addCluster(cluster_data, "toy {0}".format(ntype))
+
+    world_2.buildModel({"model_type": "resampling", "ngaus": 50})
+    model = world_2.getCluster([0])[0]["model"]
+
+    (ss_list, [xx, yy, zz]) = world_2.getTube([0], resolution=[17, 17, 17],
+                                              maxdepth=2)
+    ss_uniform = model.isInside_grid(1, xx, yy, zz)
+    assert (ss_uniform.sum() > 0)
+    assert (np.sum(ss_uniform != ss_list[0]) <= 0.05 * ss_uniform.sum())
+
+    # single layer in z, as uniform
+    (ss_adaptive, _) = world_2.getTube([0], resolution=[17, 17, 17], z=10.,
+                                       maxdepth=2)
+    (ss_uniform, _) = world_2.getTube([0], resolution=[17, 17, 17], z=10.)
+    assert (ss_uniform[0].sum() > 0)
+    np.testing.assert_array_equal(ss_adaptive[0], ss_uniform[0])
+
+    (ss_adaptive, _) = world_2.getLogLikelihood([0], resolution=[17, 17, 17],
+                                                z=10., maxdepth=2, tol=0.)
+    (ss_uniform, _) = world_2.getLogLikelihood([0], resolution=[17, 17, 17],
+                                               z=10.)
+    np.testing.assert_array_almost_equal(ss_adaptive[0], ss_uniform[0])
+
+
+def test_isInside():
+    """
+    tests point queries against multiple clusters
+    """
+
+    world_1 = _getWorld("inside test", 3)
+
+    settings = {"model_type": "resampling", "ngaus": 10}
+    world_1.buildModel(settings)
+
+    # points on the mean trajectories, and far away
+    Y0 = world_1.getMean([0])[0]
+    P = np.concatenate((Y0, np.ones((5, 3))*1e4), axis=0)
+
+    arr_inside = world_1.isInside(P, sdwidth=2)
+
+    assert (arr_inside.shape == (P.shape[0], 2))
+    assert (arr_inside.dtype == bool)
+
+    # far away points are not inside
+    assert (not arr_inside[-5:, :].any())
+
+    # identical to testing each model separately
+    for icluster in [0, 1]:
+        model = world_1.getCluster([icluster])[0]["model"]
+        np.testing.assert_array_equal(arr_inside[:, icluster],
+                                      model.isInside_pnts(P, 2, nsamples=12))
+
+    # single cluster
+    arr_inside_1 = world_1.isInside(P, sdwidth=2, list_icluster=[1])
+    np.testing.assert_array_equal(arr_inside_1[:, 0], arr_inside[:, 1])
+
+    with pt.raises(ValueError) as testException:
+        world_1.isInside(P, list_icluster=[5])
+
+
+def test_buildModel_parallel():
+    """
+    tests fitting clusters in parallel, and reporting failures
+    """
+
+    world_1 = _getWorld("parallel test", 2, [0, 1, 0])
+
+    settings = {"model_type": "resampling", "ngaus": 10}
+
+    failures = world_1.buildModel(settings)
+    assert (failures == {})
+    Y_serial = world_1.getMean()
+
+    failures = world_1.buildModel(settings, nworkers=2)
+    assert (failures == {})
+
+    # same results, same order
+    for (Y1, Y2) in zip(Y_serial, world_1.getMean()):
+        np.testing.assert_array_almost_equal(Y1, Y2)
+
+    # user provided executor, not closed
+    p = mp.Pool(processes=2)
+    failures = world_1.buildModel(settings, executor=p)
+    assert (p.map(abs, [-1]) == [1])
+    p.close()
+    p.join()
+    assert (failures == {})
+
+    # backend of the world
+    for backend in ["thread", "process"]:
+        world_1.backend = backend
+        world_1.nworkers = 2
+        failures = world_1.buildModel(settings)
+        assert (failures == {})
+        for (Y1, Y2) in zip(Y_serial, world_1.getMean()):
+            np.testing.assert_array_almost_equal(Y1, Y2)
+
+    # invalid settings are reported immediately
+    with pt.raises(ValueError) as testException:
+        world_1.buildModel({"ngaus": 10}, nworkers=2)
+
+    # unknown model type fails per cluster, without aborting the others
+    failures = world_1.buildModel({"model_type": "unknown", "ngaus": 10},
+                                  list_icluster=[1])
+    assert (list(failures.keys()) == [1])
+    assert (isinstance(failures[1], NotImplementedError))
+    assert ("model" not in world_1.getCluster([1])[0])
+    assert ("model" in world_1.getCluster([0])[0])
+
+    # the error is raised again, without fitting again
+    with pt.raises(NotImplementedError) as testException:
+        world_1.getMean([1])
+    assert (testException.value is failures[1])
+
+    # also for lazy fits
+    world_1.buildModel({"model_type": "unknown", "ngaus": 10},
+                       list_icluster=[2], lazy=True)
+    with pt.raises(NotImplementedError) as testException:
+        world_1.getMean([2])
+    error = testException.value
+    with pt.raises(NotImplementedError) as testException:
+        world_1.getTube([2])
+    assert (testException.value is error)
+
+    # fitted again on new settings
+    world_1.buildModel(settings, list_icluster=[1, 2])
+    assert (len(world_1.getMean([1, 2])) == 2)
+
+
+def test_buildModel_lazy():
+    """
+    tests fitting models on demand
+    """
+
+    world_1 = _getWorld("lazy test", 2, resolution=[5, 5])
+
+    # no model yet
+    with pt.raises(ValueError) as testException:
+        world_1.getMean([0])
+
+    settings = {"model_type": "resampling", "ngaus": 10}
+
+    failures = world_1.buildModel(settings, lazy=True)
+    assert (failures == {})
+
+    # nothing fitted
+    for this_cluster in world_1.getCluster():
+        assert ("model" not in this_cluster)
+
+    # fitted on first use, only the cluster requested
+    Y_list = world_1.getMean([1])
+    assert ("model" not in world_1.getCluster([0])[0])
+    model_1 = world_1.getCluster([1])[0]["model"]
+
+    # samples, also fitted on first use
+    samples = world_1.getSamples(0, nsamples=3)
+    assert ("model" in world_1.getCluster([0])[0])
+    assert (len(samples) == 3)
+    (x, Y) = samples[0]
+    assert (x.shape == (10,))
+    assert (Y.shape == (10, 2))
+
+    # cached
+    world_1.getLogLikelihood([1])
+    assert (world_1.getCluster([1])[0]["model"] is model_1)
+
+    # new settings, model is outdated
+    settings["ngaus"] = 20
+    world_1.buildModel(settings, list_icluster=[1], lazy=True)
+    Y_list = world_1.getMean([1])
+    assert (world_1.getCluster([1])[0]["model"] is not model_1)
+    assert (Y_list[0].shape[0] == 20)
+
+    # new data, model is outdated
+    model_1 = world_1.getCluster([1])[0]["model"]
+    world_1._clusters[1]["data"] = tt.ClusterData.fromList(
+                        tt.helpers.get_trajectories(0, ndim=2, ntraj=5))
+    world_1.getMean([1])
+    assert (world_1.getCluster([1])[0]["model"] is not model_1)